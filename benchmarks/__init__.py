@@ -0,0 +1,8 @@
+"""
+Benchmarks for OLP, run against a generated dataset.
+
+    $ python -m benchmarks --users 10000 --output results.json
+
+See `python -m benchmarks --help` for the size of the dataset and the
+scenarios which can be run.
+"""
@@ -0,0 +1,152 @@
+"""
+Generates a synthetic dataset of users, groups and object permissions.
+
+The rows are written with `bulk_create` in batches, with their ids chosen up
+front, so datasets with millions of permissions can be generated on SQLite
+without keeping them in memory.
+"""
+
+import random
+
+
+class DatasetConfig(object):
+
+    def __init__(self, users=1000, groups=50, memberships=3, targets=10000,
+                 user_grants=20, group_grants=200, seed=0, batch_size=5000):
+        self.users = users
+        self.groups = groups
+        self.memberships = min(memberships, groups)
+        self.targets = targets
+        self.user_grants = min(user_grants, targets)
+        self.group_grants = min(group_grants, targets)
+        self.seed = seed
+        self.batch_size = batch_size
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+
+def generate_dataset(config):
+    """
+    Fills the database with the dataset described by `config`, replacing any
+    existing users, groups, apples and object permissions.
+
+    Every user joins `memberships` random groups, and gets a random permission
+    on `user_grants` random apples.  Every group gets a random permission on
+    `group_grants` random apples.  Returns the number of rows created for each
+    model.
+    """
+
+    from django.contrib.auth.models import Group, Permission, User
+    from django.contrib.contenttypes.models import ContentType
+    from django.db import connection, transaction
+    from olp.models import ObjectPermission
+
+    from tests.models import Apple
+
+    rand = random.Random(config.seed)
+
+    apple_ct = ContentType.objects.get_for_model(Apple)
+    user_ct = ContentType.objects.get_for_model(User)
+    group_ct = ContentType.objects.get_for_model(Group)
+
+    permission_ids = list(Permission.objects.filter(content_type=apple_ct)
+                          .values_list("pk", flat=True))
+
+    membership_model = User.groups.through
+
+    counts = {}
+
+    with transaction.atomic():
+        clear_dataset()
+
+        counts["users"] = _bulk_create(User, (
+            User(pk=user_id, username="user%d" % user_id, password="!")
+            for user_id in range(1, config.users + 1)
+        ), config.batch_size)
+
+        counts["groups"] = _bulk_create(Group, (
+            Group(pk=group_id, name="group%d" % group_id)
+            for group_id in range(1, config.groups + 1)
+        ), config.batch_size)
+
+        counts["apples"] = _bulk_create(Apple, (
+            Apple(pk=apple_id, name="apple%d" % apple_id)
+            for apple_id in range(1, config.targets + 1)
+        ), config.batch_size)
+
+        def iter_memberships():
+            group_ids = range(1, config.groups + 1)
+
+            for user_id in range(1, config.users + 1):
+                for group_id in rand.sample(group_ids, config.memberships):
+                    yield membership_model(user_id=user_id, group_id=group_id)
+
+        counts["memberships"] = _bulk_create(
+            membership_model, iter_memberships(), config.batch_size)
+
+        def iter_grants(base_ct, base_count, grant_count):
+            apple_ids = range(1, config.targets + 1)
+
+            for base_id in range(1, base_count + 1):
+                for apple_id in rand.sample(apple_ids, grant_count):
+                    yield ObjectPermission(
+                        base_object_ct_id=base_ct.pk,
+                        base_object_id=base_id,
+                        target_object_ct_id=apple_ct.pk,
+                        target_object_id=apple_id,
+                        permission_id=rand.choice(permission_ids),
+                    )
+
+        counts["permissions"] = _bulk_create(ObjectPermission, iter_grants(
+            user_ct, config.users, config.user_grants), config.batch_size)
+
+        counts["permissions"] += _bulk_create(ObjectPermission, iter_grants(
+            group_ct, config.groups, config.group_grants), config.batch_size)
+
+    # Without statistics SQLite picks the wrong index for some of the
+    # permission queries, which a real database would not do
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+    return counts
+
+
+def clear_dataset():
+    from django.contrib.auth.models import Group, User
+    from olp.models import EffectivePermission, ObjectPermission
+
+    from tests.models import Apple
+
+    for model in (EffectivePermission, ObjectPermission, User.groups.through,
+                  User.user_permissions.through, Apple, Group, User):
+        queryset = model._default_manager.all()
+        queryset._raw_delete(queryset.db)
+
+
+def get_dataset_counts():
+    from django.contrib.auth.models import Group, User
+    from olp.models import ObjectPermission
+
+    from tests.models import Apple
+
+    return {
+        "users": User.objects.count(),
+        "groups": Group.objects.count(),
+        "apples": Apple.objects.count(),
+        "memberships": User.groups.through.objects.count(),
+        "permissions": ObjectPermission.objects.count(),
+    }
+
+
+def _bulk_create(model, objs, batch_size):
+    from olp.utils import _iter_batches
+
+    count = 0
+
+    for batch in _iter_batches(objs, batch_size):
+        model._default_manager.bulk_create(batch)
+
+        count += len(batch)
+
+    return count
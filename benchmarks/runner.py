@@ -0,0 +1,261 @@
+"""
+Runs the benchmarks and reports the latency and the number of queries of
+every scenario, optionally saving the results as JSON.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+
+def run_scenario(func, context, iterations, warmup=0):
+    """
+    Runs a scenario `iterations` times, after `warmup` untimed runs, and
+    returns the time taken (in seconds) and the number of queries run by each
+    of the timed runs.
+    """
+
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    for i in range(warmup):
+        func(context)
+
+    timings = []
+    query_counts = []
+
+    for i in range(iterations):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            func(context)
+            timings.append(time.perf_counter() - start)
+
+        query_counts.append(len(queries))
+
+    return timings, query_counts
+
+
+def summarize(timings, query_counts):
+    """
+    Summarizes the results of a scenario, with the latencies in milliseconds.
+    """
+
+    timings = sorted(timings)
+
+    return {
+        "iterations": len(timings),
+        "min_ms": timings[0] * 1000,
+        "mean_ms": sum(timings) / len(timings) * 1000,
+        "p50_ms": percentile(timings, 50) * 1000,
+        "p90_ms": percentile(timings, 90) * 1000,
+        "p99_ms": percentile(timings, 99) * 1000,
+        "max_ms": timings[-1] * 1000,
+        "queries_mean": float(sum(query_counts)) / len(query_counts),
+        "queries_max": max(query_counts),
+    }
+
+
+def percentile(sorted_values, pct):
+    """
+    Gets a percentile of already sorted values, interpolating between the
+    two closest values.
+    """
+
+    if not sorted_values:
+        return None
+
+    rank = (len(sorted_values) - 1) * pct / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+
+    return sorted_values[lower] + \
+        (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+
+def run_benchmarks(iterations=200, warmup=10, seed=0, only=None):
+    """
+    Runs the scenarios against the dataset in the database, returning the
+    summary of each one.  `only` can be used to run a subset of them, by name.
+    """
+
+    from .scenarios import SCENARIOS, Context
+
+    context = Context(seed=seed)
+    results = {}
+
+    for name, func in SCENARIOS:
+        if only and name not in only:
+            continue
+
+        timings, query_counts = run_scenario(func, context, iterations,
+                                             warmup)
+
+        results[name] = summarize(timings, query_counts)
+
+    return results
+
+
+def compare(results, baseline, threshold=10.0):
+    """
+    Compares the median latency of each scenario against a baseline, and
+    returns the scenarios which are more than `threshold` percent slower, or
+    run more queries.
+    """
+
+    regressions = []
+
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+
+        base = baseline[name]
+        change = (result["p50_ms"] - base["p50_ms"]) / base["p50_ms"] * 100
+
+        if change > threshold or result["queries_max"] > base["queries_max"]:
+            regressions.append((name, change, base["queries_max"],
+                                result["queries_max"]))
+
+    return regressions
+
+
+def get_parser():
+    from .dataset import DatasetConfig
+
+    defaults = DatasetConfig()
+
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Benchmarks the OLP permission functions.",
+    )
+
+    dataset = parser.add_argument_group("dataset")
+    dataset.add_argument("--users", type=int, default=defaults.users)
+    dataset.add_argument("--groups", type=int, default=defaults.groups)
+    dataset.add_argument("--memberships", type=int,
+                         default=defaults.memberships,
+                         help="Groups joined by every user.")
+    dataset.add_argument("--targets", type=int, default=defaults.targets,
+                         help="Apples which permissions are assigned on.")
+    dataset.add_argument("--user-grants", type=int,
+                         default=defaults.user_grants,
+                         help="Permissions assigned directly to every user.")
+    dataset.add_argument("--group-grants", type=int,
+                         default=defaults.group_grants,
+                         help="Permissions assigned to every group.")
+    dataset.add_argument("--seed", type=int, default=defaults.seed)
+    dataset.add_argument("--reuse", action="store_true",
+                         help="Use the dataset already in the database.")
+
+    parser.add_argument("--database", default=None,
+                        help="The SQLite file to use.  Defaults to "
+                             "olp_benchmark.db.")
+    parser.add_argument("--materialize", action="store_true",
+                        help="Keep the table of effective permissions.")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--scenario", action="append", dest="scenarios",
+                        help="Only run this scenario.  Can be repeated.")
+    parser.add_argument("--output", help="Save the results to this file.")
+    parser.add_argument("--compare",
+                        help="Compare the results with a previous run.")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="The slowdown, in percent, which is reported "
+                             "as a regression.")
+
+    return parser
+
+
+def setup(database=None, materialize=False):
+    import django
+    from django.core.management import call_command
+
+    if database:
+        os.environ["OLP_BENCHMARK_DB"] = database
+
+    if materialize:
+        os.environ["OLP_BENCHMARK_MATERIALIZE"] = "1"
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+
+    django.setup()
+
+    call_command("migrate", run_syncdb=True, verbosity=0)
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+
+    setup(args.database, args.materialize)
+
+    import django
+    from django.db import connection
+    from olp import __version__
+
+    from .dataset import DatasetConfig, generate_dataset, get_dataset_counts
+
+    if args.reuse:
+        counts = get_dataset_counts()
+    else:
+        config = DatasetConfig(
+            users=args.users, groups=args.groups,
+            memberships=args.memberships, targets=args.targets,
+            user_grants=args.user_grants, group_grants=args.group_grants,
+            seed=args.seed,
+        )
+
+        start = time.perf_counter()
+        counts = generate_dataset(config)
+
+        sys.stdout.write("Generated the dataset in %.1fs: %s\n" % (
+            time.perf_counter() - start,
+            ", ".join("%d %s" % (counts[key], key) for key in sorted(counts)),
+        ))
+
+    if args.materialize:
+        from olp.effective import rebuild_effective_permissions
+
+        rebuild_effective_permissions()
+
+    results = run_benchmarks(args.iterations, args.warmup, args.seed,
+                             args.scenarios)
+
+    sys.stdout.write("%-32s %10s %10s %10s %8s\n" % (
+        "scenario", "p50 ms", "p90 ms", "p99 ms", "queries"))
+
+    for name, result in results.items():
+        sys.stdout.write("%-32s %10.3f %10.3f %10.3f %8.1f\n" % (
+            name, result["p50_ms"], result["p90_ms"], result["p99_ms"],
+            result["queries_mean"]))
+
+    if args.output:
+        report = {
+            "olp_version": __version__,
+            "django_version": django.get_version(),
+            "python_version": platform.python_version(),
+            "database": "%s %s" % (connection.vendor,
+                                   connection.Database.sqlite_version),
+            "materialize": args.materialize,
+            "dataset": counts,
+            "iterations": args.iterations,
+            "results": results,
+        }
+
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+
+        regressions = compare(results, baseline, args.threshold)
+
+        for name, change, base_queries, queries in regressions:
+            sys.stdout.write("Regression in %s: %+.1f%% p50, %d -> %d "
+                             "queries\n" % (name, change, base_queries,
+                                            queries))
+
+        if regressions:
+            sys.exit(1)
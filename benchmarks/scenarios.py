@@ -0,0 +1,133 @@
+"""
+The operations which are timed by the benchmarks.
+
+Each scenario is a function which is given the `Context` and performs a
+single operation.  Objects are picked at random from the generated dataset,
+using the seed of the context, so runs against the same dataset are
+comparable.
+"""
+
+import random
+
+
+class Context(object):
+
+    def __init__(self, seed=0):
+        from django.contrib.auth.models import Group, User
+        from olp.cache import permission_cache
+
+        from tests.models import Apple
+
+        self.random = random.Random(seed)
+
+        self.user_ids = list(User.objects.values_list("pk", flat=True))
+        self.group_ids = list(Group.objects.values_list("pk", flat=True))
+        self.apple_ids = list(Apple.objects.values_list("pk", flat=True))
+
+        if not (self.user_ids and self.group_ids and self.apple_ids):
+            raise ValueError("The dataset has not been generated.")
+
+        # Loading the permissions is a one-time cost which would otherwise be
+        # counted against whichever scenario runs first
+        permission_cache.load()
+
+    def get_user(self):
+        """
+        Gets a fresh instance of a random user, so no permissions have been
+        cached on it.
+        """
+
+        from django.contrib.auth.models import User
+
+        return User(pk=self.random.choice(self.user_ids))
+
+    def get_group(self):
+        from django.contrib.auth.models import Group
+
+        return Group(pk=self.random.choice(self.group_ids))
+
+    def get_apple(self):
+        from tests.models import Apple
+
+        return Apple(pk=self.random.choice(self.apple_ids))
+
+    def get_permission(self):
+        return self.random.choice(["tests.can_be_awesome", "tests.can_eat"])
+
+
+def utils_has_perm(context):
+    from olp.utils import has_perm
+
+    has_perm(context.get_user(), context.get_permission(),
+             context.get_apple())
+
+
+def backend_has_perm(context):
+    from olp.backends import PermissionBackend
+
+    PermissionBackend().has_perm(context.get_user(),
+                                 context.get_permission(),
+                                 context.get_apple())
+
+
+def backend_get_all_permissions(context):
+    from olp.backends import PermissionBackend
+
+    PermissionBackend().get_all_permissions(context.get_user(),
+                                            context.get_apple())
+
+
+def backend_get_group_permissions(context):
+    from olp.backends import PermissionBackend
+
+    PermissionBackend().get_group_permissions(context.get_user(),
+                                              context.get_apple())
+
+
+def get_obj_ids_for_user(context):
+    from olp.utils import get_obj_ids_for_user
+
+    list(get_obj_ids_for_user(context.get_user(), context.get_permission()))
+
+
+def get_objs_for_user(context):
+    from olp.utils import get_objs_for_user
+
+    list(get_objs_for_user(context.get_user(), context.get_permission())
+         .values_list("pk", flat=True))
+
+
+def assign_perm(context):
+    from olp.utils import assign_perm
+
+    assign_perm(context.get_user(), context.get_permission(),
+                context.get_apple())
+
+
+def assign_group_perm(context):
+    from olp.utils import assign_perm
+
+    assign_perm(context.get_group(), context.get_permission(),
+                context.get_apple())
+
+
+def remove_perm(context):
+    from olp.utils import remove_perm
+
+    remove_perm(context.get_user(), context.get_permission(),
+                context.get_apple())
+
+
+# The scenarios in the order they are run.  Those which write are run last,
+# so they do not change the dataset used by the others.
+SCENARIOS = (
+    ("utils.has_perm", utils_has_perm),
+    ("backend.has_perm", backend_has_perm),
+    ("backend.get_all_permissions", backend_get_all_permissions),
+    ("backend.get_group_permissions", backend_get_group_permissions),
+    ("utils.get_obj_ids_for_user", get_obj_ids_for_user),
+    ("utils.get_objs_for_user", get_objs_for_user),
+    ("utils.assign_perm", assign_perm),
+    ("utils.assign_perm.group", assign_group_perm),
+    ("utils.remove_perm", remove_perm),
+)
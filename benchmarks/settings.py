@@ -0,0 +1,40 @@
+# Settings used when running the benchmarks.  The database is kept in a file
+# so a large dataset only has to be generated once.
+
+import os
+
+DEBUG = False
+
+AUTHENTICATION_BACKENDS = (
+    "django.contrib.auth.backends.ModelBackend",
+    "olp.backends.PermissionBackend",
+)
+
+INSTALLED_APPS = [
+    "django.contrib.auth",
+    "django.contrib.contenttypes",
+    "olp",
+    "tests",
+]
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.environ.get("OLP_BENCHMARK_DB", "olp_benchmark.db"),
+    }
+}
+
+OLP_SETTINGS = {
+    "models": (
+        ("django.contrib.auth.models.Group", "user"),
+    ),
+    "materialize": bool(os.environ.get("OLP_BENCHMARK_MATERIALIZE")),
+}
+
+PASSWORD_HASHERS = [
+    "django.contrib.auth.hashers.MD5PasswordHasher",
+]
+
+SECRET_KEY = "notsosecretkey"
+
+USE_TZ = True
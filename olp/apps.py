@@ -0,0 +1,22 @@
+from django.apps import AppConfig
+
+
+class OLPConfig(AppConfig):
+    name = "olp"
+    verbose_name = "Object-level permissions"
+    default_auto_field = "django.db.models.AutoField"
+
+    def ready(self):
+        from . import packed, signals
+        from .instrumentation import instrumentation
+        from .registry import registry
+        from .utils import patch_models
+
+        packed.check_settings()
+        registry.populate()
+        instrumentation.configure()
+
+        patch_models()
+        signals.connect_membership_signals()
+        signals.connect_cleanup_signals()
+        signals.connect_table_signals()
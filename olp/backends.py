@@ -1,4 +1,12 @@
-from .models import ObjectPermission
+from .cache import shared_cache
+from .instrumentation import instrumentation
+from .utils import PERM_CACHE_ATTR, GROUP_PERM_CACHE_ATTR, clear_perm_cache
+from .utils import HAS_PERM_CACHE_ATTR
+from .utils import _aprepare_content_types, _aprepare_membership_ids
+from .utils import _aget_permission_names, _get_permission_names
+from .utils import _aget_perm_for_codename, _get_perm_for_codename
+from .utils import _ahas_permission, _has_permission
+from .utils import _get_model_permissions, _get_user_querysets
 
 
 class PermissionBackend(object):
@@ -15,74 +23,105 @@ class PermissionBackend(object):
 
         return None
 
-    def get_all_permissions(self, user, obj=None):
-        if user.is_anonymous():
+    @instrumentation.instrument("backend.get_all_permissions")
+    def get_all_permissions(self, user, obj=None, using=None):
+        if user.is_anonymous:
             return set()
 
-        objs = ObjectPermission.objects.for_base(user)
+        perm_cache = self._get_perm_cache(user, PERM_CACHE_ATTR)
+        cache_key = self._get_cache_key(obj)
 
-        if obj is not None:
-            objs = objs.for_target(obj)
+        if cache_key in perm_cache:
+            instrumentation.record_cache(True)
 
-        perms_list = objs.select_related("permission__content_type",
-                                         "permission") \
-                    .values_list("permission__content_type__app_label",
-                                 "permission__codename")
+            return perm_cache[cache_key]
 
-        group_permissions = self.get_group_permissions(user, obj)
+        permissions = shared_cache.get(user, "all", cache_key or (),
+                                       using=using)
 
-        permissions = set(["%s.%s" %
-                          (perm[0], perm[1]) for perm in perms_list])
-        permissions.update(group_permissions)
+        instrumentation.record_cache(permissions is not None)
+
+        if permissions is None:
+            permissions = self._get_permissions(user, obj, include_user=True,
+                                                using=using)
+
+            shared_cache.set(user, "all", cache_key or (), permissions,
+                             using=using)
+
+        perm_cache[cache_key] = permissions
 
         return permissions
 
-    def get_group_permissions(self, user, obj=None):
-        from django.conf import settings
-        from django.contrib.contenttypes.models import ContentType
-        from django.db.models import Q
+    async def aget_all_permissions(self, user, obj=None, using=None):
+        if user.is_anonymous:
+            return set()
+
+        await _aprepare_content_types(user, obj)
+        await _aprepare_membership_ids(user)
+
+        perm_cache = self._get_perm_cache(user, PERM_CACHE_ATTR)
+        cache_key = self._get_cache_key(obj)
+
+        if cache_key in perm_cache:
+            return perm_cache[cache_key]
+
+        permissions = await shared_cache.aget(user, "all", cache_key or (),
+                                              using=using)
 
-        if user.is_anonymous():
+        if permissions is None:
+            permissions = await self._aget_permissions(user, obj,
+                                                       include_user=True,
+                                                       using=using)
+
+            await shared_cache.aset(user, "all", cache_key or (), permissions,
+                                    using=using)
+
+        perm_cache[cache_key] = permissions
+
+        return permissions
+
+    @instrumentation.instrument("backend.get_group_permissions")
+    def get_group_permissions(self, user, obj=None, using=None):
+        if user.is_anonymous:
             return set()
 
-        objs = ObjectPermission.objects.none()
+        perm_cache = self._get_perm_cache(user, GROUP_PERM_CACHE_ATTR)
+        cache_key = self._get_cache_key(obj)
 
-        model_dict = settings.OLP_SETTINGS.get("models")
+        if cache_key in perm_cache:
+            instrumentation.record_cache(True)
 
-        q_filter = Q()
+            return perm_cache[cache_key]
 
-        for model_path, filter_path in model_dict:
-            import_path = ".".join(model_path.split(".")[:-1])
-            model_name = model_path.split(".")[-1]
+        instrumentation.record_cache(False)
 
-            model_module = __import__(import_path, {}, {}, str(model_name))
-            model = getattr(model_module, model_name)
+        permissions = self._get_permissions(user, obj, include_user=False,
+                                            using=using)
 
-            model_objs = model.objects.filter(**{filter_path: user})
-            model_ct = ContentType.objects.get_for_model(model)
+        perm_cache[cache_key] = permissions
 
-            model_filter = (
-                Q(base_object_id__in=model_objs) & Q(base_object_ct=model_ct)
-            )
+        return permissions
 
-            if obj is not None:
-                target_ct = ContentType.objects.get_for_model(obj)
-                target_filter = (
-                    Q(target_object_ct=target_ct) & Q(target_object_id=obj.id)
-                )
+    async def aget_group_permissions(self, user, obj=None, using=None):
+        if user.is_anonymous:
+            return set()
 
-                model_filter = model_filter & target_filter
+        await _aprepare_content_types(user, obj)
+        await _aprepare_membership_ids(user)
 
-            q_filter = q_filter | model_filter
+        perm_cache = self._get_perm_cache(user, GROUP_PERM_CACHE_ATTR)
+        cache_key = self._get_cache_key(obj)
 
-        objs = ObjectPermission.objects.filter(q_filter)
+        if cache_key in perm_cache:
+            return perm_cache[cache_key]
 
-        perms_list = objs.select_related("permission__content_type",
-                                         "permission") \
-                    .values_list("permission__content_type__app_label",
-                                 "permission__codename")
+        permissions = await self._aget_permissions(user, obj,
+                                                   include_user=False,
+                                                   using=using)
 
-        return set(["%s.%s" % (perm[0], perm[1]) for perm in perms_list])
+        perm_cache[cache_key] = permissions
+
+        return permissions
 
     def get_user(self):
         """
@@ -91,8 +130,147 @@ class PermissionBackend(object):
 
         return None
 
-    def has_perm(self, user, perm, obj=None):
+    @instrumentation.instrument("backend.has_perm")
+    def has_perm(self, user, perm, obj=None, using=None):
+        """
+        Determines if a user has a permission, optionally on an object.
+
+        The first permission checked on an object, when the permissions of
+        the user on it have not been cached and the shared cache is not
+        enabled, is checked with an `EXISTS` query instead of reading all of
+        them.  Once a second permission is checked on the same object, all of
+        the permissions are read and cached, so checking many permissions on
+        an object only takes two queries.
+        """
+
         if not user.is_active:
             return False
 
-        return perm in self.get_all_permissions(user, obj)
+        if self._use_all_permissions(user, obj):
+            return perm in self.get_all_permissions(user, obj, using=using)
+
+        checked = self._get_perm_cache(user, HAS_PERM_CACHE_ATTR) \
+            .setdefault(self._get_cache_key(obj), {})
+
+        if perm not in checked:
+            if checked:
+                return perm in self.get_all_permissions(user, obj,
+                                                        using=using)
+
+            permission = _get_perm_for_codename(perm)
+
+            checked[perm] = permission is not None and _has_permission(
+                self._get_user_querysets(user, obj, include_user=True,
+                                         using=using),
+                permission,
+            )
+
+        return checked[perm]
+
+    async def ahas_perm(self, user, perm, obj=None, using=None):
+        if not user.is_active:
+            return False
+
+        await _aprepare_content_types(user, obj)
+
+        if self._use_all_permissions(user, obj):
+            return perm in await self.aget_all_permissions(user, obj,
+                                                           using=using)
+
+        checked = self._get_perm_cache(user, HAS_PERM_CACHE_ATTR) \
+            .setdefault(self._get_cache_key(obj), {})
+
+        if perm not in checked:
+            if checked:
+                return perm in await self.aget_all_permissions(user, obj,
+                                                               using=using)
+
+            permission = await _aget_perm_for_codename(perm)
+
+            await _aprepare_membership_ids(user)
+
+            checked[perm] = permission is not None and \
+                await _ahas_permission(
+                    self._get_user_querysets(user, obj, include_user=True,
+                                             using=using),
+                    permission,
+                )
+
+        return checked[perm]
+
+    def clear_cache(self, user):
+        """
+        Clears the permissions which have been cached on the user.
+
+        Permissions are cached on the user instance the first time they are
+        checked, in the same way as Django's `ModelBackend` caches them, so
+        changes made outside of `assign_perm` and `remove_perm` will only be
+        picked up after the cache is cleared or the user is fetched again.
+        """
+
+        clear_perm_cache(user)
+
+    def _get_permissions(self, user, obj=None, include_user=True,
+                         using=None):
+        """
+        Resolves the permissions for a user in a single query.
+
+        The permissions assigned to the groups of the user, as configured in
+        the `models` setting, are always included.  The permissions which are
+        assigned directly to the user are included when `include_user` is set.
+        They are read from the database `using`, or from the one chosen by
+        the database routers.
+        """
+
+        return _get_permission_names(
+            self._get_user_querysets(user, obj, include_user, using))
+
+    async def _aget_permissions(self, user, obj=None, include_user=True,
+                                using=None):
+        return await _aget_permission_names(
+            self._get_user_querysets(user, obj, include_user, using))
+
+    def _get_user_querysets(self, user, obj=None, include_user=True,
+                            using=None):
+        if obj is None:
+            querysets = _get_user_querysets(user, include_user=include_user,
+                                            using=using)
+        else:
+            querysets = [
+                objs.filter(target_object_id=obj.pk)
+                for objs in _get_user_querysets(user, obj, include_user, using)
+            ]
+
+        model_perms = _get_model_permissions(user, obj, include_user, using)
+
+        if model_perms is not None:
+            querysets.append(model_perms)
+
+        return querysets
+
+    def _use_all_permissions(self, user, obj=None):
+        """
+        Determines if a permission should be checked against all of the
+        permissions of a user, as they have already been cached or are read
+        from the shared cache.
+        """
+
+        perm_cache = self._get_perm_cache(user, PERM_CACHE_ATTR)
+
+        return shared_cache.enabled or self._get_cache_key(obj) in perm_cache
+
+    def _get_cache_key(self, obj):
+        from django.contrib.contenttypes.models import ContentType
+
+        if obj is None:
+            return None
+
+        ct = ContentType.objects.get_for_model(obj)
+
+        return (ct.pk, obj.pk)
+
+    def _get_perm_cache(self, user, cache_attr):
+        if not hasattr(user, cache_attr):
+            setattr(user, cache_attr, {})
+
+        return getattr(user, cache_attr)
@@ -0,0 +1,295 @@
+import threading
+import uuid
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+
+class PermissionCache(object):
+    """
+    Maps permission names, in the form of `app_label.codename`, to the
+    matching `Permission` objects.
+
+    All of the permissions are loaded in a single query the first time the
+    cache is used, so looking up a permission that does not exist will not
+    hit the database either.  The cache is cleared whenever a permission or
+    content type is changed, and is reloaded on the next lookup.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._permissions = None
+        self._generation = 0
+
+    def get(self, permission_name):
+        from .instrumentation import instrumentation
+
+        permissions = self._permissions
+
+        instrumentation.record_cache(permissions is not None)
+
+        if permissions is None:
+            permissions = self.load()
+
+        return permissions.get(permission_name)
+
+    async def aget(self, permission_name):
+        permissions = self._permissions
+
+        if permissions is None:
+            permissions = await self.aload()
+
+        return permissions.get(permission_name)
+
+    def load(self):
+        """
+        Loads all of the permissions from the database, unless another thread
+        has already done so.
+        """
+
+        from django.contrib.auth.models import Permission
+
+        permissions, generation = self._start_load()
+
+        if permissions is not None:
+            return permissions
+
+        permissions = {}
+
+        for permission in Permission.objects.select_related("content_type"):
+            self._add_permission(permissions, permission)
+
+        return self._finish_load(permissions, generation)
+
+    async def aload(self):
+        from django.contrib.auth.models import Permission
+
+        permissions, generation = self._start_load()
+
+        if permissions is not None:
+            return permissions
+
+        permissions = {}
+
+        async for permission in \
+                Permission.objects.select_related("content_type"):
+            self._add_permission(permissions, permission)
+
+        return self._finish_load(permissions, generation)
+
+    def clear(self):
+        with self._lock:
+            self._permissions = None
+            self._generation += 1
+
+    def _start_load(self):
+        with self._lock:
+            return self._permissions, self._generation
+
+    def _add_permission(self, permissions, permission):
+        permission_name = "%s.%s" % (permission.content_type.app_label,
+                                     permission.codename)
+
+        permissions.setdefault(permission_name, permission)
+
+    def _finish_load(self, permissions, generation):
+        with self._lock:
+            # The cache was cleared while the permissions were being loaded,
+            # so they may already be out of date.
+            if self._generation == generation:
+                self._permissions = permissions
+
+        return permissions
+
+
+permission_cache = PermissionCache()
+
+
+class SharedPermissionCache(object):
+    """
+    Caches the permissions of base objects in one of the caches configured in
+    Django, so they can be shared between processes.
+
+    The cache is only used when the `cache` key of the settings is set to the
+    alias of a cache.  Every base object has a version, which is part of the
+    keys that its permissions are cached under, and is replaced whenever its
+    permissions change.  Permissions given through the models in the settings
+    also depend on a global version, which is replaced whenever one of those
+    models is given a permission or its members change.
+
+    Versions are only replaced once the transaction that changed the
+    permissions is committed, and the cache is not used for the rest of a
+    transaction once the permissions have been changed within it, so
+    permissions which are rolled back can never end up in the cache.
+    """
+
+    GLOBAL_VERSION_KEY = "olp:version"
+    BASE_VERSION_KEY = "olp:version:%s:%s"
+    PERMISSIONS_KEY = "olp:perms:%s:%s:%s:%s:%s:%s"
+
+    def get_cache(self):
+        from django.core.cache import caches
+        from .utils import _get_setting
+
+        cache_alias = _get_setting("cache")
+
+        if not cache_alias:
+            return None
+
+        return caches[cache_alias]
+
+    @property
+    def enabled(self):
+        return self.get_cache() is not None
+
+    def get(self, base, name, args=(), using=None):
+        """
+        Gets cached permissions for a base object, or `None` if they have not
+        been cached.
+        """
+
+        cache = self.get_cache()
+
+        if cache is None or self._is_dirty(using):
+            return None
+
+        return cache.get(self._get_key(cache, base, name, args))
+
+    def set(self, base, name, args, value, using=None):
+        from .utils import _get_setting
+
+        cache = self.get_cache()
+
+        if cache is None or self._is_dirty(using):
+            return
+
+        timeout = _get_setting("cache_timeout", DEFAULT_TIMEOUT)
+
+        cache.set(self._get_key(cache, base, name, args), value, timeout)
+
+    async def aget(self, base, name, args=(), using=None):
+        """
+        Asynchronous version of `get`.  The cache backends and the versions
+        of the keys are only read synchronously, so this is done in a thread.
+        """
+
+        from asgiref.sync import sync_to_async
+
+        if not self.enabled:
+            return None
+
+        return await sync_to_async(self.get)(base, name, args, using=using)
+
+    async def aset(self, base, name, args, value, using=None):
+        from asgiref.sync import sync_to_async
+
+        if not self.enabled:
+            return
+
+        await sync_to_async(self.set)(base, name, args, value, using=using)
+
+    def invalidate(self, base=None, using=None):
+        """
+        Invalidates the cached permissions of a base object, given either as
+        an instance or a pair of a content type id and an object id.
+
+        When no base object is given, the permissions of all of the base
+        objects are invalidated.  This is also done when the base object is
+        one of the models in the settings, as it may give permissions to any
+        number of users.
+        """
+
+        from django.db import transaction
+
+        if not self.enabled:
+            return
+
+        version_keys = [self.GLOBAL_VERSION_KEY]
+
+        if base is not None:
+            base_ct_id, base_id = self._get_base_key(base)
+
+            if not self._is_registered_ct(base_ct_id):
+                version_keys = [self.BASE_VERSION_KEY % (base_ct_id, base_id)]
+
+        self._mark_dirty(using)
+
+        transaction.on_commit(lambda: self._replace_versions(version_keys),
+                              using=using)
+
+    def _get_key(self, cache, base, name, args):
+        base_ct_id, base_id = self._get_base_key(base)
+
+        base_version_key = self.BASE_VERSION_KEY % (base_ct_id, base_id)
+
+        versions = cache.get_many([self.GLOBAL_VERSION_KEY, base_version_key])
+
+        global_version = versions.get(self.GLOBAL_VERSION_KEY)
+        base_version = versions.get(base_version_key)
+
+        if global_version is None:
+            global_version = self._add_version(cache, self.GLOBAL_VERSION_KEY)
+
+        if base_version is None:
+            base_version = self._add_version(cache, base_version_key)
+
+        args = ":".join(str(arg) for arg in args) or "-"
+
+        return self.PERMISSIONS_KEY % (name, base_ct_id, base_id,
+                                       global_version, base_version, args)
+
+    def _get_base_key(self, base):
+        from django.contrib.contenttypes.models import ContentType
+
+        if isinstance(base, tuple):
+            return base
+
+        base_ct = ContentType.objects.get_for_model(base)
+
+        return (base_ct.pk, base.pk)
+
+    def _is_registered_ct(self, ct_id):
+        from .registry import registry
+
+        for registered_model in registry:
+            if registered_model.content_type.pk == ct_id:
+                return True
+
+        return False
+
+    def _add_version(self, cache, version_key):
+        # Versions which have been evicted are never reused, as that could
+        # bring back permissions which were cached before they were replaced.
+        cache.add(version_key, uuid.uuid4().hex, None)
+
+        return cache.get(version_key)
+
+    def _replace_versions(self, version_keys):
+        cache = self.get_cache()
+
+        if cache is None:
+            return
+
+        cache.set_many(dict((version_key, uuid.uuid4().hex)
+                            for version_key in version_keys), None)
+
+    def _is_dirty(self, using=None):
+        connection = self._get_connection(using)
+
+        if not connection.in_atomic_block:
+            connection.olp_cache_dirty = False
+
+        return getattr(connection, "olp_cache_dirty", False)
+
+    def _mark_dirty(self, using=None):
+        connection = self._get_connection(using)
+
+        if connection.in_atomic_block:
+            connection.olp_cache_dirty = True
+
+    def _get_connection(self, using=None):
+        from django.db import DEFAULT_DB_ALIAS, connections
+
+        return connections[using or DEFAULT_DB_ALIAS]
+
+
+shared_cache = SharedPermissionCache()
@@ -0,0 +1,273 @@
+"""
+Maintains the `EffectivePermission` table, which holds the permissions that
+every user has on every object, either directly or through the models in the
+settings.
+"""
+
+
+def is_enabled():
+    from .utils import _get_setting
+
+    return bool(_get_setting("materialize", False))
+
+
+def uses_effective_permissions(user):
+    """
+    Determines if the permissions of a user can be read from the
+    `EffectivePermission` table.
+    """
+
+    from django.contrib.auth import get_user_model
+
+    return is_enabled() and isinstance(user, get_user_model())
+
+
+def get_member_ids(bases):
+    """
+    Gets the ids of the users whose permissions depend on the permissions of
+    the base objects, which can be users, instances of the models in the
+    settings, querysets of either, or pairs of a content type id and an
+    object id.
+    """
+
+    from django.contrib.auth import get_user_model
+    from django.contrib.contenttypes.models import ContentType
+    from django.db.models import Model, QuerySet
+
+    from .registry import registry
+
+    user_model = get_user_model()
+
+    if isinstance(bases, (Model, QuerySet)):
+        bases = [bases]
+
+    user_ids = set()
+
+    for base in bases:
+        if isinstance(base, QuerySet):
+            model = base.model
+            queryset = base
+        elif isinstance(base, tuple):
+            model = ContentType.objects.get_for_id(base[0]).model_class()
+            queryset = model._default_manager.filter(pk=base[1])
+        else:
+            model = base.__class__
+            queryset = model._default_manager.filter(pk=base.pk)
+
+        if issubclass(model, user_model):
+            user_ids.update(queryset.values_list("pk", flat=True))
+
+        for registered_model in registry:
+            if not issubclass(model, registered_model.model):
+                continue
+
+            member_ids = queryset.values_list(registered_model.filter_path,
+                                              flat=True)
+
+            user_ids.update(member_id for member_id in member_ids
+                            if member_id is not None)
+
+    return user_ids
+
+
+def refresh_for_bases(bases, target=None):
+    """
+    Refreshes the effective permissions of the users affected by a change to
+    the permissions of the base objects, optionally only on a single target.
+    """
+
+    if not is_enabled():
+        return
+
+    refresh_effective_permissions(get_member_ids(bases), target)
+
+
+def refresh_effective_permissions(user_ids, target=None, batch_size=None):
+    """
+    Recalculates the effective permissions of the given users, optionally
+    only on a single target object, given as an instance or as a pair of a
+    content type id and an object id.
+
+    The permissions of every batch of users are calculated using a query for
+    the permissions given directly to the users and one for each of the
+    models in the settings, and then replace the existing ones.
+    """
+
+    from django.contrib.auth import get_user_model
+    from django.contrib.contenttypes.models import ContentType
+    from django.db import transaction
+
+    from .models import EffectivePermission, ObjectPermission
+    from .registry import registry
+    from .utils import _bulk_delete_permissions, _get_batch_size, _iter_batches
+
+    batch_size = _get_batch_size(batch_size)
+
+    user_ct = ContentType.objects.get_for_model(get_user_model())
+
+    obj_perms = ObjectPermission.objects.all()
+    effective_perms = EffectivePermission.objects.all()
+
+    if target is not None:
+        target_ct_id, target_id = _get_target_key(target)
+
+        obj_perms = obj_perms.filter(target_object_ct_id=target_ct_id,
+                                     target_object_id=target_id)
+        effective_perms = effective_perms.filter(
+            target_object_ct_id=target_ct_id,
+            target_object_id=target_id,
+        )
+
+    fields = ("base_object_id", "target_object_ct_id", "target_object_id",
+              "permission_id")
+
+    for user_batch in _iter_batches(sorted(user_ids), batch_size):
+        rows = set()
+
+        direct_perms = obj_perms.filter(base_object_ct=user_ct,
+                                        base_object_id__in=user_batch)
+
+        for user_id, target_ct_id, target_id, permission_id in \
+                direct_perms.values_list(*fields):
+            rows.add((user_id, target_ct_id, target_id, permission_id))
+
+        for registered_model in registry:
+            members = {}
+
+            memberships = registered_model.model._default_manager.filter(**{
+                "%s__in" % registered_model.filter_path: user_batch,
+            }).values_list("pk", registered_model.filter_path)
+
+            for base_id, user_id in memberships:
+                members.setdefault(base_id, set()).add(user_id)
+
+            for base_batch in _iter_batches(sorted(members), batch_size):
+                group_perms = obj_perms.filter(
+                    base_object_ct=registered_model.content_type,
+                    base_object_id__in=base_batch,
+                )
+
+                for base_id, target_ct_id, target_id, permission_id in \
+                        group_perms.values_list(*fields):
+                    for user_id in members[base_id]:
+                        rows.add((user_id, target_ct_id, target_id,
+                                  permission_id))
+
+        new_perms = [
+            EffectivePermission(user_id=user_id,
+                                target_object_ct_id=target_ct_id,
+                                target_object_id=target_id,
+                                permission_id=permission_id)
+            for user_id, target_ct_id, target_id, permission_id in rows
+        ]
+
+        with transaction.atomic():
+            _bulk_delete_permissions(
+                effective_perms.filter(user__in=user_batch))
+
+            EffectivePermission.objects.bulk_create(new_perms,
+                                                    batch_size=batch_size,
+                                                    ignore_conflicts=True)
+
+
+def remove_for_target(target):
+    """
+    Removes the effective permissions that any user has on an object.
+    """
+
+    if not is_enabled():
+        return
+
+    target_ct_id, target_id = _get_target_key(target)
+
+    remove_for_targets(target_ct_id, [target_id])
+
+
+def remove_for_targets(target_ct, target_ids):
+    """
+    Removes the effective permissions that any user has on a batch of
+    objects of a single content type, given as an instance or an id.
+    """
+
+    from .models import EffectivePermission
+    from .utils import _bulk_delete_permissions
+
+    if not is_enabled():
+        return
+
+    _bulk_delete_permissions(EffectivePermission.objects.filter(
+        target_object_ct_id=getattr(target_ct, "pk", target_ct),
+        target_object_id__in=target_ids,
+    ))
+
+
+def rebuild_effective_permissions(user_ids=None, batch_size=None,
+                                  processes=1):
+    """
+    Rebuilds the effective permissions of the given users, or of all users.
+
+    The users are split into batches of `batch_size` users, which can be
+    rebuilt in parallel by a pool of `processes` worker processes.  Returns
+    the number of users which were rebuilt.
+    """
+
+    from concurrent.futures import ProcessPoolExecutor
+    from django.contrib.auth import get_user_model
+    from django.db import connections
+
+    from .models import EffectivePermission
+    from .utils import _bulk_delete_permissions, _get_batch_size, _iter_batches
+
+    batch_size = _get_batch_size(batch_size)
+
+    if user_ids is None:
+        user_model = get_user_model()
+
+        # Remove any permissions left behind by users that were deleted
+        # without going through the ORM
+        _bulk_delete_permissions(EffectivePermission.objects.exclude(
+            user__in=user_model._default_manager.all()
+        ))
+
+        user_ids = user_model._default_manager.order_by("pk") \
+            .values_list("pk", flat=True)
+
+    user_batches = list(_iter_batches(user_ids, batch_size))
+
+    if processes <= 1:
+        for user_batch in user_batches:
+            refresh_effective_permissions(user_batch, batch_size=batch_size)
+    else:
+        # Database connections cannot be shared with the worker processes
+        connections.close_all()
+
+        with ProcessPoolExecutor(max_workers=processes,
+                                 initializer=_init_worker) as executor:
+            list(executor.map(_refresh_batch, user_batches,
+                              [batch_size] * len(user_batches)))
+
+    return sum(len(user_batch) for user_batch in user_batches)
+
+
+def _init_worker():
+    import django
+    from django.db import connections
+
+    django.setup()
+
+    connections.close_all()
+
+
+def _refresh_batch(user_ids, batch_size):
+    refresh_effective_permissions(user_ids, batch_size=batch_size)
+
+
+def _get_target_key(target):
+    from django.contrib.contenttypes.models import ContentType
+
+    if isinstance(target, tuple):
+        return target
+
+    target_ct = ContentType.objects.get_for_model(target)
+
+    return (target_ct.pk, target.pk)
@@ -0,0 +1,187 @@
+from itertools import groupby
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ("Converts the object permissions between the row storage, with "
+            "one row for every permission, and the packed storage, with one "
+            "row for every pair of a base and target object.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--to", choices=("packed", "rows"), required=True,
+            help="The storage to convert the permissions to.",
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=2000,
+            help="The number of rows to read from the database at a time.",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=None,
+            help="The number of rows to write in each query.",
+        )
+        parser.add_argument(
+            "--delete-source", action="store_true",
+            help="Delete the permissions from the storage they were converted "
+                 "from.",
+        )
+
+    def handle(self, *args, **options):
+        from django.db import transaction
+        from olp import packed
+        from olp.cache import shared_cache
+        from olp.models import ObjectPermission, PackedObjectPermission
+        from olp.utils import _bulk_delete_permissions, _get_batch_size
+
+        batch_size = _get_batch_size(options["batch_size"])
+
+        with transaction.atomic():
+            if options["to"] == "packed":
+                source = ObjectPermission
+
+                read, written = self._to_packed(options["chunk_size"],
+                                                batch_size)
+            else:
+                source = PackedObjectPermission
+
+                read, written = self._to_rows(options["chunk_size"],
+                                              batch_size)
+
+            if options["delete_source"]:
+                _bulk_delete_permissions(source.objects.all())
+
+        shared_cache.invalidate()
+
+        self.stdout.write("Converted %d rows into %d new rows of the %s "
+                          "storage." % (read, written, options["to"]))
+
+        if packed.is_enabled() != (options["to"] == "packed"):
+            self.stdout.write(
+                "The storage key of OLP_SETTINGS should be set to '%s' for "
+                "the converted permissions to be used." % options["to"]
+            )
+
+    def _to_packed(self, chunk_size, batch_size):
+        """
+        Replaces the packed rows with the permissions in the row storage.
+
+        The rows are read in the order of the unique constraint, so the
+        permissions of every pair of a base and target object are next to
+        each other and can be combined into a single mask.
+        """
+
+        from olp.models import (
+            ObjectPermission, PackedObjectPermission, PermissionBit
+        )
+        from olp.packed import permission_bits
+        from olp.utils import _bulk_delete_permissions, _iter_batches
+
+        fields = ("base_object_ct", "base_object_id", "target_object_ct",
+                  "target_object_id")
+
+        rows = ObjectPermission.objects.order_by(*fields) \
+            .values_list(*(fields + ("permission",))) \
+            .iterator(chunk_size=chunk_size)
+
+        # The bits are assigned up front, as they are not cached while the
+        # transaction that assigned them is open.  The existing bits of every
+        # content type are read once, instead of for every permission.
+        bits = {}
+        permission_ids = {}
+
+        pairs = ObjectPermission.objects.order_by() \
+            .values_list("target_object_ct", "permission").distinct()
+
+        for target_ct_id, permission_id in pairs:
+            permission_ids.setdefault(target_ct_id, []).append(permission_id)
+
+        for target_ct_id, ct_permission_ids in permission_ids.items():
+            existing = dict(PermissionBit.objects.filter(
+                content_type_id=target_ct_id,
+            ).values_list("permission", "bit"))
+
+            for permission_id in ct_permission_ids:
+                if permission_id not in existing:
+                    existing[permission_id] = permission_bits._create_bit(
+                        target_ct_id, permission_id)
+
+                bits[(target_ct_id, permission_id)] = existing[permission_id]
+
+        counts = {"read": 0}
+
+        def iter_packed():
+            for key, perms in groupby(rows, key=lambda row: row[:4]):
+                mask = 0
+
+                for row in perms:
+                    mask |= 1 << bits[(key[2], row[4])]
+                    counts["read"] += 1
+
+                yield PackedObjectPermission(
+                    base_object_ct_id=key[0],
+                    base_object_id=key[1],
+                    target_object_ct_id=key[2],
+                    target_object_id=key[3],
+                    mask=mask,
+                )
+
+        _bulk_delete_permissions(PackedObjectPermission.objects.all())
+
+        written = 0
+
+        for batch in _iter_batches(iter_packed(), batch_size):
+            PackedObjectPermission.objects.bulk_create(batch)
+
+            written += len(batch)
+
+        return counts["read"], written
+
+    def _to_rows(self, chunk_size, batch_size):
+        """
+        Adds the permissions in the packed storage to the row storage,
+        skipping any which are already there.  The number of rows which were
+        added is returned along with the number which were read.
+        """
+
+        from olp.models import ObjectPermission, PackedObjectPermission
+        from olp.packed import permission_bits
+        from olp.utils import _iter_batches
+
+        rows = PackedObjectPermission.objects.order_by("id").values_list(
+            "base_object_ct", "base_object_id", "target_object_ct",
+            "target_object_id", "mask",
+        ).iterator(chunk_size=chunk_size)
+
+        counts = {"read": 0}
+        masks = {}
+
+        # The bits are loaded once for all of the masks
+        bits, permissions = permission_bits.load()
+
+        def iter_rows():
+            for base_ct_id, base_id, target_ct_id, target_id, mask in rows:
+                counts["read"] += 1
+
+                if (target_ct_id, mask) not in masks:
+                    masks[(target_ct_id, mask)] = \
+                        permission_bits._get_permissions(permissions,
+                                                         target_ct_id, mask)
+
+                for permission in masks[(target_ct_id, mask)]:
+                    yield ObjectPermission(
+                        base_object_ct_id=base_ct_id,
+                        base_object_id=base_id,
+                        target_object_ct_id=target_ct_id,
+                        target_object_id=target_id,
+                        permission_id=permission.pk,
+                    )
+
+        # The rows which were already there are skipped by the database, so
+        # only the difference in the number of rows shows how many were added
+        initial_count = ObjectPermission.objects.count()
+
+        for batch in _iter_batches(iter_rows(), batch_size):
+            ObjectPermission.objects.bulk_create(batch, ignore_conflicts=True)
+
+        return counts["read"], ObjectPermission.objects.count() - initial_count
@@ -0,0 +1,305 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ("Shows the queries which OLP runs to check a permission of a "
+            "user, along with the query plans of the database, the number of "
+            "rows involved, and warnings for full scans of the permission "
+            "tables.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "user",
+            help="The username of the user to check the permission for.",
+        )
+        parser.add_argument(
+            "permission",
+            help="The permission to check, as app_label.codename.",
+        )
+        parser.add_argument(
+            "--target",
+            help="The object to check the permission on, as "
+                 "app_label.model:pk.",
+        )
+        parser.add_argument(
+            "--model",
+            help="The model whose objects are listed, as app_label.model.  "
+                 "Defaults to the model of the target or of the permission.",
+        )
+        parser.add_argument(
+            "--database", default="default",
+            help="The database to run the queries on.",
+        )
+        parser.add_argument(
+            "--count", action="store_true",
+            help="Count the rows of each permission table, which reads all "
+                 "of them.  Otherwise only the estimates of the query planner "
+                 "are shown, where the database keeps them.",
+        )
+
+    def handle(self, *args, **options):
+        from django.contrib.auth import get_user_model
+        from django.db import connections
+        from olp.cache import permission_cache, shared_cache
+
+        using = options["database"]
+        connection = connections[using]
+
+        user_model = get_user_model()
+
+        try:
+            user = user_model._default_manager.db_manager(using) \
+                .get_by_natural_key(options["user"])
+        except user_model.DoesNotExist:
+            raise CommandError("User '%s' does not exist." % options["user"])
+
+        permission = permission_cache.get(options["permission"])
+
+        if permission is None:
+            raise CommandError("Permission '%s' does not exist." %
+                               options["permission"])
+
+        target = self._get_target(options["target"], using)
+
+        if options["model"]:
+            model = self._get_model(options["model"])
+        elif target is not None:
+            model = type(target)
+        else:
+            model = permission.content_type.model_class()
+
+        tables = self._get_tables()
+
+        for table in tables:
+            if options["count"]:
+                self.stdout.write("Rows in %s: %d" % (
+                    table, self._count_rows(connection, table)))
+                continue
+
+            estimate = self._estimate_rows(connection, table)
+
+            if estimate is not None:
+                self.stdout.write("Estimated rows in %s: %d" % (table,
+                                                                estimate))
+
+        if not options["count"]:
+            self.stdout.write("The rows of the permission tables can be "
+                              "counted with --count.")
+
+        if shared_cache.enabled:
+            self.stdout.write(
+                "The shared cache is enabled, so permissions which are cached "
+                "are not read from the database."
+            )
+
+        for name, queries in self._iter_entry_points(user, permission, target,
+                                                     model, using):
+            self.stdout.write("")
+            self.stdout.write("== %s ==" % name)
+
+            if not queries:
+                self.stdout.write("No queries.")
+
+            for index, (sql, params) in enumerate(queries, 1):
+                self._explain(connection, index, sql, params, tables)
+
+    def _count_rows(self, connection, table):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM %s" %
+                           connection.ops.quote_name(table))
+
+            return cursor.fetchone()[0]
+
+    def _estimate_rows(self, connection, table):
+        """
+        Gets the number of rows in a table estimated by the query planner, or
+        `None` if the database does not keep an estimate.  Only PostgreSQL
+        does so without the tables being analyzed first.
+        """
+
+        if connection.vendor != "postgresql":
+            return None
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples FROM pg_class WHERE oid = "
+                           "%s::regclass", [connection.ops.quote_name(table)])
+
+            row = cursor.fetchone()
+
+        # Tables which have never been analyzed are estimated at -1
+        if row is None or row[0] < 0:
+            return None
+
+        return int(row[0])
+
+    def _iter_entry_points(self, user, permission, target, model, using):
+        """
+        Runs each of the functions which check the permission, and yields the
+        queries that they ran, along with those of any queryset which they
+        returned without evaluating it.
+        """
+
+        from django.db import connections
+        from django.db.models import QuerySet
+        from django.test.utils import CaptureQueriesContext
+        from olp.backends import PermissionBackend
+        from olp.utils import clear_perm_cache, get_obj_ids_for_user
+        from olp.utils import get_objs_for_user, has_perm
+
+        backend = PermissionBackend()
+        perm_name = "%s.%s" % (permission.content_type.app_label,
+                               permission.codename)
+
+        entry_points = [
+            ("has_perm", lambda: has_perm(
+                user, permission, target, using=using)),
+            ("PermissionBackend.has_perm", lambda: backend.has_perm(
+                user, perm_name, target, using=using)),
+            ("PermissionBackend.get_all_permissions",
+             lambda: backend.get_all_permissions(user, target, using=using)),
+            ("PermissionBackend.get_group_permissions",
+             lambda: backend.get_group_permissions(user, target,
+                                                   using=using)),
+            ("get_obj_ids_for_user", lambda: get_obj_ids_for_user(
+                user, permission, model, using=using)),
+            ("get_objs_for_user", lambda: get_objs_for_user(
+                user, permission, model, using=using)),
+        ]
+
+        for name, entry_point in entry_points:
+            # The permissions cached on the user would hide the queries
+            clear_perm_cache(user)
+
+            with CaptureQueriesContext(connections[using]) as captured:
+                result = entry_point()
+
+            queries = [(query["sql"], None)
+                       for query in captured.captured_queries]
+
+            if isinstance(result, QuerySet):
+                queries.append(result.query.get_compiler(using).as_sql())
+
+            yield name, queries
+
+    def _explain(self, connection, index, sql, params, tables):
+        self.stdout.write("Query %d:" % index)
+        self.stdout.write("  %s" % sql)
+
+        if params is not None:
+            self.stdout.write("  Params: %r" % (tuple(params),))
+
+        with connection.cursor() as cursor:
+            self._execute(cursor, "SELECT COUNT(*) FROM (%s) olp_rows" % sql,
+                          params)
+
+            self.stdout.write("  Rows: %d" % cursor.fetchone()[0])
+
+            self._execute(cursor, "%s %s" % (
+                connection.ops.explain_query_prefix(), sql), params)
+
+            plan = [self._format_plan_row(connection, row)
+                    for row in cursor.fetchall()]
+
+        self.stdout.write("  Plan:")
+
+        for line in plan:
+            self.stdout.write("    %s" % line)
+
+        for table in self._get_scanned_tables(plan, tables, sql):
+            self.stdout.write(self.style.WARNING(
+                "  Warning: the query scans all of %s." % table))
+
+    def _execute(self, cursor, sql, params):
+        # The captured queries already have their parameters filled in
+        if params is None:
+            cursor.execute(sql)
+        else:
+            cursor.execute(sql, params)
+
+    def _format_plan_row(self, connection, row):
+        # SQLite returns the ids of the steps before the description
+        if connection.vendor == "sqlite" or len(row) == 1:
+            return str(row[-1])
+
+        return " | ".join(str(column) for column in row)
+
+    def _get_scanned_tables(self, plan, tables, sql=""):
+        """
+        Finds the permission tables which are read in full, which is shown as
+        `SCAN` by SQLite and `Seq Scan` by PostgreSQL.  Tables in subqueries
+        are given aliases such as `U0` by Django, which SQLite shows instead.
+        """
+
+        scanned = []
+
+        for table in tables:
+            names = [table] + re.findall(r'\b%s"? "?([A-Z]\d+)\b' %
+                                         re.escape(table), sql)
+
+            pattern = re.compile(r"(\bSCAN (TABLE )?|Seq Scan on )(%s)\b" %
+                                 "|".join(re.escape(name) for name in names))
+
+            if any(pattern.search(line) for line in plan):
+                scanned.append(table)
+
+        return scanned
+
+    def _get_tables(self):
+        """
+        Gets the names of the tables which the permissions can be read from.
+        """
+
+        from olp import effective
+        from olp.models import ModelPermission
+        from olp.registry import registry
+        from olp.utils import _get_permission_model, _get_setting
+
+        models = [_get_permission_model()]
+
+        if effective.is_enabled():
+            from olp.models import EffectivePermission
+
+            models.append(EffectivePermission)
+
+        if _get_setting("model_permissions"):
+            models.append(ModelPermission)
+
+        models.extend(table for base_model, target_model, table
+                      in registry.get_tables())
+
+        return [model._meta.db_table for model in models]
+
+    def _get_model(self, name):
+        from django.contrib.contenttypes.models import ContentType
+
+        try:
+            app_label, model_name = name.lower().split(".")
+
+            model = ContentType.objects.get_by_natural_key(
+                app_label, model_name).model_class()
+        except (ValueError, ContentType.DoesNotExist):
+            model = None
+
+        if model is None:
+            raise CommandError("Model '%s' does not exist." % name)
+
+        return model
+
+    def _get_target(self, target, using):
+        if not target:
+            return None
+
+        name, sep, pk = target.rpartition(":")
+
+        if not sep:
+            raise CommandError("The target should be given as "
+                               "app_label.model:pk.")
+
+        model = self._get_model(name)
+
+        try:
+            return model._default_manager.db_manager(using).get(pk=pk)
+        except (model.DoesNotExist, ValueError):
+            raise CommandError("Object '%s' does not exist." % target)
@@ -0,0 +1,150 @@
+import csv
+import itertools
+import json
+
+from django.core.management.base import BaseCommand
+
+
+# The columns of an exported permission, in the order used by CSV files
+FIELDS = ("base", "base_id", "target", "target_id", "permission")
+
+
+class Command(BaseCommand):
+    help = ("Exports the object permissions as JSON lines or CSV, using the "
+            "natural keys of the content types and permissions.  Permissions "
+            "on every instance of a model are exported without a target id.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "output", nargs="?", default="-",
+            help="The file to write to.  Defaults to standard output.",
+        )
+        parser.add_argument(
+            "--format", choices=("jsonl", "csv"), default="jsonl",
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=2000,
+            help="The number of rows to read from the database at a time.",
+        )
+
+    def handle(self, *args, **options):
+        from olp import packed
+        from olp.models import ObjectPermission
+
+        chunk_size = options["chunk_size"]
+
+        if packed.is_enabled():
+            rows = self._iter_packed(chunk_size)
+        else:
+            rows = ObjectPermission.objects.order_by("id").values_list(
+                "base_object_ct__app_label", "base_object_ct__model",
+                "base_object_id",
+                "target_object_ct__app_label", "target_object_ct__model",
+                "target_object_id",
+                "permission__content_type__app_label", "permission__codename",
+            ).iterator(chunk_size=chunk_size)
+
+        rows = itertools.chain(rows, self._iter_tables(chunk_size),
+                               self._iter_model_permissions(chunk_size))
+
+        if options["output"] == "-":
+            output = self.stdout
+        else:
+            output = open(options["output"], "w", newline="")
+
+        try:
+            count = self._write(output, rows, options["format"])
+        finally:
+            if output is not self.stdout:
+                output.close()
+
+        self.stderr.write("Exported %d permissions." % count)
+
+    def _iter_packed(self, chunk_size):
+        """
+        Unpacks the masks of the packed storage into the same rows as are
+        read from the row storage.
+        """
+
+        from olp.models import PackedObjectPermission
+        from olp.packed import permission_bits
+
+        rows = PackedObjectPermission.objects.order_by("id").values_list(
+            "base_object_ct__app_label", "base_object_ct__model",
+            "base_object_id",
+            "target_object_ct__app_label", "target_object_ct__model",
+            "target_object_id",
+            "target_object_ct", "mask",
+        ).iterator(chunk_size=chunk_size)
+
+        for row in rows:
+            for permission in permission_bits.get_permissions(row[6], row[7]):
+                yield row[:6] + (permission.content_type.app_label,
+                                 permission.codename)
+
+    def _iter_tables(self, chunk_size):
+        """
+        Reads the permissions stored in the tables in the settings, whose
+        content types are given by the models of the tables.
+        """
+
+        from olp.registry import registry
+
+        for base_model, target_model, table in registry.get_tables():
+            rows = table.objects.order_by("pk").values_list(
+                "base_object_id", "target_object_id",
+                "permission__content_type__app_label", "permission__codename",
+            ).iterator(chunk_size=chunk_size)
+
+            for row in rows:
+                yield (base_model._meta.app_label, base_model._meta.model_name,
+                       row[0],
+                       target_model._meta.app_label,
+                       target_model._meta.model_name,
+                       row[1], row[2], row[3])
+
+    def _iter_model_permissions(self, chunk_size):
+        """
+        Reads the permissions on every instance of a model, which do not have
+        a target id.
+        """
+
+        from olp.models import ModelPermission
+        from olp.utils import _get_setting
+
+        if not _get_setting("model_permissions"):
+            return
+
+        rows = ModelPermission.objects.order_by("id").values_list(
+            "base_object_ct__app_label", "base_object_ct__model",
+            "base_object_id",
+            "target_object_ct__app_label", "target_object_ct__model",
+            "permission__content_type__app_label", "permission__codename",
+        ).iterator(chunk_size=chunk_size)
+
+        for row in rows:
+            yield row[:5] + (None,) + row[5:]
+
+    def _write(self, output, rows, format):
+        if format == "csv":
+            writer = csv.writer(output)
+            writer.writerow(FIELDS)
+
+        count = 0
+
+        for row in rows:
+            permission = (
+                "%s.%s" % (row[0], row[1]), row[2],
+                "%s.%s" % (row[3], row[4]), row[5],
+                "%s.%s" % (row[6], row[7]),
+            )
+
+            if format == "csv":
+                writer.writerow(permission)
+            else:
+                output.write("%s\n" % json.dumps(dict(zip(FIELDS,
+                                                           permission))))
+
+            count += 1
+
+        return count
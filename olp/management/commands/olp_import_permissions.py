@@ -0,0 +1,213 @@
+import csv
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ("Imports object permissions exported by olp_export_permissions, "
+            "skipping any which have already been assigned.  Permissions are "
+            "written to the tables in the settings, and those without a "
+            "target id to the permissions on every instance of a model.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "input", nargs="?", default="-",
+            help="The file to read from.  Defaults to standard input.",
+        )
+        parser.add_argument(
+            "--format", choices=("jsonl", "csv"), default="jsonl",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=None,
+            help="The number of permissions to write in each query.",
+        )
+
+    def handle(self, *args, **options):
+        from olp import effective, packed
+        from olp.cache import shared_cache
+        from olp.utils import _get_batch_size, _iter_batches
+
+        if packed.is_enabled():
+            raise CommandError(
+                "Permissions can only be imported into the row storage.  "
+                "They can be converted afterwards with olp_convert_storage."
+            )
+
+        batch_size = _get_batch_size(options["batch_size"])
+
+        if options["input"] == "-":
+            input_file = sys.stdin
+        else:
+            input_file = open(options["input"], newline="")
+
+        self._skipped = 0
+        self._missing_content_types = set()
+        self._tables = {}
+
+        count = 0
+
+        try:
+            rows = self._read(input_file, options["format"])
+            permissions = self._iter_permissions(rows)
+
+            for batch in _iter_batches(permissions, batch_size):
+                for model, objs in self._group_by_model(batch).items():
+                    model.objects.bulk_create(objs, ignore_conflicts=True)
+
+                count += len(batch)
+        finally:
+            if input_file is not sys.stdin:
+                input_file.close()
+
+        if count:
+            shared_cache.invalidate()
+
+            if effective.is_enabled():
+                self.stdout.write(
+                    "The effective permissions should be rebuilt with "
+                    "olp_rebuild_effective_permissions."
+                )
+
+        if self._skipped:
+            self.stdout.write(
+                "Skipped %d permissions whose content type or permission "
+                "does not exist." % self._skipped
+            )
+
+        # Counting the permissions which already existed would need the whole
+        # table to be counted, so only the rows which were written are given
+        self.stdout.write("Wrote %d permissions, ignoring any which had "
+                          "already been assigned." % count)
+
+    def _read(self, input_file, format):
+        """
+        Reads the exported permissions, along with the line that each of them
+        started on.
+        """
+
+        if format == "csv":
+            reader = csv.DictReader(input_file)
+
+            for row in reader:
+                yield reader.line_num, row
+
+            return
+
+        for line_number, line in enumerate(input_file, 1):
+            if not line.strip():
+                continue
+
+            try:
+                yield line_number, json.loads(line)
+            except ValueError as e:
+                raise CommandError("Line %d is not valid JSON: %s" %
+                                   (line_number, e))
+
+    def _iter_permissions(self, rows):
+        from django.core.exceptions import ValidationError
+        from olp.cache import permission_cache
+
+        for line_number, row in rows:
+            try:
+                base_ct = self._get_content_type(self._get_key(row, "base"))
+                target_ct = self._get_content_type(
+                    self._get_key(row, "target"))
+                base_id = row["base_id"]
+                target_id = row["target_id"]
+                permission = permission_cache.get(
+                    self._get_key(row, "permission"))
+
+                if base_ct is None or target_ct is None or permission is None:
+                    self._skipped += 1
+                    continue
+
+                yield self._get_permission(base_ct, base_id, target_ct,
+                                           target_id, permission)
+            except KeyError as e:
+                raise CommandError("Line %d is missing the %s field." %
+                                   (line_number, e))
+            except (TypeError, ValueError, ValidationError) as e:
+                raise CommandError("Line %d is not a valid permission: %s" %
+                                   (line_number, e))
+
+    def _get_permission(self, base_ct, base_id, target_ct, target_id,
+                        permission):
+        """
+        Builds the permission in the storage used for the content types,
+        which is `ModelPermission` for permissions without a target id.
+        """
+
+        from olp.models import ModelPermission, ObjectPermission
+        from olp.utils import _get_ct_table, _get_setting
+
+        if target_id in (None, ""):
+            if not _get_setting("model_permissions"):
+                raise ValueError("the permissions on every instance of a "
+                                 "model need the model_permissions key of the "
+                                 "settings")
+
+            return ModelPermission(
+                base_object_ct=base_ct,
+                base_object_id=int(base_id),
+                target_object_ct=target_ct,
+                permission=permission,
+            )
+
+        table = _get_ct_table(self._tables, base_ct, target_ct)
+
+        if table is not None:
+            return table(
+                base_object_id=base_ct.model_class()._meta.pk.to_python(
+                    base_id),
+                target_object_id=target_ct.model_class()._meta.pk.to_python(
+                    target_id),
+                permission=permission,
+            )
+
+        return ObjectPermission(
+            base_object_ct=base_ct,
+            base_object_id=int(base_id),
+            target_object_ct=target_ct,
+            target_object_id=int(target_id),
+            permission=permission,
+        )
+
+    def _group_by_model(self, permissions):
+        grouped = {}
+
+        for permission in permissions:
+            grouped.setdefault(type(permission), []).append(permission)
+
+        return grouped
+
+    def _get_key(self, row, field):
+        """
+        Gets a field given as `app_label.name`, such as a content type or a
+        permission.
+        """
+
+        value = row[field]
+
+        if not isinstance(value, str) or "." not in value:
+            raise ValueError("the %s field should be given as app_label.name, "
+                             "not %r" % (field, value))
+
+        return value
+
+    def _get_content_type(self, natural_key):
+        from django.contrib.contenttypes.models import ContentType
+
+        # Content types which do not exist are not cached by Django
+        if natural_key in self._missing_content_types:
+            return None
+
+        app_label, model = natural_key.split(".", 1)
+
+        try:
+            return ContentType.objects.get_by_natural_key(app_label, model)
+        except ContentType.DoesNotExist:
+            self._missing_content_types.add(natural_key)
+
+            return None
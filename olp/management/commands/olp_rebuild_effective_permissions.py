@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ("Rebuilds the table of effective permissions, which holds the "
+            "permissions that every user has on every object.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=None,
+            help="The number of users to rebuild at once.",
+        )
+        parser.add_argument(
+            "--processes", type=int, default=1,
+            help="The number of processes to split the work across.",
+        )
+
+    def handle(self, *args, **options):
+        from olp import effective
+
+        if not effective.is_enabled():
+            raise CommandError(
+                "Effective permissions are only maintained when the "
+                "\"materialize\" key of OLP_SETTINGS is set."
+            )
+
+        count = effective.rebuild_effective_permissions(
+            batch_size=options["batch_size"],
+            processes=options["processes"],
+        )
+
+        self.stdout.write("Rebuilt the effective permissions of %d users." %
+                          count)
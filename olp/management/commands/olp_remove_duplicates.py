@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+
+
+class Command(BaseCommand):
+    help = ("Removes duplicate object permissions, keeping the oldest of "
+            "each, working through the table in chunks.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size", type=int, default=10000,
+            help="The number of rows to check in each query.",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Only count the duplicates, without removing them.",
+        )
+
+    def handle(self, *args, **options):
+        from olp.models import ObjectPermission
+
+        chunk_size = options["chunk_size"]
+        dry_run = options["dry_run"]
+
+        bounds = ObjectPermission.objects.aggregate(min_id=Min("id"),
+                                                    max_id=Max("id"))
+
+        if bounds["min_id"] is None:
+            self.stdout.write("There are no permissions to check.")
+            return
+
+        total = 0
+
+        for start_id in range(bounds["min_id"], bounds["max_id"] + 1,
+                              chunk_size):
+            duplicates = ObjectPermission.objects.filter(
+                id__gte=start_id,
+                id__lt=start_id + chunk_size,
+            ).duplicates()
+
+            if dry_run:
+                total += duplicates.count()
+            else:
+                total += duplicates.delete()[0]
+
+        if dry_run:
+            self.stdout.write("Found %d duplicate permissions." % total)
+        else:
+            self.stdout.write("Removed %d duplicate permissions." % total)
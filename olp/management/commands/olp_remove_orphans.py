@@ -0,0 +1,156 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+
+
+class Command(BaseCommand):
+    help = ("Removes object permissions whose base or target object no longer "
+            "exists, working through the table in chunks.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size", type=int, default=10000,
+            help="The number of rows to check in each query.",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Only count the orphaned permissions, without removing them.",
+        )
+        parser.add_argument(
+            "--delay", type=float, default=0,
+            help="The number of seconds to wait between chunks, to limit the "
+                 "load on the database.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="A file to save the progress to after every chunk.  If it "
+                 "exists, the command resumes from where it stopped.  It is "
+                 "removed once all of the permissions have been checked.",
+        )
+
+    def handle(self, *args, **options):
+        from django.contrib.contenttypes.models import ContentType
+        from django.db import transaction
+        from olp import effective
+        from olp.cache import shared_cache
+        from olp.utils import _get_permission_model
+
+        ObjectPermission = _get_permission_model()
+
+        chunk_size = options["chunk_size"]
+        dry_run = options["dry_run"]
+        checkpoint = options["checkpoint"]
+
+        bounds = ObjectPermission.objects.aggregate(min_id=Min("id"),
+                                                    max_id=Max("id"))
+
+        if bounds["min_id"] is None:
+            self.stdout.write("There are no permissions to check.")
+            return
+
+        start_id = bounds["min_id"]
+        counts = {}
+
+        progress = self._load_checkpoint(checkpoint)
+
+        if progress is not None:
+            start_id = max(start_id, progress["next_id"])
+            counts = progress["counts"]
+
+            self.stdout.write("Resuming from permission %d." % start_id)
+
+        fields = {}
+
+        for field in ("base_object", "target_object"):
+            ct_ids = ObjectPermission.objects.order_by() \
+                .values_list("%s_ct" % field, flat=True).distinct()
+
+            fields[field] = [ContentType.objects.get_for_id(ct_id)
+                             for ct_id in ct_ids]
+
+        for chunk_start in range(start_id, bounds["max_id"] + 1, chunk_size):
+            chunk = ObjectPermission.objects.filter(
+                id__gte=chunk_start,
+                id__lt=chunk_start + chunk_size,
+            )
+
+            # Permissions can have lost both their base and target object,
+            # which should only be counted once when nothing is removed
+            found_ids = set()
+
+            with transaction.atomic():
+                for field, content_types in fields.items():
+                    for content_type in content_types:
+                        orphans = chunk.orphans(content_type, field)
+
+                        count = self._remove(orphans, found_ids, dry_run)
+
+                        if count:
+                            key = "%s.%s %s" % (content_type.app_label,
+                                                content_type.model,
+                                                field.split("_")[0])
+
+                            counts[key] = counts.get(key, 0) + count
+
+            self._save_checkpoint(checkpoint, chunk_start + chunk_size,
+                                  counts)
+
+            if options["delay"]:
+                time.sleep(options["delay"])
+
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        total = sum(counts.values())
+
+        if total and not dry_run:
+            # Permissions given to or on the orphans may have been cached
+            shared_cache.invalidate()
+
+            if effective.is_enabled():
+                self.stdout.write(
+                    "The effective permissions should be rebuilt with "
+                    "olp_rebuild_effective_permissions."
+                )
+
+        for key in sorted(counts):
+            self.stdout.write("  %s: %d" % (key, counts[key]))
+
+        if dry_run:
+            self.stdout.write("Found %d orphaned permissions." % total)
+        else:
+            self.stdout.write("Removed %d orphaned permissions." % total)
+
+    def _remove(self, orphans, found_ids, dry_run):
+        from olp.utils import _bulk_delete_permissions
+
+        if not dry_run:
+            return _bulk_delete_permissions(orphans)
+
+        orphan_ids = set(orphans.values_list("id", flat=True)) - found_ids
+        found_ids.update(orphan_ids)
+
+        return len(orphan_ids)
+
+    def _load_checkpoint(self, checkpoint):
+        if not checkpoint or not os.path.exists(checkpoint):
+            return None
+
+        with open(checkpoint) as checkpoint_file:
+            return json.load(checkpoint_file)
+
+    def _save_checkpoint(self, checkpoint, next_id, counts):
+        if not checkpoint:
+            return
+
+        # The file is replaced at once, so it is never left half written
+        temp_path = "%s.tmp" % checkpoint
+
+        with open(temp_path, "w") as checkpoint_file:
+            json.dump({"next_id": next_id, "counts": counts},
+                      checkpoint_file)
+
+        os.replace(temp_path, checkpoint)
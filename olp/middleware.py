@@ -9,23 +9,49 @@
 #         raise MiddlewareNotUsed()
 
 from django.core.exceptions import MiddlewareNotUsed
-from .utils import patch_models
 
 
 class PatchModelsMiddleware:
+    """
+    The models are patched when the application is ready, so this middleware
+    is no longer required.  It is only kept so existing settings which list it
+    continue to work, and it removes itself from the middleware chain.
+    """
+
+    def __init__(self, get_response=None):
+        raise MiddlewareNotUsed("The models are patched by OLPConfig.ready()")
+
+
+class ReplicaPinningMiddleware:
+    """
+    Scopes the pinning of reads to the primary database by `ReplicaRouter` to
+    a single request, so a grant only pins the rest of its own request.
+    """
+
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
-        # Accepting the get_response parameter as required by Django
-        self.get_response = get_response
+        from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 
-        # Call the patch_models function
-        patch_models()
+        self.get_response = get_response
 
-        # Optionally raise MiddlewareNotUsed to stop further processing
-        raise MiddlewareNotUsed("PatchModelsMiddleware has been used")
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        # This is where the actual middleware chain happens.
-        # The middleware does not process the request any further
-        # due to the `MiddlewareNotUsed` raised in __init__.
-        return self.get_response(request)
+        from asgiref.sync import iscoroutinefunction
+
+        from .routers import scoped_pinning
+
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        with scoped_pinning():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        from .routers import scoped_pinning
 
+        with scoped_pinning():
+            return await self.get_response(request)
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.19 on 2026-10-18 13:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('olp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='objectpermission',
+            index=models.Index(fields=['base_object_ct', 'base_object_id', 'permission', 'target_object_ct'], name='olp_objperm_base_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='objectpermission',
+            index=models.Index(fields=['target_object_ct', 'target_object_id'], name='olp_objperm_target_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='objectpermission',
+            index=models.Index(fields=['permission', 'target_object_ct', 'base_object_ct', 'base_object_id', 'target_object_id'], name='olp_objperm_perm_target_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.19 on 2026-10-18 13:42
+
+from django.db import migrations, models
+
+
+def remove_duplicate_permissions(apps, schema_editor):
+    """
+    Removes every permission that has an older duplicate, so the unique
+    constraint can be added.  Large tables should be cleaned up beforehand
+    using the `olp_remove_duplicates` command, which works in chunks.
+    """
+
+    ObjectPermission = apps.get_model("olp", "ObjectPermission")
+
+    duplicates = ObjectPermission.objects.using(schema_editor.connection.alias) \
+        .filter(
+            base_object_ct=models.OuterRef("base_object_ct"),
+            base_object_id=models.OuterRef("base_object_id"),
+            target_object_ct=models.OuterRef("target_object_ct"),
+            target_object_id=models.OuterRef("target_object_id"),
+            permission=models.OuterRef("permission"),
+            id__lt=models.OuterRef("id"),
+        )
+
+    ObjectPermission.objects.using(schema_editor.connection.alias) \
+        .filter(models.Exists(duplicates)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('olp', '0002_objectpermission_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_permissions,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='objectpermission',
+            constraint=models.UniqueConstraint(fields=('base_object_ct', 'base_object_id', 'target_object_ct', 'target_object_id', 'permission'), name='olp_objperm_unique'),
+        ),
+    ]
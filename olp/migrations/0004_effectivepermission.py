@@ -0,0 +1,35 @@
+# Generated by Django 4.2.19 on 2026-10-18 13:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('olp', '0003_objectpermission_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EffectivePermission',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target_object_id', models.PositiveIntegerField()),
+                ('permission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='auth.permission')),
+                ('target_object_ct', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'permission', 'target_object_ct', 'target_object_id'], name='olp_effperm_user_perm_idx'), models.Index(fields=['target_object_ct', 'target_object_id'], name='olp_effperm_target_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='effectivepermission',
+            constraint=models.UniqueConstraint(fields=('user', 'target_object_ct', 'target_object_id', 'permission'), name='olp_effperm_unique'),
+        ),
+    ]
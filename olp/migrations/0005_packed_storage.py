@@ -0,0 +1,52 @@
+# Generated by Django 4.2.19 on 2026-10-18 14:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('olp', '0004_effectivepermission'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PermissionBit',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bit', models.PositiveSmallIntegerField()),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype')),
+                ('permission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='auth.permission')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PackedObjectPermission',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('base_object_id', models.PositiveIntegerField()),
+                ('target_object_id', models.PositiveIntegerField()),
+                ('mask', models.BigIntegerField(default=0)),
+                ('base_object_ct', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype')),
+                ('target_object_ct', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='permissionbit',
+            constraint=models.UniqueConstraint(fields=('content_type', 'permission'), name='olp_permbit_permission_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='permissionbit',
+            constraint=models.UniqueConstraint(fields=('content_type', 'bit'), name='olp_permbit_bit_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='packedobjectpermission',
+            index=models.Index(fields=['target_object_ct', 'target_object_id'], name='olp_packedperm_target_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='packedobjectpermission',
+            constraint=models.UniqueConstraint(fields=('base_object_ct', 'base_object_id', 'target_object_ct', 'target_object_id'), name='olp_packedperm_unique'),
+        ),
+    ]
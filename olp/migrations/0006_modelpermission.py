@@ -0,0 +1,33 @@
+# Generated by Django 4.2.19 on 2026-10-18 14:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('olp', '0005_packed_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModelPermission',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('base_object_id', models.PositiveIntegerField()),
+                ('base_object_ct', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype')),
+                ('permission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='auth.permission')),
+                ('target_object_ct', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['permission', 'target_object_ct', 'base_object_ct', 'base_object_id'], name='olp_modelperm_perm_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='modelpermission',
+            constraint=models.UniqueConstraint(fields=('base_object_ct', 'base_object_id', 'target_object_ct', 'permission'), name='olp_modelperm_unique'),
+        ),
+    ]
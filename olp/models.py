@@ -53,6 +53,7 @@
 #     objects = ObjectPermissionQuerySet.as_manager()
 
 
+from django.conf import settings
 from django.contrib.auth.models import Permission
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
@@ -60,7 +61,42 @@ from django.db import models
 from django.db.models.query import QuerySet
 
 
-class ObjectPermissionQuerySet(QuerySet):
+class PermissionNamesMixin(object):
+    """
+    Reads the names of the permissions in a queryset of permission rows, in
+    the form of `app_label.codename`.
+    """
+
+    def permission_names(self):
+        return set("%s.%s" % perm for perm in self._get_names_list())
+
+    async def apermission_names(self):
+        return set(["%s.%s" % perm async for perm in self._get_names_list()])
+
+    def permission_names_by_target(self):
+        """
+        Gets the names of the permissions in the queryset, as a dictionary of
+        sets keyed by the id of their target object.
+        """
+
+        names = {}
+
+        perms_list = self.values_list("target_object_id",
+                                      "permission__content_type__app_label",
+                                      "permission__codename")
+
+        for target_id, app_label, codename in perms_list:
+            names.setdefault(target_id, set()).add("%s.%s" % (app_label,
+                                                              codename))
+
+        return names
+
+    def _get_names_list(self):
+        return self.values_list("permission__content_type__app_label",
+                                "permission__codename").distinct()
+
+
+class ObjectPermissionQuerySet(PermissionNamesMixin, QuerySet):
 
     def for_base(self, obj):
         ct = ContentType.objects.get_for_model(obj)
@@ -91,6 +127,94 @@ class ObjectPermissionQuerySet(QuerySet):
 
         return self.filter(target_object_ct=ct)
 
+    def duplicates(self):
+        """
+        Filters down to the permissions which have an older duplicate.
+        """
+
+        older = ObjectPermission.objects.filter(
+            base_object_ct=models.OuterRef("base_object_ct"),
+            base_object_id=models.OuterRef("base_object_id"),
+            target_object_ct=models.OuterRef("target_object_ct"),
+            target_object_id=models.OuterRef("target_object_id"),
+            permission=models.OuterRef("permission"),
+            id__lt=models.OuterRef("id"),
+        )
+
+        return self.filter(models.Exists(older))
+
+    def orphans(self, content_type, field="target_object"):
+        """
+        Filters down to the permissions whose base or target object, as given
+        by `field`, is of a content type and no longer exists.
+
+        The objects are matched with a `NOT EXISTS` subquery, so every
+        permission of a content type whose model was removed is an orphan.
+        """
+
+        objs = self.filter(**{"%s_ct" % field: content_type})
+
+        model = content_type.model_class()
+
+        if model is None:
+            return objs
+
+        existing = model._base_manager.filter(
+            pk=models.OuterRef("%s_id" % field),
+        )
+
+        return objs.filter(~models.Exists(existing))
+
+
+class PermissionQuerySetMixin(object):
+    """
+    Adds permission filtering to the querysets of any model.
+    """
+
+    def with_perm(self, user, permission):
+        """
+        Filters down to the objects that a user has a specific permission on.
+
+        The permission check is added as an `EXISTS` subquery, so the result
+        can be ordered, sliced and aggregated like any other queryset.
+        """
+
+        from .utils import _get_perm_exists
+
+        perm_exists = _get_perm_exists(user, permission, self.model)
+
+        if perm_exists is None:
+            return self.none()
+
+        return self.filter(perm_exists)
+
+    def delete(self):
+        """
+        Deletes the objects.  When the model is listed in the `cleanup` key
+        of the settings, the permissions given to or on the objects are
+        removed in batches beforehand, instead of once for every object.
+        """
+
+        from django.db import transaction
+
+        from .registry import registry
+        from .utils import _suspend_cleanup, bulk_remove_all_permissions
+
+        if not registry.is_cleanup_model(self.model):
+            return super(PermissionQuerySetMixin, self).delete()
+
+        with transaction.atomic(using=self.db), _suspend_cleanup():
+            bulk_remove_all_permissions(self)
+
+            return super(PermissionQuerySetMixin, self).delete()
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+class PermissionQuerySet(PermissionQuerySetMixin, QuerySet):
+    pass
+
 
 class ObjectPermission(models.Model):
     base_object_ct = models.ForeignKey(ContentType, related_name="+",on_delete=models.CASCADE)
@@ -107,3 +231,334 @@ class ObjectPermission(models.Model):
 
     objects = ObjectPermissionQuerySet.as_manager()
 
+    class Meta:
+        indexes = [
+            # Permissions for a base object, optionally on a target object
+            models.Index(
+                fields=["base_object_ct", "base_object_id", "permission",
+                        "target_object_ct"],
+                name="olp_objperm_base_idx",
+            ),
+            # Permissions on a target object
+            models.Index(
+                fields=["target_object_ct", "target_object_id"],
+                name="olp_objperm_target_idx",
+            ),
+            # Objects that base objects have a permission on, which covers
+            # the query made by `get_obj_ids_for_user`
+            models.Index(
+                fields=["permission", "target_object_ct", "base_object_ct",
+                        "base_object_id", "target_object_id"],
+                name="olp_objperm_perm_target_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["base_object_ct", "base_object_id", "target_object_ct",
+                        "target_object_id", "permission"],
+                name="olp_objperm_unique",
+            ),
+        ]
+
+
+class EffectivePermissionQuerySet(PermissionNamesMixin, QuerySet):
+
+    def for_user(self, user):
+        return self.filter(user=user)
+
+    def for_permission(self, permission):
+        return self.filter(permission=permission)
+
+    def for_target(self, obj):
+        ct = ContentType.objects.get_for_model(obj)
+
+        return self.filter(target_object_ct=ct, target_object_id=obj.pk)
+
+
+class EffectivePermission(models.Model):
+    """
+    The permissions that users have on objects, either directly or through
+    the models in the settings.
+
+    This is only maintained when the `materialize` key of the settings is
+    set, in which case it is kept up to date as permissions are assigned and
+    removed and as users join or leave the models in the settings.
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name="+",
+                             on_delete=models.CASCADE)
+
+    target_object_ct = models.ForeignKey(ContentType, related_name="+",
+                                         on_delete=models.CASCADE)
+    target_object_id = models.PositiveIntegerField()
+
+    target_object = GenericForeignKey("target_object_ct", "target_object_id")
+
+    permission = models.ForeignKey(Permission, related_name="+",
+                                   on_delete=models.CASCADE)
+
+    objects = EffectivePermissionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Objects that a user has a permission on
+            models.Index(
+                fields=["user", "permission", "target_object_ct",
+                        "target_object_id"],
+                name="olp_effperm_user_perm_idx",
+            ),
+            # Users that have permissions on an object
+            models.Index(
+                fields=["target_object_ct", "target_object_id"],
+                name="olp_effperm_target_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "target_object_ct", "target_object_id",
+                        "permission"],
+                name="olp_effperm_unique",
+            ),
+        ]
+
+
+class TypedObjectPermissionQuerySet(PermissionNamesMixin, QuerySet):
+
+    def for_base(self, obj):
+        return self.filter(base_object=obj)
+
+    def for_permission(self, permission):
+        return self.filter(permission=permission)
+
+    def for_target(self, obj):
+        return self.filter(target_object=obj)
+
+
+class TypedObjectPermission(models.Model):
+    """
+    The base of a permission table for a single model of base objects and a
+    single model of target objects, which subclasses complete by adding
+    `base_object` and `target_object` foreign keys.
+
+    The tables are listed in the `tables` key of the settings, in which case
+    the permissions of the base model on the target model are stored in them
+    instead of in `ObjectPermission`.
+    """
+
+    permission = models.ForeignKey(Permission, related_name="+",
+                                   on_delete=models.CASCADE)
+
+    objects = TypedObjectPermissionQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+        constraints = [
+            # Also covers the permissions for a base object
+            models.UniqueConstraint(
+                fields=["base_object", "target_object", "permission"],
+                name="%(app_label)s_%(class)s_unique",
+            ),
+        ]
+
+
+class PermissionBit(models.Model):
+    """
+    The bit of the masks in `PackedObjectPermission` which stands for a
+    permission on the objects of a content type.
+
+    Bits are assigned the first time that a permission is given on a content
+    type, and never change afterwards.  They are only used when the `storage`
+    key of the settings is set to `"packed"`.
+    """
+
+    content_type = models.ForeignKey(ContentType, related_name="+",
+                                     on_delete=models.CASCADE)
+
+    permission = models.ForeignKey(Permission, related_name="+",
+                                   on_delete=models.CASCADE)
+
+    bit = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["content_type", "permission"],
+                name="olp_permbit_permission_unique",
+            ),
+            models.UniqueConstraint(
+                fields=["content_type", "bit"],
+                name="olp_permbit_bit_unique",
+            ),
+        ]
+
+
+class PackedObjectPermissionQuerySet(ObjectPermissionQuerySet):
+
+    def for_permission(self, permission):
+        """
+        Filters down to the rows whose mask has the bit of a permission set.
+
+        The bits are looked up in the cache of `permission_bits`, so a
+        permission which has never been given matches nothing without
+        hitting the database.
+        """
+
+        from django.db.models.lookups import Exact
+
+        from .packed import permission_bits
+
+        q_filter = models.Q()
+
+        for ct_id, bit in permission_bits.get_bits(permission):
+            mask = 1 << bit
+
+            q_filter = q_filter | (
+                models.Q(target_object_ct=ct_id) &
+                models.Q(Exact(models.F("mask").bitand(mask), mask))
+            )
+
+        if not q_filter:
+            return self.none()
+
+        return self.filter(q_filter)
+
+    def duplicates(self):
+        """
+        Every pair of a base and target object has a single row, so there are
+        never any duplicates.
+        """
+
+        return self.none()
+
+    def permission_names(self):
+        from .packed import permission_bits
+
+        return permission_bits.get_names(self._get_masks_list())
+
+    async def apermission_names(self):
+        from .packed import permission_bits
+
+        await permission_bits.aload()
+
+        masks = [mask async for mask in self._get_masks_list()]
+
+        return permission_bits.get_names(masks)
+
+    def permission_names_by_target(self):
+        from .packed import permission_bits
+
+        names = {}
+
+        perms_list = self.values_list("target_object_id", "target_object_ct",
+                                      "mask")
+
+        for target_id, target_ct_id, mask in perms_list:
+            names.setdefault(target_id, set()).update(
+                permission_bits.get_names([(target_ct_id, mask)]))
+
+        return names
+
+    def _get_masks_list(self):
+        return self.values_list("target_object_ct", "mask").distinct()
+
+
+class PackedObjectPermission(models.Model):
+    """
+    The permissions of a base object on a target object, packed into a single
+    row with a mask of the bits in `PermissionBit`.
+
+    This is only used when the `storage` key of the settings is set to
+    `"packed"`, in which case it replaces `ObjectPermission`.
+    """
+
+    base_object_ct = models.ForeignKey(ContentType, related_name="+",
+                                       on_delete=models.CASCADE)
+    base_object_id = models.PositiveIntegerField()
+
+    base_object = GenericForeignKey("base_object_ct", "base_object_id")
+
+    target_object_ct = models.ForeignKey(ContentType, related_name="+",
+                                         on_delete=models.CASCADE)
+    target_object_id = models.PositiveIntegerField()
+
+    target_object = GenericForeignKey("target_object_ct", "target_object_id")
+
+    mask = models.BigIntegerField(default=0)
+
+    objects = PackedObjectPermissionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Permissions on a target object
+            models.Index(
+                fields=["target_object_ct", "target_object_id"],
+                name="olp_packedperm_target_idx",
+            ),
+        ]
+        constraints = [
+            # Also covers the permissions for a base object
+            models.UniqueConstraint(
+                fields=["base_object_ct", "base_object_id", "target_object_ct",
+                        "target_object_id"],
+                name="olp_packedperm_unique",
+            ),
+        ]
+
+
+class ModelPermissionQuerySet(PermissionNamesMixin, QuerySet):
+
+    def for_base(self, obj):
+        ct = ContentType.objects.get_for_model(obj)
+
+        return self.filter(base_object_ct=ct, base_object_id=obj.pk)
+
+    def for_permission(self, permission):
+        return self.filter(permission=permission)
+
+    def for_target_model(self, model):
+        ct = ContentType.objects.get_for_model(model)
+
+        return self.filter(target_object_ct=ct)
+
+
+class ModelPermission(models.Model):
+    """
+    A permission of a base object on every instance of a model, including
+    the instances created later, which stands in for a row in
+    `ObjectPermission` for each of them.
+
+    This is only used when the `model_permissions` key of the settings is
+    set.
+    """
+
+    base_object_ct = models.ForeignKey(ContentType, related_name="+",
+                                       on_delete=models.CASCADE)
+    base_object_id = models.PositiveIntegerField()
+
+    base_object = GenericForeignKey("base_object_ct", "base_object_id")
+
+    target_object_ct = models.ForeignKey(ContentType, related_name="+",
+                                         on_delete=models.CASCADE)
+
+    permission = models.ForeignKey(Permission, related_name="+",
+                                   on_delete=models.CASCADE)
+
+    objects = ModelPermissionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Base objects with a permission on a model
+            models.Index(
+                fields=["permission", "target_object_ct", "base_object_ct",
+                        "base_object_id"],
+                name="olp_modelperm_perm_idx",
+            ),
+        ]
+        constraints = [
+            # Also covers the permissions for a base object
+            models.UniqueConstraint(
+                fields=["base_object_ct", "base_object_id", "target_object_ct",
+                        "permission"],
+                name="olp_modelperm_unique",
+            ),
+        ]
@@ -0,0 +1,414 @@
+"""
+Stores object permissions packed into masks, with a single row for every
+pair of a base and target object instead of one for every permission.
+
+This is used when the `storage` key of the settings is set to `"packed"`.
+Each permission that is given on a content type is assigned one of the bits
+of the masks in `PackedObjectPermission`, which is kept in `PermissionBit`.
+The existing permissions can be moved between the two storages with the
+`olp_convert_storage` command.
+"""
+
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+
+# The number of bits which can be used in a signed 64 bit mask
+MAX_BITS = 63
+
+# The number of times a bit is looked up again when another process assigned
+# one at the same time
+BIT_ATTEMPTS = 3
+
+
+def is_enabled():
+    from .utils import _get_setting
+
+    return _get_setting("storage", "rows") == "packed"
+
+
+def check_settings():
+    """
+    Raises `ImproperlyConfigured` if the storage in the settings is not
+    supported.
+    """
+
+    from . import effective
+    from .utils import _get_setting
+
+    storage = _get_setting("storage", "rows")
+
+    if storage not in ("rows", "packed"):
+        raise ImproperlyConfigured(
+            "The storage of OLP_SETTINGS must be either 'rows' or 'packed', "
+            "not %r." % (storage,)
+        )
+
+    if storage == "packed" and effective.is_enabled():
+        raise ImproperlyConfigured(
+            "The packed storage of OLP_SETTINGS cannot be used along with "
+            "materialize."
+        )
+
+
+class PermissionBits(object):
+    """
+    Maps the permissions on every content type to their bits in the masks,
+    and back again.
+
+    All of the bits are loaded in a single query the first time they are
+    needed.  The cache is cleared whenever a bit is assigned or removed, and
+    is reloaded on the next lookup.  Bits which have been assigned in a
+    transaction that is still open could be rolled back and assigned to
+    another permission, so the bits are not cached until it is committed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bits = None
+        self._generation = 0
+
+    def get_bits(self, permission):
+        """
+        Gets the content types that a permission has a bit on, as a list of
+        pairs of a content type id and a bit.
+        """
+
+        bits, permissions = self.load()
+
+        return [(ct_id, bit) for (ct_id, permission_id), bit in bits.items()
+                if permission_id == permission.pk]
+
+    def get_bit(self, ct_id, permission_id, create=False, using=None):
+        """
+        Gets the bit of a permission on a content type.  When the permission
+        does not have one yet, a bit is assigned if `create` is set, and
+        `None` is returned otherwise.  The bits are read from and assigned on
+        the database `using`, or the one chosen by the database routers.
+        """
+
+        bits, permissions = self.load(using=using)
+
+        bit = bits.get((ct_id, permission_id))
+
+        if bit is None and create:
+            bit = self._create_bit(ct_id, permission_id, using=using)
+
+        return bit
+
+    def get_mask(self, ct_id, permissions, create=False, using=None):
+        """
+        Gets the mask of some permissions on a content type.  Permissions
+        which do not have a bit are left out unless `create` is set.
+        """
+
+        mask = 0
+
+        for permission in permissions:
+            bit = self.get_bit(ct_id, permission.pk, create=create,
+                               using=using)
+
+            if bit is not None:
+                mask |= 1 << bit
+
+        return mask
+
+    def get_permissions(self, ct_id, mask):
+        """
+        Gets the `Permission` objects whose bits are set in a mask of a
+        content type.
+        """
+
+        bits, permissions = self.load()
+
+        return self._get_permissions(permissions, ct_id, mask)
+
+    def get_names(self, masks):
+        """
+        Gets the names, in the form of `app_label.codename`, of the
+        permissions in an iterable of pairs of a content type id and a mask.
+        """
+
+        from .utils import _get_perm_name
+
+        bits, permissions = self.load()
+
+        names = set()
+
+        for ct_id, mask in masks:
+            for permission in self._get_permissions(permissions, ct_id, mask):
+                names.add(_get_perm_name(permission))
+
+        return names
+
+    def load(self, using=None):
+        """
+        Loads all of the bits from the database, unless another thread has
+        already done so.
+        """
+
+        from .models import PermissionBit
+
+        loaded, generation = self._start_load()
+
+        if loaded is not None:
+            return loaded
+
+        loaded = ({}, {})
+
+        for permission_bit in PermissionBit.objects.using(using) \
+                .select_related("permission__content_type"):
+            self._add_bit(loaded, permission_bit)
+
+        return self._finish_load(loaded, generation, using)
+
+    async def aload(self):
+        from .models import PermissionBit
+
+        loaded, generation = self._start_load()
+
+        if loaded is not None:
+            return loaded
+
+        loaded = ({}, {})
+
+        async for permission_bit in PermissionBit.objects.select_related(
+                "permission__content_type"):
+            self._add_bit(loaded, permission_bit)
+
+        return self._finish_load(loaded, generation)
+
+    def clear(self):
+        with self._lock:
+            self._bits = None
+            self._generation += 1
+
+    def _start_load(self):
+        with self._lock:
+            return self._bits, self._generation
+
+    def _add_bit(self, loaded, permission_bit):
+        bits, permissions = loaded
+
+        ct_id = permission_bit.content_type_id
+
+        bits[(ct_id, permission_bit.permission_id)] = permission_bit.bit
+        permissions.setdefault(ct_id, {})[permission_bit.bit] = \
+            permission_bit.permission
+
+    def _finish_load(self, loaded, generation, using=None):
+        pending = self._has_pending_bits(using)
+
+        with self._lock:
+            # The cache was cleared while the bits were being loaded, so they
+            # may already be out of date.
+            if self._generation == generation and not pending:
+                self._bits = loaded
+
+        return loaded
+
+    def _get_permissions(self, permissions, ct_id, mask):
+        ct_permissions = permissions.get(ct_id, {})
+
+        return [permission
+                for bit, permission in sorted(ct_permissions.items())
+                if mask & (1 << bit)]
+
+    def _has_pending_bits(self, using=None):
+        """
+        Determines if bits have been assigned in a transaction on the database
+        `using` which is still open.
+        """
+
+        from django.db import connections, router
+
+        from .models import PermissionBit
+
+        connection = connections[using or
+                                 router.db_for_write(PermissionBit)]
+
+        if not connection.in_atomic_block:
+            connection.olp_pending_bits = False
+
+        return getattr(connection, "olp_pending_bits", False)
+
+    def _create_bit(self, ct_id, permission_id, using=None):
+        """
+        Assigns the lowest free bit of a content type to a permission.  If
+        another process assigns a bit at the same time, the bits are read
+        again and the assignment is retried.
+        """
+
+        from django.db import IntegrityError, connections, router, transaction
+
+        from .models import PermissionBit
+
+        using = using or router.db_for_write(PermissionBit)
+        connection = connections[using]
+
+        for attempt in range(BIT_ATTEMPTS):
+            bits = PermissionBit.objects.using(using) \
+                .filter(content_type_id=ct_id)
+
+            try:
+                with transaction.atomic(using=using):
+                    existing = bits.filter(permission_id=permission_id) \
+                        .values_list("bit", flat=True).first()
+
+                    if existing is not None:
+                        return existing
+
+                    used = set(bits.values_list("bit", flat=True))
+
+                    free = [bit for bit in range(MAX_BITS) if bit not in used]
+
+                    if not free:
+                        raise ValueError(
+                            "All of the %d bits of content type %d have been "
+                            "assigned." % (MAX_BITS, ct_id)
+                        )
+
+                    PermissionBit.objects.using(using).create(
+                        content_type_id=ct_id,
+                        permission_id=permission_id,
+                        bit=free[0],
+                    )
+            except IntegrityError:
+                continue
+
+            if connection.in_atomic_block:
+                connection.olp_pending_bits = True
+
+            return free[0]
+
+        raise ValueError("A bit could not be assigned to permission %d on "
+                         "content type %d." % (permission_id, ct_id))
+
+
+permission_bits = PermissionBits()
+
+
+def assign_perms(bases, permissions, targets, batch_size=None, using=None):
+    """
+    Gives permissions to base objects on target objects, taking the same
+    arguments as `bulk_assign_perm` along with the database to write to.
+
+    The missing rows are created with `bulk_create`, and the bits are then
+    added to the masks of the rows which already existed.
+    """
+
+    from django.db import router, transaction
+    from django.db.models import F
+
+    from .models import PackedObjectPermission
+    from .utils import _as_list, _get_batch_size, _iter_batches
+    from .utils import _iter_ct_id_filters, _iter_ct_ids
+
+    batch_size = _get_batch_size(batch_size)
+    bases = _as_list(bases)
+    targets = _as_list(targets)
+
+    base_pairs = list(_iter_ct_ids(bases, batch_size))
+
+    masks = {}
+
+    def get_mask(target_ct):
+        if target_ct.pk not in masks:
+            masks[target_ct.pk] = permission_bits.get_mask(
+                target_ct.pk, permissions, create=True, using=using)
+
+        return masks[target_ct.pk]
+
+    def iter_rows():
+        for target_ct, target_id in _iter_ct_ids(targets, batch_size):
+            mask = get_mask(target_ct)
+
+            for base_ct, base_id in base_pairs:
+                yield PackedObjectPermission(
+                    base_object_ct_id=base_ct.pk,
+                    base_object_id=base_id,
+                    target_object_ct_id=target_ct.pk,
+                    target_object_id=target_id,
+                    mask=mask,
+                )
+
+    using = using or router.db_for_write(PackedObjectPermission)
+
+    with transaction.atomic(using=using):
+        for batch in _iter_batches(iter_rows(), batch_size):
+            PackedObjectPermission.objects.using(using).bulk_create(
+                batch, batch_size=batch_size, ignore_conflicts=True)
+
+        target_filters = list(_iter_ct_id_filters(targets, batch_size))
+
+        for base_ct, base_ids in _iter_ct_id_filters(bases, batch_size):
+            for target_ct, target_ids in target_filters:
+                PackedObjectPermission.objects.using(using).filter(
+                    base_object_ct=base_ct,
+                    base_object_id__in=base_ids,
+                    target_object_ct=target_ct,
+                    target_object_id__in=target_ids,
+                ).update(mask=F("mask").bitor(get_mask(target_ct)))
+
+
+def remove_perms(bases, permissions, targets, batch_size=None, using=None):
+    """
+    Removes permissions from base objects on target objects, taking the same
+    arguments as `bulk_remove_perm` along with the database to write to.
+
+    The bits are cleared from the masks, and the rows which are left without
+    any permissions are deleted.
+    """
+
+    from django.db import router, transaction
+    from django.db.models import F
+
+    from .models import PackedObjectPermission
+    from .utils import _as_list, _bulk_delete_permissions, _get_batch_size
+    from .utils import _iter_ct_id_filters
+
+    batch_size = _get_batch_size(batch_size)
+    bases = _as_list(bases)
+
+    target_filters = list(_iter_ct_id_filters(targets, batch_size))
+
+    using = using or router.db_for_write(PackedObjectPermission)
+
+    with transaction.atomic(using=using):
+        for base_ct, base_ids in _iter_ct_id_filters(bases, batch_size):
+            for target_ct, target_ids in target_filters:
+                mask = permission_bits.get_mask(target_ct.pk, permissions,
+                                                using=using)
+
+                # None of the permissions were ever given on the content type
+                if not mask:
+                    continue
+
+                rows = PackedObjectPermission.objects.using(using).filter(
+                    base_object_ct=base_ct,
+                    base_object_id__in=base_ids,
+                    target_object_ct=target_ct,
+                    target_object_id__in=target_ids,
+                )
+
+                rows.update(mask=F("mask").bitand(~mask))
+
+                _bulk_delete_permissions(rows.filter(mask=0))
+
+
+def clear_bit(ct_id, bit):
+    """
+    Clears a bit which is no longer assigned from all of the masks of a
+    content type, so it can safely be assigned to another permission.
+    """
+
+    from django.db.models import F
+
+    from .models import PackedObjectPermission
+    from .utils import _bulk_delete_permissions
+
+    rows = PackedObjectPermission.objects.filter(target_object_ct=ct_id)
+
+    rows.update(mask=F("mask").bitand(~(1 << bit)))
+
+    _bulk_delete_permissions(rows.filter(mask=0))
@@ -0,0 +1,242 @@
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+
+
+class RegisteredModel(object):
+    """
+    A model which contributes permissions to the users that it is related to,
+    as listed in the `models` key of the settings.
+    """
+
+    def __init__(self, model, filter_path):
+        self.model = model
+        self.filter_path = filter_path
+
+        self._content_type = None
+
+    def __repr__(self):
+        return "<RegisteredModel: %s (%s)>" % (self.model._meta.label,
+                                               self.filter_path)
+
+    @property
+    def content_type(self):
+        from django.contrib.contenttypes.models import ContentType
+
+        if self._content_type is None:
+            self._content_type = ContentType.objects.get_for_model(self.model)
+
+        return self._content_type
+
+    def get_queryset(self, user):
+        """
+        Gets the instances of the model that the user is related to.
+        """
+
+        return self.model._default_manager.filter(**{self.filter_path: user})
+
+    def clear_cache(self):
+        self._content_type = None
+
+
+class ModelRegistry(object):
+    """
+    Holds the models listed in the `models` key of the settings, along with
+    the models listed in the `cleanup` key and the permission tables listed
+    in the `tables` key.
+
+    The models are imported and validated once, when the application is
+    ready, so the permission checks do not need to resolve the model paths
+    every time they are called.
+    """
+
+    def __init__(self):
+        self._models = None
+        self._cleanup_models = None
+        self._tables = None
+
+    def __iter__(self):
+        return iter(self.get_models())
+
+    def __len__(self):
+        return len(self.get_models())
+
+    def get_models(self):
+        if self._models is None:
+            self.populate()
+
+        return self._models
+
+    def get_cleanup_models(self):
+        """
+        Gets the models whose permissions are removed when their instances
+        are deleted.
+        """
+
+        if self._cleanup_models is None:
+            self.populate()
+
+        return self._cleanup_models
+
+    def is_cleanup_model(self, model):
+        return model._meta.concrete_model in self.get_cleanup_models()
+
+    def get_tables(self, target=None, base=None):
+        """
+        Gets the permission tables in the settings, as a list of tuples of
+        the base model, the target model and the table, optionally only those
+        for a target and base model or object.
+        """
+
+        if self._tables is None:
+            self.populate()
+
+        target_model = _get_concrete_model(target)
+        base_model = _get_concrete_model(base)
+
+        return [
+            (table_base, table_target, table)
+            for table_base, table_target, table in self._tables
+            if target_model in (None, table_target) and
+            base_model in (None, table_base)
+        ]
+
+    def get_table(self, base, target):
+        """
+        Gets the permission table for the permissions of a base model or
+        object on a target model or object, or `None` if they are stored in
+        the generic storage.
+        """
+
+        tables = self.get_tables(target, base)
+
+        if not tables:
+            return None
+
+        return tables[0][2]
+
+    def populate(self, model_dict=None):
+        from .utils import _get_setting
+
+        if model_dict is None:
+            model_dict = _get_setting("models") or ()
+
+        models = []
+
+        for model_path, filter_path in model_dict:
+            model = self._import_model(model_path)
+
+            self._validate_filter_path(model, filter_path)
+
+            models.append(RegisteredModel(model, filter_path))
+
+        self._models = tuple(models)
+        self._cleanup_models = tuple(
+            self._import_model(model_path)
+            for model_path in _get_setting("cleanup") or ()
+        )
+        self._tables = tuple(
+            self._get_table(self._import_model(model_path), models)
+            for model_path in _get_setting("tables") or ()
+        )
+
+        pairs = [(base_model, target_model)
+                 for base_model, target_model, table in self._tables]
+
+        if len(set(pairs)) != len(pairs):
+            raise ImproperlyConfigured(
+                "The tables of OLP_SETTINGS include more than one table for "
+                "the same base and target models."
+            )
+
+        if self._tables and (_get_setting("materialize") or
+                             _get_setting("storage") == "packed"):
+            raise ImproperlyConfigured(
+                "The tables of OLP_SETTINGS cannot be used along with "
+                "materialize or the packed storage."
+            )
+
+    def clear_cache(self):
+        """
+        Clears the content types which have been resolved for the models.
+        """
+
+        for registered_model in self._models or ():
+            registered_model.clear_cache()
+
+    def _import_model(self, model_path):
+        from django.db import models
+        from django.utils.module_loading import import_string
+
+        try:
+            model = import_string(model_path)
+        except ImportError as e:
+            raise ImproperlyConfigured(
+                "OLP_SETTINGS could not import the model '%s': %s" %
+                (model_path, e)
+            )
+
+        if not isinstance(model, type) or not issubclass(model, models.Model):
+            raise ImproperlyConfigured(
+                "OLP_SETTINGS refers to '%s', which is not a model." %
+                model_path
+            )
+
+        return model
+
+    def _get_table(self, table, models):
+        """
+        Validates a permission table, and gets the models of its base and
+        target objects.
+        """
+
+        from django.contrib.auth import get_user_model
+
+        from .models import TypedObjectPermission
+
+        if not issubclass(table, TypedObjectPermission):
+            raise ImproperlyConfigured(
+                "OLP_SETTINGS refers to the table %s, which does not inherit "
+                "from TypedObjectPermission." % table._meta.label
+            )
+
+        try:
+            base_model = table._meta.get_field("base_object").related_model
+            target_model = table._meta.get_field("target_object").related_model
+        except FieldDoesNotExist:
+            raise ImproperlyConfigured(
+                "The table %s must have base_object and target_object foreign "
+                "keys." % table._meta.label
+            )
+
+        base_models = [get_user_model()]
+        base_models.extend(registered_model.model
+                           for registered_model in models)
+
+        if base_model not in base_models:
+            raise ImproperlyConfigured(
+                "The base_object of the table %s must refer to the user model "
+                "or one of the models of OLP_SETTINGS." % table._meta.label
+            )
+
+        return (base_model, target_model, table)
+
+    def _validate_filter_path(self, model, filter_path):
+        field_name = filter_path.split("__")[0]
+
+        try:
+            model._meta.get_field(field_name)
+        except FieldDoesNotExist:
+            raise ImproperlyConfigured(
+                "OLP_SETTINGS refers to the filter '%s' on %s, but the model "
+                "has no field named '%s'." %
+                (filter_path, model._meta.label, field_name)
+            )
+
+
+def _get_concrete_model(obj):
+    if obj is None:
+        return None
+
+    return obj._meta.concrete_model
+
+
+registry = ModelRegistry()
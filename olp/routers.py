@@ -0,0 +1,118 @@
+"""
+A database router which sends the reads of object permissions to replicas.
+
+The router is enabled by adding `olp.routers.ReplicaRouter` to the
+`DATABASE_ROUTERS` setting and listing the aliases of the replicas in the
+`replicas` key of the settings.  Writes always go to the primary database,
+which is the `primary` key of the settings and defaults to `"default"`.
+
+Once a permission has been written, reads are pinned to the primary for the
+rest of the request, so a grant is visible straight away even when the
+replicas lag behind.  The pin is held in a context variable, so it follows a
+request across threads and async tasks, and is scoped to the request by
+`olp.middleware.ReplicaPinningMiddleware`.
+
+Code which runs outside of a request, such as a Celery task or a management
+command, is not covered by the middleware and stays pinned once it writes a
+permission.  It should be wrapped in `scoped_pinning`, or call `unpin` before
+each unit of work, such as at the start of every task on a worker.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+import random
+
+_pinned = ContextVar("olp_pinned", default=False)
+
+
+def is_pinned():
+    """
+    Determines if reads are currently pinned to the primary database.
+    """
+
+    return _pinned.get()
+
+
+def pin_to_primary():
+    _pinned.set(True)
+
+
+def unpin():
+    """
+    Sends the reads back to the replicas, for code outside of a request that
+    cannot wrap its work in `scoped_pinning`.
+    """
+
+    _pinned.set(False)
+
+
+@contextmanager
+def scoped_pinning():
+    """
+    Unpins the reads for the duration of the block, and restores the previous
+    pin afterwards, so a write within the block only pins the block itself.
+    """
+
+    token = _pinned.set(False)
+
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+class ReplicaRouter(object):
+
+    def db_for_read(self, model, **hints):
+        from .utils import _get_setting
+
+        if not _is_permission_model(model):
+            return None
+
+        replicas = _get_setting("replicas") or ()
+
+        if not replicas or is_pinned():
+            return _get_primary()
+
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        if not _is_permission_model(model):
+            return None
+
+        pin_to_primary()
+
+        return _get_primary()
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        if _is_permission_model(type(obj1)) or \
+                _is_permission_model(type(obj2)):
+            return True
+
+        return None
+
+
+def _get_primary():
+    from django.db import DEFAULT_DB_ALIAS
+
+    from .utils import _get_setting
+
+    return _get_setting("primary", DEFAULT_DB_ALIAS)
+
+
+def _is_permission_model(model):
+    """
+    Determines if a model holds permissions.  The bits of the packed storage
+    are left to the other routers, as they are assigned within transactions
+    which also read them.
+    """
+
+    from .models import (
+        EffectivePermission, ModelPermission, ObjectPermission,
+        PackedObjectPermission, TypedObjectPermission
+    )
+
+    return issubclass(model, (EffectivePermission, ModelPermission,
+                              ObjectPermission, PackedObjectPermission,
+                              TypedObjectPermission))
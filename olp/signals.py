@@ -0,0 +1,591 @@
+import threading
+
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_migrate, post_save, pre_delete, pre_save
+)
+from django.dispatch import Signal, receiver
+
+
+# Sent when users may have joined or left one of the models in the settings.
+# `user_ids` is a list of the affected users, or `None` if they are unknown.
+membership_changed = Signal()
+
+# Sent after an instrumented function returns, with its `name`, `duration` in
+# seconds, the number of `queries` it ran, and `cache` set to "hit", "miss" or
+# `None` if no cache was used.  Only sent when the instrumentation is enabled.
+permission_operation = Signal()
+
+# The receivers connected for the models in the settings, so they can be
+# disconnected when the settings change.
+_membership_receivers = []
+_cleanup_receivers = []
+_table_receivers = []
+
+# The permissions which are being deleted by each deletion on this thread,
+# which are refreshed and invalidated once all of them have been deleted
+_pending_deletes = threading.local()
+
+
+def connect_membership_signals():
+    """
+    Connects the receivers which send `membership_changed` for the relations
+    used by the models in the settings, along with the receivers for changes
+    to the model-level permissions of users.
+    """
+
+    from django.contrib.auth import get_user_model
+
+    from .registry import registry
+
+    disconnect_membership_signals()
+
+    user_model = get_user_model()
+
+    for registered_model in registry:
+        model = registered_model.model
+        field_name = registered_model.filter_path.split("__")[0]
+        field = model._meta.get_field(field_name)
+
+        _connect(pre_delete, model, olp_membership_model_changing)
+        _connect(post_delete, model, olp_membership_model_changed)
+
+        if field.many_to_many:
+            through = getattr(field, "through", None) or \
+                field.remote_field.through
+
+            _connect(m2m_changed, through, olp_membership_m2m_changed)
+        else:
+            _connect(pre_save, model, olp_membership_model_changing)
+            _connect(post_save, model, olp_membership_model_changed)
+
+            if field.auto_created and not field.concrete:
+                _connect(pre_save, field.related_model,
+                         olp_membership_related_changing)
+                _connect(pre_delete, field.related_model,
+                         olp_membership_related_changing)
+                _connect(post_save, field.related_model,
+                         olp_membership_related_changed)
+                _connect(post_delete, field.related_model,
+                         olp_membership_related_changed)
+
+    user_permissions = user_model._meta.get_field("user_permissions")
+
+    _connect(m2m_changed, user_permissions.remote_field.through,
+             olp_user_permissions_changed)
+
+
+def disconnect_membership_signals():
+    _disconnect(_membership_receivers)
+
+
+def connect_cleanup_signals():
+    """
+    Connects the receivers which remove the permissions of deleted objects,
+    for the models in the `cleanup` key of the settings.
+    """
+
+    from .registry import registry
+
+    disconnect_cleanup_signals()
+
+    for model in registry.get_cleanup_models():
+        _connect(post_delete, model, olp_cleanup_deleted, _cleanup_receivers)
+
+
+def disconnect_cleanup_signals():
+    _disconnect(_cleanup_receivers)
+
+
+def connect_table_signals():
+    """
+    Connects the receivers which invalidate cached permissions when the
+    tables in the `tables` key of the settings change.
+    """
+
+    from .registry import registry
+
+    disconnect_table_signals()
+
+    for base_model, target_model, table in registry.get_tables():
+        _connect(post_save, table, olp_table_permission_changed,
+                 _table_receivers)
+        _connect(pre_delete, table, olp_permission_deleting,
+                 _table_receivers)
+        _connect(post_delete, table, olp_table_permission_changed,
+                 _table_receivers)
+
+
+def disconnect_table_signals():
+    _disconnect(_table_receivers)
+
+
+def _connect(signal, sender, func, receivers=_membership_receivers):
+    signal.connect(func, sender=sender)
+
+    receivers.append((signal, sender, func))
+
+
+def _disconnect(receivers):
+    while receivers:
+        signal, sender, func = receivers.pop()
+
+        signal.disconnect(func, sender=sender)
+
+
+@receiver(setting_changed)
+def olp_settings_changed(sender, setting, **kwargs):
+    """
+    Rebuilds the model registry when the settings are overridden.
+    """
+
+    from . import packed
+    from .instrumentation import instrumentation
+    from .registry import registry
+    from .utils import patch_models
+
+    if setting != "OLP_SETTINGS":
+        return
+
+    packed.check_settings()
+    registry.populate()
+    instrumentation.configure()
+
+    patch_models()
+    connect_membership_signals()
+    connect_cleanup_signals()
+    connect_table_signals()
+
+
+@receiver(post_migrate)
+def olp_post_migrate(sender, **kwargs):
+    """
+    Content types may have been recreated by a migration.
+    """
+
+    from .cache import permission_cache
+    from .packed import permission_bits
+    from .registry import registry
+
+    registry.clear_cache()
+    permission_cache.clear()
+    permission_bits.clear()
+
+
+@receiver(post_save, sender="auth.Permission")
+@receiver(post_delete, sender="auth.Permission")
+@receiver(post_save, sender="contenttypes.ContentType")
+@receiver(post_delete, sender="contenttypes.ContentType")
+def olp_permission_changed(sender, **kwargs):
+    """
+    Clears the permission cache when a permission may have been renamed,
+    added or removed.
+
+    The cache is cleared again once the transaction is committed, in case
+    another thread reloaded it before the change was visible.
+    """
+
+    from .cache import permission_cache
+    from .packed import permission_bits
+
+    permission_cache.clear()
+    permission_bits.clear()
+
+    transaction.on_commit(permission_cache.clear, using=kwargs.get("using"))
+    transaction.on_commit(permission_bits.clear, using=kwargs.get("using"))
+
+
+@receiver(post_save, sender="olp.PermissionBit")
+@receiver(post_delete, sender="olp.PermissionBit")
+def olp_permission_bit_changed(sender, instance, **kwargs):
+    """
+    Clears the cache of the bits of the packed storage when a bit is assigned
+    or removed.
+
+    A bit which is removed, usually along with its permission, is cleared
+    from the masks first, so it can never grant the permission that it is
+    assigned to next.
+    """
+
+    from .cache import shared_cache
+    from .packed import clear_bit, permission_bits
+
+    if kwargs.get("signal") is post_delete:
+        clear_bit(instance.content_type_id, instance.bit)
+
+        shared_cache.invalidate(using=kwargs.get("using"))
+
+    permission_bits.clear()
+
+    transaction.on_commit(permission_bits.clear, using=kwargs.get("using"))
+
+
+@receiver(pre_delete, sender="olp.ObjectPermission")
+@receiver(pre_delete, sender="olp.PackedObjectPermission")
+@receiver(pre_delete, sender="olp.ModelPermission")
+def olp_permission_deleting(sender, instance, origin=None, **kwargs):
+    """
+    Counts the permissions which are about to be deleted by a deletion, so
+    they can be refreshed and invalidated once for all of them after the last
+    one has been deleted, rather than once for every row.
+    """
+
+    pending = _get_pending_deletes().setdefault(id(origin), {
+        # Keeps the id of the origin from being reused until it is done
+        "origin": origin,
+        "count": 0,
+        "refresh": {},
+        "bases": set(),
+    })
+
+    pending["count"] += 1
+
+
+@receiver(post_save, sender="olp.ObjectPermission")
+@receiver(post_delete, sender="olp.ObjectPermission")
+@receiver(post_save, sender="olp.PackedObjectPermission")
+@receiver(post_delete, sender="olp.PackedObjectPermission")
+def olp_object_permission_changed(sender, instance, **kwargs):
+    """
+    Invalidates the cached permissions of the base object of a permission
+    which was saved or deleted outside of the OLP functions.
+    """
+
+    base = (instance.base_object_ct_id, instance.base_object_id)
+    target = (instance.target_object_ct_id, instance.target_object_id)
+
+    _permission_changed(base, target, kwargs)
+
+
+@receiver(post_save, sender="olp.ModelPermission")
+@receiver(post_delete, sender="olp.ModelPermission")
+def olp_model_permission_changed(sender, instance, **kwargs):
+    """
+    Invalidates the cached permissions of the base object of a permission on
+    every instance of a model, which was saved or deleted outside of the OLP
+    functions.
+    """
+
+    base = (instance.base_object_ct_id, instance.base_object_id)
+
+    _permission_changed(base, None, kwargs)
+
+
+def olp_table_permission_changed(sender, instance, **kwargs):
+    """
+    Invalidates the cached permissions of the base object of a permission in
+    one of the tables in the settings, which was saved or deleted outside of
+    the OLP functions.
+    """
+
+    from django.contrib.contenttypes.models import ContentType
+
+    base_model = sender._meta.get_field("base_object").related_model
+    base_ct = ContentType.objects.get_for_model(base_model)
+
+    _permission_changed((base_ct.pk, instance.base_object_id), None, kwargs)
+
+
+def _permission_changed(base, target, kwargs):
+    """
+    Refreshes the effective permissions of a base object on a target, when
+    one is given, and invalidates its cached permissions.  Permissions which
+    are deleted are grouped by the deletion they are part of, and handled
+    once the last of them has been deleted.
+    """
+
+    using = kwargs.get("using")
+
+    if kwargs.get("signal") is not post_delete:
+        _refresh_permissions({target: set([base])} if target else {},
+                             set([base]), using)
+        return
+
+    deletes = _get_pending_deletes()
+    pending = deletes.get(id(kwargs.get("origin")))
+
+    if pending is None:
+        pending = {"count": 1, "refresh": {}, "bases": set()}
+
+    if target is not None:
+        pending["refresh"].setdefault(target, set()).add(base)
+
+    pending["bases"].add(base)
+    pending["count"] -= 1
+
+    if pending["count"] <= 0:
+        deletes.pop(id(kwargs.get("origin")), None)
+
+        _refresh_permissions(pending["refresh"], pending["bases"], using)
+
+
+def _refresh_permissions(refresh, bases, using):
+    from . import effective
+    from .cache import shared_cache
+
+    # A single target is refreshed on its own, while permissions on several
+    # targets are refreshed together for all of their base objects
+    if len(refresh) == 1:
+        for target, target_bases in refresh.items():
+            effective.refresh_for_bases(list(target_bases), target)
+    elif refresh:
+        effective.refresh_for_bases(list(set().union(*refresh.values())))
+
+    for base in bases:
+        shared_cache.invalidate(base, using=using)
+
+
+def _get_pending_deletes():
+    if not hasattr(_pending_deletes, "origins"):
+        _pending_deletes.origins = {}
+
+    return _pending_deletes.origins
+
+
+def olp_cleanup_deleted(sender, instance, **kwargs):
+    """
+    Removes the permissions given to or on an object which was deleted.
+    """
+
+    from .utils import _cleanup_suspended, remove_all_permissions
+
+    if _cleanup_suspended():
+        return
+
+    remove_all_permissions(instance)
+
+
+def olp_membership_m2m_changed(sender, instance, action, model, pk_set,
+                               **kwargs):
+    from django.contrib.auth import get_user_model
+
+    from .effective import get_member_ids
+
+    user_model = get_user_model()
+
+    if action == "pre_clear" and not isinstance(instance, user_model):
+        if _tracks_membership():
+            instance._olp_member_ids = get_member_ids(instance)
+
+        return
+
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if isinstance(instance, user_model):
+        user_ids = [instance.pk]
+    elif model is user_model and pk_set:
+        user_ids = list(pk_set)
+    else:
+        user_ids = getattr(instance, "_olp_member_ids", None)
+
+    membership_changed.send(sender=sender, user_ids=user_ids,
+                            using=kwargs.get("using"))
+
+
+def olp_membership_model_changing(sender, instance, **kwargs):
+    """
+    Keeps track of the members of an instance of one of the models in the
+    settings before it is changed, as they may lose their permissions.
+    """
+
+    from .effective import get_member_ids
+
+    if instance.pk is None or not _tracks_membership():
+        return
+
+    instance._olp_member_ids = get_member_ids(instance)
+
+
+def olp_membership_model_changed(sender, instance, **kwargs):
+    from .effective import get_member_ids
+
+    if not _tracks_membership():
+        return
+
+    user_ids = set(getattr(instance, "_olp_member_ids", ()))
+
+    if instance.pk is not None and kwargs.get("signal") is post_save:
+        user_ids.update(get_member_ids(instance))
+
+    membership_changed.send(sender=sender, user_ids=list(user_ids),
+                            using=kwargs.get("using"))
+
+
+def olp_membership_related_changing(sender, instance, **kwargs):
+    """
+    Keeps track of the users linked to the models in the settings by an
+    object before it is changed, as they may lose their permissions.
+    """
+
+    if instance.pk is None or not _tracks_membership():
+        return
+
+    instance._olp_member_ids = _get_related_member_ids(sender, instance)
+
+
+def olp_membership_related_changed(sender, instance, **kwargs):
+    if not _tracks_membership():
+        return
+
+    user_ids = set(getattr(instance, "_olp_member_ids", ()))
+
+    if kwargs.get("signal") is post_save:
+        user_ids.update(_get_related_member_ids(sender, instance))
+
+    membership_changed.send(sender=sender, user_ids=list(user_ids),
+                            using=kwargs.get("using"))
+
+
+def _get_related_member_ids(sender, instance):
+    """
+    Gets the ids of the users which an object links to the models in the
+    settings, by following the rest of their filter paths from the object.
+    """
+
+    from django.contrib.auth import get_user_model
+
+    from .registry import registry
+
+    user_ids = set()
+
+    for registered_model in registry:
+        field_name, _, rest = registered_model.filter_path.partition("__")
+        field = registered_model.model._meta.get_field(field_name)
+
+        if field.many_to_many or field.related_model is not sender:
+            continue
+
+        if not rest:
+            if issubclass(sender, get_user_model()):
+                user_ids.add(instance.pk)
+
+            continue
+
+        user_ids.update(sender._base_manager.filter(pk=instance.pk)
+                        .values_list(rest, flat=True))
+
+    user_ids.discard(None)
+
+    return user_ids
+
+
+def _tracks_membership():
+    """
+    Determines if anything depends on knowing which users joined or left the
+    models in the settings.
+    """
+
+    from . import effective
+    from .cache import shared_cache
+
+    from .utils import _get_setting
+
+    return shared_cache.enabled or effective.is_enabled() or \
+        bool(_get_setting("resolve_membership"))
+
+
+def olp_user_permissions_changed(sender, instance, action, model, pk_set,
+                                 **kwargs):
+    from django.contrib.auth import get_user_model
+
+    from .cache import shared_cache
+
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if isinstance(instance, get_user_model()):
+        shared_cache.invalidate(instance, using=kwargs.get("using"))
+    else:
+        shared_cache.invalidate(using=kwargs.get("using"))
+
+
+@receiver(membership_changed)
+def olp_membership_ids_changed(sender, **kwargs):
+    """
+    Stops the membership ids cached on users from being used, as they may no
+    longer be accurate.
+    """
+
+    from .utils import _membership_changed
+
+    _membership_changed()
+
+
+@receiver(membership_changed)
+def olp_invalidate_members(sender, user_ids, **kwargs):
+    """
+    Invalidates the cached permissions of users who joined or left one of the
+    models in the settings.
+    """
+
+    from django.contrib.auth import get_user_model
+    from django.contrib.contenttypes.models import ContentType
+
+    from .cache import shared_cache
+
+    if not shared_cache.enabled:
+        return
+
+    if user_ids is None:
+        shared_cache.invalidate(using=kwargs.get("using"))
+        return
+
+    user_ct = ContentType.objects.get_for_model(get_user_model())
+
+    for user_id in user_ids:
+        shared_cache.invalidate((user_ct.pk, user_id),
+                                using=kwargs.get("using"))
+
+
+@receiver(membership_changed)
+def olp_refresh_members(sender, user_ids, **kwargs):
+    """
+    Refreshes the effective permissions of users who joined or left one of
+    the models in the settings.
+
+    When the users are unknown, every user is rebuilt once the transaction
+    is committed, rather than within the signal.
+    """
+
+    from . import effective
+
+    if not effective.is_enabled():
+        return
+
+    if user_ids is None:
+        _schedule_rebuild(kwargs.get("using"))
+    else:
+        effective.refresh_effective_permissions(user_ids)
+
+
+def _schedule_rebuild(using):
+    """
+    Rebuilds the effective permissions of every user once the transaction is
+    committed, at most once for each transaction.
+    """
+
+    from django.db import connections, router
+
+    from . import effective
+    from .models import EffectivePermission
+
+    using = using or router.db_for_write(EffectivePermission)
+    connection = connections[using]
+
+    # A rebuild scheduled by a transaction which was rolled back never ran
+    if not connection.in_atomic_block:
+        connection.olp_rebuild_scheduled = False
+
+    if getattr(connection, "olp_rebuild_scheduled", False):
+        return
+
+    connection.olp_rebuild_scheduled = True
+
+    def rebuild():
+        connection.olp_rebuild_scheduled = False
+
+        effective.rebuild_effective_permissions()
+
+    transaction.on_commit(rebuild, using=using)
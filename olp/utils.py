@@ -1,9 +1,45 @@
-def assign_perm(user, permission, obj=None):
+from contextlib import contextmanager
+import threading
+
+from . import effective, packed
+from .instrumentation import instrumentation
+
+# Attributes used by the permission backend to cache permissions on a user
+PERM_CACHE_ATTR = "_olp_perm_cache"
+GROUP_PERM_CACHE_ATTR = "_olp_group_perm_cache"
+HAS_PERM_CACHE_ATTR = "_olp_has_perm_cache"
+
+# Attribute used to cache the ids of the objects a user is a member of
+MEMBERSHIP_CACHE_ATTR = "_olp_membership_cache"
+
+# Attributes used by Django's `ModelBackend` to cache permissions on a user
+DJANGO_PERM_CACHE_ATTRS = ("_perm_cache", "_user_perm_cache",
+                           "_group_perm_cache")
+
+# The number of rows written, or ids filtered on, in a single query by the
+# bulk functions.  This keeps queries below SQLite's limit of 999 variables.
+DEFAULT_BATCH_SIZE = 400
+
+
+class _CleanupState(threading.local):
+    suspended = False
+
+
+_cleanup_state = _CleanupState()
+
+# Incremented whenever the members of the models in the settings change, so
+# the membership ids cached on users are no longer used
+_membership_generation = [0]
+
+
+@instrumentation.instrument("assign_perm")
+def assign_perm(user, permission, obj=None, using=None):
     """
     Assign a permission to a user, optionally tie it to an object.
 
     This assigns both the standard Django permissions, and the custom
-    object-level permissions.
+    object-level permissions.  Object-level permissions are written to the
+    database `using`, or to the one chosen by the database routers.
     """
 
     from olp.models import ObjectPermission
@@ -18,49 +54,156 @@ def assign_perm(user, permission, obj=None):
         if permission is None:
             return False
 
-    if obj:
+    table = _get_table(user, obj)
+
+    if obj and table is not None:
+        permission = table(base_object=user, target_object=obj,
+                           permission=permission)
+
+        table.objects.db_manager(using).bulk_create([permission],
+                                                    ignore_conflicts=True)
+    elif obj and packed.is_enabled():
+        packed.assign_perms(user, [permission], obj, using=using)
+    elif obj:
         permission = ObjectPermission(base_object=user, target_object=obj,
                                       permission=permission)
-        permission.save()
+
+        # Assigning a permission that already exists is a no-op
+        ObjectPermission.objects.db_manager(using).bulk_create(
+            [permission], ignore_conflicts=True)
+
+        effective.refresh_for_bases(user, obj)
     else:
         user.user_permissions.add(permission)
 
+    _permissions_changed(user, using=using)
+
     return True
 
 
-def has_perm(base, permission, target=None):
+async def aassign_perm(user, permission, obj=None, using=None):
     """
-    Determines if a base object has a permission on a target object.
+    Asynchronous version of `assign_perm`.
     """
 
+    from asgiref.sync import sync_to_async
     from olp.models import ObjectPermission
 
+    if not hasattr(permission, "pk"):
+        permission = await _aget_perm_for_codename(permission)
+
+        if permission is None:
+            return False
+
+    await _aprepare_content_types(user, obj)
+
+    table = _get_table(user, obj)
+
+    if obj and table is not None:
+        permission = table(base_object=user, target_object=obj,
+                           permission=permission)
+
+        await table.objects.db_manager(using).abulk_create(
+            [permission], ignore_conflicts=True)
+    elif obj and packed.is_enabled():
+        await sync_to_async(packed.assign_perms)(user, [permission], obj,
+                                                 using=using)
+    elif obj:
+        permission = ObjectPermission(base_object=user, target_object=obj,
+                                      permission=permission)
+
+        await ObjectPermission.objects.db_manager(using).abulk_create(
+            [permission], ignore_conflicts=True)
+
+        if effective.is_enabled():
+            await sync_to_async(effective.refresh_for_bases)(user, obj)
+    else:
+        await user.user_permissions.aadd(permission)
+
+    await sync_to_async(_permissions_changed)(user, using=using)
+
+    return True
+
+
+@instrumentation.instrument("has_perm")
+def has_perm(base, permission, target=None, using=None):
+    """
+    Determines if a base object has a permission on a target object.
+
+    The permissions are read from the database `using`, or from the one
+    chosen by the database routers.  Unless the shared cache is enabled, the
+    permission is checked with an `EXISTS` query instead of reading the
+    names of all of the permissions.
+    """
+
+    from .cache import shared_cache
+
     if not hasattr(permission, "pk"):
         permission = _get_perm_for_codename(permission)
 
         if permission is None:
             return False
 
-    objs = ObjectPermission.objects.for_base(base)
+    if not shared_cache.enabled:
+        return _has_permission(_get_base_permissions(base, target, using),
+                               permission)
 
-    if target is not None:
-        objs = objs.for_target(target)
+    cache_args = _get_target_args(target)
+
+    permissions = shared_cache.get(base, "has", cache_args, using=using)
+
+    instrumentation.record_cache(permissions is not None)
+
+    if permissions is None:
+        permissions = _get_permission_names(
+            _get_base_permissions(base, target, using))
+
+        shared_cache.set(base, "has", cache_args, permissions, using=using)
+
+    return _get_perm_name(permission) in permissions
 
-    perms_list = objs.select_related("permission__content_type",
-        "permission").values_list("permission__content_type__app_label",
-                                  "permission__codename")
 
-    permissions = set(["%s.%s" % (perm[0], perm[1]) for perm in perms_list])
+async def ahas_perm(base, permission, target=None, using=None):
+    """
+    Asynchronous version of `has_perm`.
+    """
+
+    from .cache import shared_cache
+
+    if not hasattr(permission, "pk"):
+        permission = await _aget_perm_for_codename(permission)
+
+        if permission is None:
+            return False
 
-    permission_codename = "%s.%s" % (permission.content_type.app_label,
-                                     permission.codename)
+    await _aprepare_content_types(base, target)
 
-    return permission_codename  in permissions
+    if not shared_cache.enabled:
+        return await _ahas_permission(
+            _get_base_permissions(base, target, using), permission)
 
+    cache_args = _get_target_args(target)
 
-def remove_perm(user, permission, obj=None):
+    permissions = await shared_cache.aget(base, "has", cache_args,
+                                          using=using)
+
+    if permissions is None:
+        permissions = await _aget_permission_names(
+            _get_base_permissions(base, target, using))
+
+        await shared_cache.aset(base, "has", cache_args, permissions,
+                                using=using)
+
+    return _get_perm_name(permission) in permissions
+
+
+@instrumentation.instrument("remove_perm")
+def remove_perm(user, permission, obj=None, using=None):
     """
-    Remove a permission from a user
+    Remove a permission from a user, optionally only on an object.
+
+    Object-level permissions are removed from the database `using`, or from
+    the one chosen by the database routers.
     """
 
     from olp.models import ObjectPermission
@@ -71,14 +214,262 @@ def remove_perm(user, permission, obj=None):
         if permission is None:
             return False
 
-    if obj:
-        permission = ObjectPermission.objects.for_base(user).for_target(obj) \
-            .for_permission(permission)
+    table = _get_table(user, obj)
+
+    if obj and table is not None:
+        _bulk_delete_permissions(table.objects.using(using).for_base(user)
+                                 .for_target(obj).for_permission(permission))
+    elif obj and packed.is_enabled():
+        packed.remove_perms(user, [permission], obj, using=using)
+    elif obj:
+        permission = ObjectPermission.objects.using(using).for_base(user) \
+            .for_target(obj).for_permission(permission)
+
+        _bulk_delete_permissions(permission)
 
-        permission.delete()
+        effective.refresh_for_bases(user, obj)
     else:
         user.user_permissions.remove(permission)
 
+    _permissions_changed(user, using=using)
+
+    return True
+
+
+async def aremove_perm(user, permission, obj=None, using=None):
+    """
+    Asynchronous version of `remove_perm`.
+    """
+
+    from asgiref.sync import sync_to_async
+    from olp.models import ObjectPermission
+
+    if not hasattr(permission, "pk"):
+        permission = await _aget_perm_for_codename(permission)
+
+        if permission is None:
+            return False
+
+    await _aprepare_content_types(user, obj)
+
+    table = _get_table(user, obj)
+
+    if obj and table is not None:
+        await sync_to_async(_bulk_delete_permissions)(
+            table.objects.using(using).for_base(user).for_target(obj)
+            .for_permission(permission))
+    elif obj and packed.is_enabled():
+        await sync_to_async(packed.remove_perms)(user, [permission], obj,
+                                                 using=using)
+    elif obj:
+        permission = ObjectPermission.objects.using(using).for_base(user) \
+            .for_target(obj).for_permission(permission)
+
+        await sync_to_async(_bulk_delete_permissions)(permission)
+
+        if effective.is_enabled():
+            await sync_to_async(effective.refresh_for_bases)(user, obj)
+    else:
+        await user.user_permissions.aremove(permission)
+
+    await sync_to_async(_permissions_changed)(user, using=using)
+
+    return True
+
+
+def assign_model_perm(base, permission, model, using=None):
+    """
+    Gives a base object a permission on every instance of a model, including
+    the instances created later, using a single row.
+
+    The `model_permissions` key of the settings must be set for these
+    permissions to be stored and checked.
+    """
+
+    from django.contrib.contenttypes.models import ContentType
+
+    from .models import ModelPermission
+
+    _check_model_permissions()
+
+    if not hasattr(permission, "pk"):
+        permission = _get_perm_for_codename(permission)
+
+        if permission is None:
+            return False
+
+    permission = ModelPermission(
+        base_object=base,
+        target_object_ct=ContentType.objects.get_for_model(model),
+        permission=permission,
+    )
+
+    ModelPermission.objects.db_manager(using).bulk_create(
+        [permission], ignore_conflicts=True)
+
+    _permissions_changed(base, using=using)
+
+    return True
+
+
+def remove_model_perm(base, permission, model, using=None):
+    """
+    Removes a permission on every instance of a model from a base object,
+    which was given with `assign_model_perm`.  Permissions given on single
+    instances are kept.
+    """
+
+    from .models import ModelPermission
+
+    _check_model_permissions()
+
+    if not hasattr(permission, "pk"):
+        permission = _get_perm_for_codename(permission)
+
+        if permission is None:
+            return False
+
+    _bulk_delete_permissions(ModelPermission.objects.using(using)
+                             .for_base(base).for_target_model(model)
+                             .for_permission(permission))
+
+    _permissions_changed(base, using=using)
+
+    return True
+
+
+def bulk_assign_perm(bases, permissions, targets, batch_size=None):
+    """
+    Assign one or more permissions to many base objects on many targets.
+
+    The bases and targets can be given as a single object, a queryset, or an
+    iterable of objects and querysets.  The permissions can be given as a
+    single permission or an iterable of permissions.
+
+    The permissions are written using `bulk_create`, in batches of
+    `batch_size` rows, which defaults to the `batch_size` setting.  Any
+    permissions which have already been assigned are skipped.  Permissions
+    between models which have a table in the settings are written to it.
+    """
+
+    from django.db import transaction
+    from olp.models import ObjectPermission
+
+    permissions = _get_perms(permissions)
+
+    if permissions is None:
+        return False
+
+    batch_size = _get_batch_size(batch_size)
+    bases = _as_list(bases)
+
+    if packed.is_enabled():
+        packed.assign_perms(bases, permissions, targets, batch_size)
+
+        _permissions_changed(bases)
+
+        return True
+
+    base_pairs = list(_iter_ct_ids(bases, batch_size))
+    tables = {}
+
+    def iter_permissions():
+        for target_ct, target_id in _iter_ct_ids(targets, batch_size):
+            for base_ct, base_id in base_pairs:
+                table = _get_ct_table(tables, base_ct, target_ct)
+
+                for permission in permissions:
+                    if table is not None:
+                        yield table(
+                            base_object_id=base_id,
+                            target_object_id=target_id,
+                            permission_id=permission.pk,
+                        )
+                        continue
+
+                    yield ObjectPermission(
+                        base_object_ct_id=base_ct.pk,
+                        base_object_id=base_id,
+                        target_object_ct_id=target_ct.pk,
+                        target_object_id=target_id,
+                        permission_id=permission.pk,
+                    )
+
+    with transaction.atomic():
+        for batch in _iter_batches(iter_permissions(), batch_size):
+            batches = {}
+
+            for permission in batch:
+                batches.setdefault(type(permission), []).append(permission)
+
+            for model, model_batch in batches.items():
+                model.objects.bulk_create(model_batch, batch_size=batch_size,
+                                          ignore_conflicts=True)
+
+    effective.refresh_for_bases(bases)
+
+    _permissions_changed(bases)
+
+    return True
+
+
+def bulk_remove_perm(bases, permissions, targets, batch_size=None):
+    """
+    Remove one or more permissions from many base objects on many targets.
+
+    The arguments are the same as for `bulk_assign_perm`.  The permissions are
+    removed using a delete per content type, instead of one per object.
+    Querysets are used as subqueries, while lists of objects are split into
+    batches of `batch_size` ids.
+    """
+
+    from django.db import transaction
+    from olp.models import ObjectPermission
+
+    permissions = _get_perms(permissions)
+
+    if permissions is None:
+        return False
+
+    batch_size = _get_batch_size(batch_size)
+    bases = _as_list(bases)
+
+    if packed.is_enabled():
+        packed.remove_perms(bases, permissions, targets, batch_size)
+
+        _permissions_changed(bases)
+
+        return True
+
+    permission_ids = [permission.pk for permission in permissions]
+    target_filters = list(_iter_ct_id_filters(targets, batch_size))
+    tables = {}
+
+    with transaction.atomic():
+        for base_ct, base_ids in _iter_ct_id_filters(bases, batch_size):
+            for target_ct, target_ids in target_filters:
+                table = _get_ct_table(tables, base_ct, target_ct)
+
+                if table is not None:
+                    _bulk_delete_permissions(table.objects.filter(
+                        base_object__in=base_ids,
+                        target_object__in=target_ids,
+                        permission__in=permission_ids,
+                    ))
+                    continue
+
+                _bulk_delete_permissions(ObjectPermission.objects.filter(
+                    base_object_ct=base_ct,
+                    base_object_id__in=base_ids,
+                    target_object_ct=target_ct,
+                    target_object_id__in=target_ids,
+                    permission__in=permission_ids,
+                ))
+
+    effective.refresh_for_bases(bases)
+
+    _permissions_changed(bases)
+
     return True
 
 
@@ -88,27 +479,144 @@ def remove_all_permissions(model_instance):
     """
 
     from django.contrib.contenttypes.models import ContentType
-    from olp.models import ObjectPermission
     from django.db.models import Q
 
+    from .cache import shared_cache
+    from .models import ModelPermission
+    from .registry import registry
+
     # Get the content type for the given instance
     base_content_type = ContentType.objects.get_for_model(
         model_instance
     )
 
     # Unlink any permissions associated with this model
-    permissions = ObjectPermission.objects.filter(
-        (
-            Q(base_object_id=model_instance.id) &
-            Q(base_object_ct=base_content_type)
-        ) |
-        (
-            Q(target_object_id=model_instance.id) &
-            Q(target_object_ct=base_content_type)
+    if _has_integer_pk(model_instance):
+        permissions = _get_permission_model().objects.filter(
+            (
+                Q(base_object_id=model_instance.pk) &
+                Q(base_object_ct=base_content_type)
+            ) |
+            (
+                Q(target_object_id=model_instance.pk) &
+                Q(target_object_ct=base_content_type)
+            )
         )
-    )
 
-    permissions.delete()
+        _bulk_delete_permissions(permissions)
+
+    for base_model, target_model, table in registry.get_tables(
+            base=model_instance):
+        _bulk_delete_permissions(table.objects.for_base(model_instance))
+
+    for base_model, target_model, table in registry.get_tables(
+            target=model_instance):
+        _bulk_delete_permissions(table.objects.for_target(model_instance))
+
+    if _get_setting("model_permissions") and _has_integer_pk(model_instance):
+        _bulk_delete_permissions(
+            ModelPermission.objects.for_base(model_instance))
+
+    effective.refresh_for_bases(model_instance)
+    effective.remove_for_target(model_instance)
+
+    # The object may also have been the target of permissions given to any
+    # number of other objects
+    clear_perm_cache(model_instance)
+    shared_cache.invalidate()
+
+
+def bulk_remove_all_permissions(objs, batch_size=None):
+    """
+    Removes all permissions given to, or on, many objects.
+
+    The objects can be given as a single object, a queryset, or an iterable
+    of objects and querysets, which must not have been deleted yet.  The
+    permissions are removed in batches of `batch_size` objects, using a
+    delete for the permissions given to them and one for the permissions on
+    them, instead of collecting and deleting them one by one.  Returns the
+    number of permissions which were removed.
+    """
+
+    from django.db import transaction
+    from django.db.models import Model, QuerySet
+
+    from .cache import shared_cache
+    from .models import ModelPermission
+    from .registry import registry
+
+    batch_size = _get_batch_size(batch_size)
+    objs = _as_list(objs)
+
+    permission_model = _get_permission_model()
+
+    count = 0
+
+    with transaction.atomic():
+        for ct, batch in _iter_ct_id_batches(objs, batch_size):
+            model = ct.model_class()
+
+            if model is None or _has_integer_pk(model):
+                count += _bulk_delete_permissions(
+                    permission_model.objects.filter(
+                        base_object_ct=ct,
+                        base_object_id__in=batch,
+                    ))
+                count += _bulk_delete_permissions(
+                    permission_model.objects.filter(
+                        target_object_ct=ct,
+                        target_object_id__in=batch,
+                    ))
+
+                if _get_setting("model_permissions"):
+                    count += _bulk_delete_permissions(
+                        ModelPermission.objects.filter(
+                            base_object_ct=ct,
+                            base_object_id__in=batch,
+                        ))
+
+            if model is not None:
+                for base_model, target_model, table in registry.get_tables(
+                        base=model):
+                    count += _bulk_delete_permissions(table.objects.filter(
+                        base_object__in=batch))
+
+                for base_model, target_model, table in registry.get_tables(
+                        target=model):
+                    count += _bulk_delete_permissions(table.objects.filter(
+                        target_object__in=batch))
+
+            effective.remove_for_targets(ct, batch)
+
+    effective.refresh_for_bases(objs)
+
+    if isinstance(objs, Model):
+        clear_perm_cache(objs)
+    elif not isinstance(objs, QuerySet):
+        for obj in objs:
+            if isinstance(obj, Model):
+                clear_perm_cache(obj)
+
+    shared_cache.invalidate()
+
+    return count
+
+
+def clear_perm_cache(obj):
+    """
+    Clears any permissions that have been cached on an object.
+
+    This includes the object-level permissions cached by the OLP backend as
+    well as the model-level permissions cached by Django's `ModelBackend`.
+    """
+
+    cache_attrs = (PERM_CACHE_ATTR, GROUP_PERM_CACHE_ATTR,
+                   HAS_PERM_CACHE_ATTR, MEMBERSHIP_CACHE_ATTR) + \
+        DJANGO_PERM_CACHE_ATTRS
+
+    for cache_attr in cache_attrs:
+        if hasattr(obj, cache_attr):
+            delattr(obj, cache_attr)
 
 
 def patch_models():
@@ -129,19 +637,13 @@ def patch_models():
     except ImportError:
         from django.contrib.auth.models import User
 
-    from django.conf import settings
+    from .registry import registry
 
     setattr(User, "assign_perm", assign_perm)
     setattr(User, "remove_perm", remove_perm)
 
-    model_dict = settings.OLP_SETTINGS.get("models")
-
-    for model_path, filter_path in model_dict:
-        import_path = ".".join(model_path.split(".")[:-1])
-        model_name = model_path.split(".")[-1]
-
-        model_module = __import__(import_path, {}, {}, str(model_name[-1]))
-        model = getattr(model_module, model_name)
+    for registered_model in registry:
+        model = registered_model.model
 
         setattr(model, "assign_perm", assign_perm)
         setattr(model, "remove_perm", remove_perm)
@@ -150,18 +652,21 @@ def patch_models():
             setattr(model, "has_perm", has_perm)
 
 
-def get_obj_ids_for_user(user, permission, model_class=None, final_model=None):
+@instrumentation.instrument("get_obj_ids_for_user")
+def get_obj_ids_for_user(user, permission, model_class=None, final_model=None,
+                         using=None):
     """
     Gets the ids of objects that a user has a specific permission on.
 
     This is used by get_objs_for_user, but can be used separately to avoid
-    returning a query when not desired.
+    returning a query when not desired.  The ids are always returned as a
+    queryset.  When they are read from the shared cache, the queryset selects
+    the cached ids from the model instead of the permission tables.  The
+    permissions are read from the database `using`, or from the one chosen by
+    the database routers.
     """
-    from django.conf import settings
-    from django.contrib.contenttypes.models import ContentType
-    from django.db.models import Q
 
-    from .models import ObjectPermission
+    from .cache import shared_cache
 
     if not hasattr(permission, "pk"):
         permission = _get_perm_for_codename(permission)
@@ -169,49 +674,74 @@ def get_obj_ids_for_user(user, permission, model_class=None, final_model=None):
         if permission is None:
             return set()
 
-    if not final_model:
-        if model_class:
-            final_model = model_class
-        else:
-            ct = permission.content_type
-            final_model = ct.model_class()
+    final_model = _get_final_model(permission, model_class, final_model)
 
-    user_ct = ContentType.objects.get_for_model(user)
-    final_ct = ContentType.objects.get_for_model(final_model)
+    target_ids = shared_cache.get(user, "ids",
+                                  _get_ids_args(permission, final_model),
+                                  using=using)
 
-    model_dict = settings.OLP_SETTINGS.get("models")
+    if shared_cache.enabled:
+        instrumentation.record_cache(target_ids is not None)
 
-    # Filters that only appy to relations where the user is involved
-    related_filter = Q()
+    if target_ids is not None:
+        return _get_all_ids(final_model, using).filter(pk__in=target_ids)
 
-    for model_path, filter_path in model_dict:
-        model_objs = _get_model_objs_for_user(user, model_path, filter_path)
-        model = model_objs.model
-        model_ct = ContentType.objects.get_for_model(model)
+    if _has_model_perm(user, permission, final_model, using):
+        target_ids = _get_all_ids(final_model, using)
+    else:
+        target_ids = _get_obj_ids_list(user, permission, final_model, using)
 
-        model_filter = (
-            Q(base_object_ct=model_ct) & Q(base_object_id__in=model_objs)
-        )
+    if shared_cache.enabled:
+        shared_cache.set(user, "ids", _get_ids_args(permission, final_model),
+                         list(target_ids), using=using)
+
+    return target_ids
+
+
+async def aget_obj_ids_for_user(user, permission, model_class=None,
+                                final_model=None, using=None):
+    """
+    Asynchronous version of `get_obj_ids_for_user`.  As a query cannot be
+    evaluated lazily in an asynchronous context, the ids are always returned
+    as a list.
+    """
+
+    from .cache import shared_cache
+
+    if not hasattr(permission, "pk"):
+        permission = await _aget_perm_for_codename(permission)
+
+        if permission is None:
+            return []
 
-        related_filter = related_filter | model_filter
+    final_model = _get_final_model(permission, model_class, final_model)
 
-    # Filters that only apply to the user that was passed in
-    user_filter = Q(base_object_ct=user_ct) & Q(base_object_id=user.id)
+    await _aprepare_content_types(user, final_model)
+    await _aprepare_membership_ids(user)
 
-    # Filters that apply to all objects in the query
-    all_filter = Q(permission=permission) & Q(target_object_ct=final_ct)
+    ids_args = _get_ids_args(permission, final_model)
 
-    perms_filter = (related_filter | user_filter) & all_filter
+    target_ids = await shared_cache.aget(user, "ids", ids_args, using=using)
+
+    if target_ids is not None:
+        return target_ids
+
+    if await _ahas_model_perm(user, permission, final_model, using):
+        target_ids = _get_all_ids(final_model, using)
+    else:
+        target_ids = _get_obj_ids_list(user, permission, final_model, using)
+
+    target_ids = [target_id async for target_id in target_ids]
+
+    await shared_cache.aset(user, "ids", ids_args, target_ids, using=using)
 
-    obj_perms = ObjectPermission.objects.filter(perms_filter)
-    target_ids = obj_perms.values_list("target_object_id", flat=True)
-    
     return target_ids
 
 
-def get_objs_for_user(user, permission, model_class=None):
+def get_objs_for_user(user, permission, model_class=None, using=None):
     """
-    Gets the objects that a user has a specific permission on.
+    Gets the objects that a user has a specific permission on, from the
+    database `using` or the one chosen by the database routers.
     """
     if not hasattr(permission, "pk"):
         permission = _get_perm_for_codename(permission)
@@ -225,51 +755,1077 @@ def get_objs_for_user(user, permission, model_class=None):
         ct = permission.content_type
         final_model = ct.model_class()
 
-    target_ids = get_obj_ids_for_user(user, permission, model_class, final_model)
-    
-    objs = final_model._default_manager.filter(id__in=target_ids)
+    objs = final_model._default_manager.db_manager(using).all()
 
-    return objs
+    # The permission on every instance does not need to be checked per object
+    if _has_model_perm(user, permission, final_model, using):
+        return objs
 
+    perm_exists = _get_perm_exists(user, permission, final_model, using)
 
-def _get_model_objs_for_user(user, model_path, filter_path):
-    import_path = ".".join(model_path.split(".")[:-1])
-    model_name = model_path.split(".")[-1]
+    if perm_exists is None:
+        return objs.none()
 
-    model_module = __import__(import_path, {}, {}, str(model_name))
-    model = getattr(model_module, model_name)
+    return objs.filter(perm_exists)
 
-    model_objs = model._default_manager.filter(**{filter_path: user})
 
-    return model_objs
+def iter_obj_ids_for_user(user, permission, model_class=None, chunk_size=2000,
+                          after=None, using=None):
+    """
+    Iterates over the ids of objects that a user has a specific permission on,
+    in ascending order.
+
+    The ids are read in chunks of `chunk_size` using keyset pagination, so the
+    memory used does not grow with the number of objects.  Iteration can be
+    resumed by passing the last id which was seen as `after`, which is only
+    meaningful for the primary keys of a single model, so `model_class` has
+    to be given along with it.
+    """
 
+    _check_after(after, model_class)
 
-def _get_perm_for_codename(permission_codename):
-    from django.contrib.auth.models import Permission
+    if not hasattr(permission, "pk"):
+        permission = _get_perm_for_codename(permission)
 
-    permission_cache = getattr(Permission, "_olp_cache", {})
+        if permission is None:
+            return
 
-    if permission_codename in permission_cache:
-        return permission_cache[permission_codename]
+    final_model = _get_final_model(permission, model_class)
 
-    app_label, codename = permission_codename.split(".")
+    all_ids = _has_model_perm(user, permission, final_model, using)
 
-    permissions = Permission.objects.filter(
-        codename=codename,
-        content_type__app_label=app_label
-    ).select_related("content_type").only(
-        "content_type__app_label",
-        "content_type__model"
-    )
+    while True:
+        chunk = list(_get_obj_ids_chunk(user, permission, final_model,
+                                        chunk_size, after, using, all_ids))
 
-    try:
-        permission = permissions.get()
-    except Permission.MultipleObjectsReturned:
-        permission = permissions[0]
-    except Permission.DoesNotExist:
-        return None
+        for target_id in chunk:
+            yield target_id
+
+        if len(chunk) < chunk_size:
+            return
+
+        after = chunk[-1]
+
+
+async def aiter_obj_ids_for_user(user, permission, model_class=None,
+                                 chunk_size=2000, after=None, using=None):
+    """
+    Asynchronous version of `iter_obj_ids_for_user`.
+    """
+
+    _check_after(after, model_class)
+
+    if not hasattr(permission, "pk"):
+        permission = await _aget_perm_for_codename(permission)
+
+        if permission is None:
+            return
+
+    final_model = _get_final_model(permission, model_class)
+
+    await _aprepare_content_types(user, final_model)
+    await _aprepare_membership_ids(user)
+
+    all_ids = await _ahas_model_perm(user, permission, final_model, using)
+
+    while True:
+        chunk = [target_id async for target_id in _get_obj_ids_chunk(
+            user, permission, final_model, chunk_size, after, using, all_ids)]
+
+        for target_id in chunk:
+            yield target_id
+
+        if len(chunk) < chunk_size:
+            return
+
+        after = chunk[-1]
+
+
+def iter_objs_for_user(user, permission, model_class=None, chunk_size=2000,
+                       after=None, using=None):
+    """
+    Iterates over the objects that a user has a specific permission on, in
+    the order of their primary keys.
+
+    The objects are read in chunks of `chunk_size` using keyset pagination on
+    the primary key, and iteration can be resumed by passing the primary key
+    of the last object which was seen as `after`, along with `model_class`.
+    """
+
+    from django.db.models import QuerySet
+
+    _check_after(after, model_class)
+
+    objs = get_objs_for_user(user, permission, model_class, using=using)
+
+    if not isinstance(objs, QuerySet):
+        return
+
+    objs = objs.order_by("pk")
+
+    while True:
+        if after is not None:
+            chunk = list(objs.filter(pk__gt=after)[:chunk_size])
+        else:
+            chunk = list(objs[:chunk_size])
+
+        for obj in chunk:
+            yield obj
+
+        if len(chunk) < chunk_size:
+            return
+
+        after = chunk[-1].pk
+
+
+def get_perms_for_objs(user, objs, attach_as=None, batch_size=None):
+    """
+    Gets the permissions that a user has on each of the given objects.
+
+    This returns a dictionary mapping the content type id and primary key of
+    each object to the set of permissions, in the form of
+    `app_label.codename`, that the user has on it, including the permissions
+    given to the user through the models in the settings.  Only a single
+    query is run for every model (and every `batch_size` objects), instead of
+    one for each object.  Objects which have not been saved are rejected with
+    a `ValueError`.
+
+    The permissions are also cached on the user, so later calls to
+    `user.has_perm` for these objects will not hit the database.  When
+    `attach_as` is given, the permissions are also set as an attribute with
+    that name on every object, which makes it easy to use them in templates.
+    """
+
+    from django.contrib.contenttypes.models import ContentType
+
+    objs = list(objs)
+
+    obj_perms = {}
+    objs_by_ct = {}
+
+    for obj in objs:
+        if obj.pk is None:
+            raise ValueError("The permissions of %r cannot be read as it has "
+                             "not been saved." % obj)
+
+        ct = ContentType.objects.get_for_model(obj)
+
+        obj_perms[(ct.pk, obj.pk)] = set()
+        objs_by_ct.setdefault(ct, set()).add(obj.pk)
+
+    batch_size = _get_batch_size(batch_size)
+
+    for ct, obj_ids in objs_by_ct.items():
+        if user.is_anonymous:
+            continue
+
+        querysets = _get_user_querysets(user, ct.model_class())
+
+        for batch in _iter_batches(obj_ids, batch_size):
+            for user_perms in querysets:
+                names = user_perms.filter(target_object_id__in=batch) \
+                    .permission_names_by_target()
+
+                for target_id, target_names in names.items():
+                    obj_perms[(ct.pk, target_id)].update(target_names)
+
+        model_perms = _get_model_permissions(user, ct.model_class())
+
+        if model_perms is not None:
+            model_names = model_perms.permission_names()
+
+            for obj_id in obj_ids:
+                obj_perms[(ct.pk, obj_id)].update(model_names)
+
+        if not hasattr(user, PERM_CACHE_ATTR):
+            setattr(user, PERM_CACHE_ATTR, {})
+
+        perm_cache = getattr(user, PERM_CACHE_ATTR)
+
+        for obj_id in obj_ids:
+            perm_cache[(ct.pk, obj_id)] = obj_perms[(ct.pk, obj_id)]
+
+    if attach_as:
+        for obj in objs:
+            ct = ContentType.objects.get_for_model(obj)
+
+            setattr(obj, attach_as, obj_perms[(ct.pk, obj.pk)])
+
+    return obj_perms
+
+
+def _get_user_permissions(user, include_user=True, exclude_models=()):
+    """
+    Gets the permissions that apply to a user, as a queryset of either
+    `ObjectPermission`, `PackedObjectPermission` or `EffectivePermission`
+    objects.  All of them can be filtered using the `target_object_ct` and
+    `target_object_id` fields and the `for_permission` method, and their
+    names can be read with the `permission_names` methods.
+
+    The permissions are read from the `EffectivePermission` table when it is
+    maintained, unless only the permissions given through the models in the
+    settings should be included.  The permissions of the base models in
+    `exclude_models` are left out.  Returns `None` if no permissions would
+    apply to the user.
+    """
+
+    from .models import EffectivePermission
+
+    if include_user and effective.uses_effective_permissions(user):
+        return EffectivePermission.objects.filter(user=user)
+
+    base_filter = _get_base_filter(user, include_user=include_user,
+                                   exclude_models=exclude_models)
+
+    if base_filter is None:
+        return None
+
+    return _get_permission_model().objects.filter(base_filter)
+
+
+def _get_user_querysets(user, target_model=None, include_user=True,
+                        using=None):
+    """
+    Gets the permissions that apply to a user as a list of querysets, one for
+    the generic storage and one for every table in the `tables` key of the
+    settings, which can all be filtered on `target_object_id` and with the
+    `for_permission` method.
+
+    When a target model is given, the querysets only include permissions on
+    it, and the generic storage is only read for the base models which do
+    not have a table for it.  The querysets read from the database `using`,
+    or from the one chosen by the database routers.
+    """
+
+    from django.contrib.contenttypes.models import ContentType
+
+    from .registry import registry
+
+    tables = registry.get_tables(target_model)
+
+    querysets = []
+
+    if target_model is not None:
+        exclude_models = [base_model for base_model, table_target, table
+                          in tables]
+    else:
+        exclude_models = []
+
+    objs = _get_user_permissions(user, include_user=include_user,
+                                 exclude_models=exclude_models)
+
+    if objs is not None and target_model is not None:
+        target_ct = ContentType.objects.get_for_model(target_model)
+
+        objs = objs.filter(target_object_ct=target_ct)
+
+    if objs is not None:
+        querysets.append(objs.using(using))
+
+    for base_model, table_target, table in tables:
+        base_filter = _get_table_base_filter(user, base_model, include_user)
+
+        if base_filter is not None:
+            querysets.append(table.objects.using(using).filter(base_filter))
+
+    return querysets
+
+
+def _get_table_base_filter(user, base_model, include_user=True):
+    """
+    Builds the filter for the permissions in a table in the settings that
+    apply to a user, or returns `None` if none of them would.
+    """
+
+    from django.db.models import Q
+
+    from .registry import registry
+
+    if base_model is user._meta.concrete_model:
+        if not include_user:
+            return None
+
+        return Q(base_object=user)
+
+    for registered_model in registry:
+        if registered_model.model is not base_model:
+            continue
+
+        member_ids = _get_member_ids(user, registered_model)
+
+        if member_ids is None:
+            return None
+
+        return Q(base_object__in=member_ids)
+
+    return None
+
+
+def _get_permission_names(querysets):
+    names = set()
+
+    for objs in querysets:
+        names.update(objs.permission_names())
+
+    return names
+
+
+async def _aget_permission_names(querysets):
+    names = set()
+
+    for objs in querysets:
+        names.update(await objs.apermission_names())
+
+    return names
+
+
+def _has_permission(querysets, permission):
+    """
+    Determines if any of the querysets of permission rows has a permission,
+    using an `EXISTS` query filtered on the permission for each of them, and
+    stopping at the first one which has it.
+    """
+
+    for queryset in querysets:
+        if queryset.for_permission(permission).exists():
+            return True
+
+    return False
+
+
+async def _ahas_permission(querysets, permission):
+    for queryset in querysets:
+        if await queryset.for_permission(permission).aexists():
+            return True
+
+    return False
+
+
+def get_membership_ids(user):
+    """
+    Gets the ids of the instances of the models in the settings that a user
+    is related to, as a dictionary of sets keyed by the id of their content
+    type.
+
+    The models are combined into a single query using `UNION ALL`.  The ids
+    are cached on the user until the members of any of the models change,
+    or until the permission cache of the user is cleared.
+    """
+
+    from django.db.models import IntegerField, Value
+
+    from .registry import registry
+
+    generation, membership_ids = getattr(user, MEMBERSHIP_CACHE_ATTR,
+                                         (None, None))
+
+    if generation == _membership_generation[0]:
+        return membership_ids
+
+    generation = _membership_generation[0]
+
+    membership_ids = {}
+    querysets = []
+
+    for registered_model in registry:
+        ct_id = registered_model.content_type.pk
+
+        membership_ids[ct_id] = set()
+
+        querysets.append(
+            registered_model.get_queryset(user).order_by()
+            .annotate(olp_ct=Value(ct_id, output_field=IntegerField()))
+            .values_list("olp_ct", "pk")
+        )
+
+    if querysets:
+        queryset = querysets[0]
+
+        if len(querysets) > 1:
+            queryset = queryset.union(*querysets[1:], all=True)
+
+        for ct_id, obj_id in queryset:
+            membership_ids[ct_id].add(obj_id)
+
+    setattr(user, MEMBERSHIP_CACHE_ATTR, (generation, membership_ids))
+
+    return membership_ids
+
+
+def _get_base_filter(user, include_user=True, exclude_models=()):
+    """
+    Builds the filter for the permissions that apply to a user, through the
+    models listed in the `models` key of the settings and optionally directly.
+    Base models in `exclude_models` are left out.
+
+    Returns `None` if nothing would be matched by the filter.
+    """
+
+    from django.contrib.contenttypes.models import ContentType
+    from django.db.models import Q
+
+    from .registry import registry
+
+    q_filter = Q()
+
+    for registered_model in registry:
+        if registered_model.model in exclude_models:
+            continue
+
+        member_ids = _get_member_ids(user, registered_model)
+
+        if member_ids is None:
+            continue
+
+        model_filter = (
+            Q(base_object_ct=registered_model.content_type) &
+            Q(base_object_id__in=member_ids)
+        )
+
+        q_filter = q_filter | model_filter
+
+    if include_user and user._meta.concrete_model not in exclude_models:
+        user_ct = ContentType.objects.get_for_model(user)
+        user_filter = Q(base_object_ct=user_ct) & Q(base_object_id=user.pk)
+
+        q_filter = q_filter | user_filter
+
+    if not q_filter:
+        return None
+
+    return q_filter
+
+
+def _get_member_ids(user, registered_model):
+    """
+    Gets the ids of the instances of a model in the settings that a user is
+    related to, as either a set of ids or a subquery.
+
+    Returns `None` if the user is not related to any of them.
+    """
+
+    if _get_setting("resolve_membership"):
+        member_ids = get_membership_ids(user).get(
+            registered_model.content_type.pk)
+    else:
+        member_ids = None
+
+    # Long lists of ids would go over the limits of some databases
+    if member_ids is None or len(member_ids) > _get_batch_size():
+        return registered_model.get_queryset(user)
+
+    if not member_ids:
+        return None
+
+    return member_ids
+
+
+def _get_perm_exists(user, permission, model, using=None):
+    """
+    Builds an `EXISTS` subquery which matches the objects of a model that a
+    user has a specific permission on, combined with one for every table in
+    the settings that the permission can be in.
+
+    Returns `None` if the user cannot have the permission on any object.
+    """
+
+    from django.db.models import Exists, OuterRef
+
+    if user.is_anonymous:
+        return None
+
+    if not hasattr(permission, "pk"):
+        permission = _get_perm_for_codename(permission)
+
+        if permission is None:
+            return None
+
+    perm_exists = None
+
+    for obj_perms in _get_user_querysets(user, model, using=using):
+        obj_exists = Exists(obj_perms.filter(
+            target_object_id=OuterRef("pk"),
+        ).for_permission(permission))
+
+        if perm_exists is None:
+            perm_exists = obj_exists
+        else:
+            perm_exists = perm_exists | obj_exists
+
+    model_perms = _get_model_permissions(user, model, using=using)
+
+    if model_perms is not None:
+        # Not correlated with the objects, so only evaluated once
+        model_exists = Exists(model_perms.for_permission(permission))
+
+        if perm_exists is None:
+            perm_exists = model_exists
+        else:
+            perm_exists = perm_exists | model_exists
+
+    return perm_exists
+
+
+@instrumentation.instrument("get_perm_for_codename")
+def _get_perm_for_codename(permission_codename):
+    from .cache import permission_cache
+
+    return permission_cache.get(permission_codename)
+
+
+async def _aget_perm_for_codename(permission_codename):
+    from .cache import permission_cache
+
+    return await permission_cache.aget(permission_codename)
+
+
+def _get_perm_name(permission):
+    return "%s.%s" % (permission.content_type.app_label, permission.codename)
+
+
+def _get_target_args(target):
+    """
+    Gets the arguments used to cache the permissions of a base object on a
+    target object.
+    """
+
+    from django.contrib.contenttypes.models import ContentType
+
+    if target is None:
+        return ()
+
+    target_ct = ContentType.objects.get_for_model(target)
+
+    return (target_ct.pk, target.pk)
+
+
+def _get_base_permissions(base, target=None, using=None):
+    """
+    Gets the permissions of a base object, optionally on a target object, as
+    a list of querysets of the storages they can be in.
+    """
+
+    from .models import ModelPermission
+    from .registry import registry
+
+    if target is not None:
+        table = registry.get_table(base, target)
+
+        if table is None:
+            table = _get_permission_model()
+
+        querysets = [
+            table.objects.using(using).for_base(base).for_target(target),
+        ]
+    else:
+        querysets = [
+            _get_permission_model().objects.using(using).for_base(base),
+        ]
+
+        for base_model, target_model, table in registry.get_tables(base=base):
+            querysets.append(table.objects.using(using).for_base(base))
+
+    if _get_setting("model_permissions"):
+        model_perms = ModelPermission.objects.using(using).for_base(base)
+
+        if target is not None:
+            model_perms = model_perms.for_target_model(target)
+
+        querysets.append(model_perms)
+
+    return querysets
+
+
+def _get_final_model(permission, model_class=None, final_model=None):
+    if final_model:
+        return final_model
+
+    if model_class:
+        return model_class
+
+    return permission.content_type.model_class()
+
+
+def _get_ids_args(permission, final_model):
+    from django.contrib.contenttypes.models import ContentType
+
+    final_ct = ContentType.objects.get_for_model(final_model)
+
+    return (permission.pk, final_ct.pk)
+
+
+def _get_obj_ids_list(user, permission, final_model, using=None):
+    ids_lists = _get_obj_ids_lists(user, permission, final_model, using)
+
+    if not ids_lists:
+        return _get_permission_model().objects.using(using).none() \
+            .values_list("target_object_id", flat=True)
+
+    if len(ids_lists) == 1:
+        return ids_lists[0]
+
+    # The tables in the settings are combined into a single query
+    return ids_lists[0].union(*ids_lists[1:])
+
+
+def _check_after(after, model_class):
+    """
+    Raises `ValueError` if iteration is resumed without the model whose ids
+    are being iterated over, as the id could then belong to any model.
+    """
+
+    if after is not None and model_class is None:
+        raise ValueError("The model_class has to be given to resume the "
+                         "iteration after an id.")
+
+
+def _get_obj_ids_chunk(user, permission, final_model, chunk_size, after=None,
+                       using=None, all_ids=False):
+    """
+    Gets a chunk of the distinct ids of objects that a user has a specific
+    permission on, which come after the id `after`.  When `all_ids` is set,
+    the user has the permission on every object of the model.
+    """
+
+    if all_ids:
+        ids = _get_all_ids(final_model, using)
+
+        if after is not None:
+            ids = ids.filter(pk__gt=after)
+
+        return ids.order_by("pk")[:chunk_size]
+
+    ids_lists = _get_obj_ids_lists(user, permission, final_model, using,
+                                   after)
+
+    if not ids_lists:
+        return _get_permission_model().objects.using(using).none() \
+            .values_list("target_object_id", flat=True)
+
+    if len(ids_lists) == 1:
+        # A user can be given a permission on an object more than once
+        ids = ids_lists[0].distinct()
+    else:
+        ids = ids_lists[0].union(*ids_lists[1:])
+
+    return ids.order_by("target_object_id")[:chunk_size]
+
+
+def _get_obj_ids_lists(user, permission, final_model, using=None, after=None):
+    ids_lists = []
+
+    for obj_perms in _get_user_querysets(user, final_model, using=using):
+        obj_perms = obj_perms.for_permission(permission)
+
+        if after is not None:
+            obj_perms = obj_perms.filter(target_object_id__gt=after)
+
+        ids_lists.append(obj_perms.values_list("target_object_id", flat=True))
+
+    return ids_lists
+
+
+def _get_all_ids(model, using=None):
+    return model._default_manager.db_manager(using) \
+        .values_list("pk", flat=True)
+
+
+def _get_model_permissions(user, target_model=None, include_user=True,
+                           using=None):
+    """
+    Gets the permissions on every instance of a model that apply to a user,
+    directly or through the models in the settings, as a queryset of
+    `ModelPermission` objects.
+
+    Returns `None` if the `model_permissions` key of the settings is not set
+    or if no permissions would apply to the user.
+    """
+
+    from .models import ModelPermission
+
+    if not _get_setting("model_permissions") or user.is_anonymous:
+        return None
+
+    base_filter = _get_base_filter(user, include_user=include_user)
+
+    if base_filter is None:
+        return None
+
+    model_perms = ModelPermission.objects.using(using).filter(base_filter)
+
+    if target_model is not None:
+        model_perms = model_perms.for_target_model(target_model)
+
+    return model_perms
+
+
+def _has_model_perm(user, permission, model, using=None):
+    model_perms = _get_model_permissions(user, model, using=using)
+
+    if model_perms is None:
+        return False
+
+    return model_perms.for_permission(permission).exists()
+
+
+async def _ahas_model_perm(user, permission, model, using=None):
+    model_perms = _get_model_permissions(user, model, using=using)
+
+    if model_perms is None:
+        return False
+
+    return await model_perms.for_permission(permission).aexists()
+
+
+def _check_model_permissions():
+    from django.core.exceptions import ImproperlyConfigured
+
+    if not _get_setting("model_permissions"):
+        raise ImproperlyConfigured(
+            "The model_permissions key of OLP_SETTINGS must be set to give "
+            "permissions on every instance of a model."
+        )
+
+
+async def _aprepare_content_types(*objs):
+    """
+    Loads the content types of the given objects or models, along with those
+    of the models in the settings, into the cache of `ContentType`.  The
+    permission queries can then be built in an asynchronous context without
+    looking up content types, or the bits of the packed storage, in the
+    database.
+    """
+
+    from asgiref.sync import sync_to_async
+    from django.contrib.contenttypes.models import ContentType
+
+    from .registry import registry
+
+    models = [registered_model.model for registered_model in registry]
+    models.extend([obj for obj in objs if hasattr(obj, "_meta")])
+
+    missing = []
+
+    for model in models:
+        opts = model._meta.concrete_model._meta
+
+        try:
+            ContentType.objects._get_from_cache(opts)
+        except KeyError:
+            missing.append(model)
+
+    if missing:
+        await sync_to_async(ContentType.objects.get_for_models)(*missing)
+
+    if packed.is_enabled():
+        await packed.permission_bits.aload()
+
+
+def _get_perms(permissions):
+    """
+    Resolves one or more permissions to a list of `Permission` objects.
+
+    Returns `None` if any of the permissions could not be found.
+    """
+
+    if isinstance(permissions, str) or hasattr(permissions, "pk"):
+        permissions = [permissions]
+
+    resolved = []
+
+    for permission in permissions:
+        if not hasattr(permission, "pk"):
+            permission = _get_perm_for_codename(permission)
+
+            if permission is None:
+                return None
+
+        resolved.append(permission)
+
+    return resolved
+
+
+def _get_permission_model():
+    """
+    Gets the model that the object permissions are stored in, based on the
+    `storage` key of the settings.
+    """
+
+    from .models import ObjectPermission, PackedObjectPermission
+
+    if packed.is_enabled():
+        return PackedObjectPermission
+
+    return ObjectPermission
+
+
+def _get_table(base, target):
+    """
+    Gets the table in the settings for the permissions of a base object on a
+    target object, or `None` if they are stored in the generic storage.
+    """
+
+    from .registry import registry
+
+    if target is None:
+        return None
+
+    return registry.get_table(base, target)
+
+
+def _has_integer_pk(model):
+    """
+    Determines if the objects of a model can be stored in the generic
+    storage, which only holds integer ids.
+    """
+
+    from django.db.models import IntegerField
+
+    pk = model._meta.pk
+
+    while pk.is_relation:
+        pk = pk.target_field
+
+    return isinstance(pk, IntegerField)
+
+
+def _get_ct_table(tables, base_ct, target_ct):
+    """
+    Gets the table in the settings for the permissions between the models of
+    two content types, caching it in the `tables` dictionary.
+    """
+
+    from .registry import registry
+
+    key = (base_ct.pk, target_ct.pk)
+
+    if key not in tables:
+        base_model = base_ct.model_class()
+        target_model = target_ct.model_class()
+
+        if base_model is None or target_model is None:
+            tables[key] = None
+        else:
+            tables[key] = registry.get_table(base_model, target_model)
+
+    return tables[key]
+
+
+def _get_setting(name, default=None):
+    from django.conf import settings
+
+    olp_settings = getattr(settings, "OLP_SETTINGS", {})
+
+    return olp_settings.get(name, default)
+
+
+def _get_batch_size(batch_size=None):
+    if batch_size is not None:
+        return batch_size
+
+    return _get_setting("batch_size", DEFAULT_BATCH_SIZE)
+
+
+def _iter_batches(iterable, batch_size):
+    batch = []
+
+    for item in iterable:
+        batch.append(item)
+
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def _as_list(objs):
+    """
+    Turns an iterable of objects into a list so it can be used more than once,
+    leaving single objects and querysets untouched.
+    """
+
+    from django.db.models import Model, QuerySet
+
+    if isinstance(objs, (Model, QuerySet)):
+        return objs
+
+    return list(objs)
+
+
+def _split_objs(objs):
+    """
+    Splits a single object, a queryset, or an iterable of objects and
+    querysets into a dictionary of content types to object ids and a list of
+    content types and querysets.
+    """
+
+    from django.contrib.contenttypes.models import ContentType
+    from django.db.models import Model, QuerySet
+
+    if isinstance(objs, (Model, QuerySet)):
+        objs = [objs]
+
+    ids_by_ct = {}
+    querysets = []
+
+    for obj in objs:
+        if isinstance(obj, QuerySet):
+            ct = ContentType.objects.get_for_model(obj.model)
+
+            querysets.append((ct, obj))
+        else:
+            ct = ContentType.objects.get_for_model(obj)
+
+            ids_by_ct.setdefault(ct, []).append(obj.pk)
+
+    return ids_by_ct, querysets
+
+
+def _iter_ct_ids(objs, batch_size):
+    """
+    Yields the content type and id of every object, reading querysets in
+    chunks of `batch_size` rows.
+    """
+
+    ids_by_ct, querysets = _split_objs(objs)
+
+    for ct, ids in ids_by_ct.items():
+        for obj_id in ids:
+            yield ct, obj_id
+
+    for ct, queryset in querysets:
+        obj_ids = queryset.values_list("pk", flat=True) \
+            .iterator(chunk_size=batch_size)
+
+        for obj_id in obj_ids:
+            yield ct, obj_id
+
+
+def _iter_ct_id_filters(objs, batch_size):
+    """
+    Yields the content type of the objects, along with either a batch of ids
+    or a subquery which can be used in an `__in` filter.
+    """
+
+    ids_by_ct, querysets = _split_objs(objs)
+
+    for ct, ids in ids_by_ct.items():
+        for batch in _iter_batches(ids, batch_size):
+            yield ct, batch
+
+    for ct, queryset in querysets:
+        yield ct, queryset.values("pk")
+
+
+def _iter_ct_id_batches(objs, batch_size):
+    """
+    Yields the content type of the objects along with batches of up to
+    `batch_size` of their ids, reading querysets in chunks.
+    """
+
+    batches = {}
+
+    for ct, obj_id in _iter_ct_ids(objs, batch_size):
+        batch = batches.setdefault(ct, [])
+        batch.append(obj_id)
+
+        if len(batch) >= batch_size:
+            yield ct, batch
+
+            batches[ct] = []
+
+    for ct, batch in batches.items():
+        if batch:
+            yield ct, batch
+
+
+def _bulk_delete_permissions(queryset):
+    """
+    Deletes permissions using a single query, without collecting them first.
+
+    The `pre_delete` and `post_delete` signals are not sent for the deleted
+    rows, as the receivers of OLP would otherwise refresh and invalidate the
+    permissions once for every row.  Callers are responsible for doing so
+    once for all of them.  Returns the number of rows which were deleted.
+    """
+
+    from django.db import router
+    from django.db.models.signals import post_delete, pre_delete
+
+    model = queryset.model
+
+    # Django already deletes the rows in a single query when nothing listens
+    # to the deletion signals
+    if not (pre_delete.has_listeners(model) or
+            post_delete.has_listeners(model)):
+        return queryset.delete()[0]
+
+    # Otherwise only the private `_raw_delete` skips collecting the rows, so
+    # they are collected after all if a version of Django does not have it
+    if not hasattr(queryset, "_raw_delete"):
+        return queryset.delete()[0]
+
+    # The queryset was built for reading, so its database has to be chosen
+    # again for the deletion
+    using = queryset._db or router.db_for_write(model)
+
+    return queryset._raw_delete(using)
+
+
+def _permissions_changed(bases, using=None):
+    """
+    Invalidates the cached permissions of base objects once their permissions
+    have been changed.
+    """
+
+    from django.db.models import Model, QuerySet
+
+    from .cache import shared_cache
+
+    if isinstance(bases, (Model, QuerySet)):
+        bases = [bases]
+
+    for base in bases:
+        if isinstance(base, QuerySet):
+            shared_cache.invalidate(using=using)
+        else:
+            clear_perm_cache(base)
+            shared_cache.invalidate(base, using=using)
+
+
+@contextmanager
+def _suspend_cleanup():
+    """
+    Stops the permissions of deleted objects from being removed one object at
+    a time, while they are being removed in bulk.
+    """
+
+    previous = _cleanup_state.suspended
+    _cleanup_state.suspended = True
+
+    try:
+        yield
+    finally:
+        _cleanup_state.suspended = previous
+
+
+def _cleanup_suspended():
+    return _cleanup_state.suspended
+
+
+def _membership_changed():
+    _membership_generation[0] += 1
+
+
+async def _aprepare_membership_ids(user):
+    """
+    Resolves the membership ids of a user ahead of building the permission
+    queries in an asynchronous context.
+    """
 
-    permission_cache[permission_codename] = permission
-    Permission._olp_cache = permission_cache
+    from asgiref.sync import sync_to_async
 
-    return permission
+    if _get_setting("resolve_membership") and not user.is_anonymous:
+        await sync_to_async(get_membership_ids)(user)
@@ -62,7 +62,7 @@ setup(
     description="Object-level permissions across multiple models for Django.",
     long_description=file_description,
     license="MIT",
-    packages=find_packages(exclude=["tests*", ]),
+    packages=find_packages(exclude=["tests*", "benchmarks*", ]),
     zip_safe=True,
     include_package_data=True,
     install_requires=[
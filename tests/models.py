@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.db import models
+from olp.models import PermissionQuerySet, TypedObjectPermission
 
 
 class Apple(models.Model):
@@ -16,3 +18,51 @@ class Orange(models.Model):
     name = models.CharField(max_length=50)
 
 
+class Pear(models.Model):
+
+    name = models.CharField(max_length=50)
+
+    objects = PermissionQuerySet.as_manager()
+
+    class Meta:
+        permissions = (
+            ("can_slice", "Can slice the pear"),
+        )
+
+
+class Plum(models.Model):
+
+    code = models.CharField(max_length=20, primary_key=True)
+
+    objects = PermissionQuerySet.as_manager()
+
+    class Meta:
+        permissions = (
+            ("can_pick", "Can pick the plum"),
+        )
+
+
+class PlumUserPermission(TypedObjectPermission):
+
+    base_object = models.ForeignKey(settings.AUTH_USER_MODEL,
+                                    on_delete=models.CASCADE)
+    target_object = models.ForeignKey(Plum, on_delete=models.CASCADE)
+
+
+class PlumGroupPermission(TypedObjectPermission):
+
+    base_object = models.ForeignKey("auth.Group", on_delete=models.CASCADE)
+    target_object = models.ForeignKey(Plum, on_delete=models.CASCADE)
+
+
+class Team(models.Model):
+
+    name = models.CharField(max_length=50)
+
+
+class Membership(models.Model):
+
+    team = models.ForeignKey(Team, related_name="memberships",
+                             on_delete=models.CASCADE)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE)
@@ -36,7 +36,11 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": "olp.db",
-    }
+    },
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": "olp_replica.db",
+    },
 }
 
 OLP_SETTINGS = {
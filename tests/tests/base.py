@@ -0,0 +1,35 @@
+from django.contrib.auth.models import Group, User
+from django.test import TestCase
+from olp.cache import permission_cache
+
+
+class PermissionTestCase(TestCase):
+    """
+    Creates a user in a group, with an empty permission cache.
+
+    Subclasses are decorated with `override_settings` for the storage they
+    test and create the objects they assign permissions on.
+    """
+
+    def setUp(self):
+        super(PermissionTestCase, self).setUp()
+
+        permission_cache.clear()
+
+        self.user = User.objects.create_user("test", "test@test.com", "test")
+        self.group = Group.objects.create(name="group")
+
+        self.user.groups.add(self.group)
+
+    def get_user(self):
+        return User.objects.get(pk=self.user.pk)
+
+
+def get_obj_key(obj):
+    """
+    Gets the key of an object in the results of `get_perms_for_objs`.
+    """
+
+    from django.contrib.contenttypes.models import ContentType
+
+    return (ContentType.objects.get_for_model(obj).pk, obj.pk)
@@ -0,0 +1,163 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import Group, User
+from django.test import TestCase
+from olp.backends import PermissionBackend
+from olp.cache import permission_cache
+from olp.models import ObjectPermission
+from olp.utils import aassign_perm, aget_obj_ids_for_user, ahas_perm
+from olp.utils import aremove_perm, assign_perm
+from ..models import Apple
+
+
+class TestAsyncUtils(TestCase):
+
+    def setUp(self):
+        super(TestAsyncUtils, self).setUp()
+
+        self.user = User.objects.create_user("test", "test@test.com", "test")
+        self.apple = Apple.objects.create(name="test")
+
+        permission_cache.clear()
+
+    async def test_assign_perm(self):
+        result = await aassign_perm(self.user, "tests.can_be_awesome",
+                                    self.apple)
+
+        self.assertEqual(result, True)
+        self.assertEqual(await ObjectPermission.objects.acount(), 1)
+
+        self.assertTrue(await ahas_perm(self.user, "tests.can_be_awesome",
+                                        self.apple))
+        self.assertFalse(await ahas_perm(self.user, "tests.can_eat",
+                                         self.apple))
+
+    async def test_assign_fake_perm(self):
+        result = await aassign_perm(self.user, "test.does_not_exist",
+                                    self.apple)
+
+        self.assertEqual(result, False)
+        self.assertEqual(await ObjectPermission.objects.acount(), 0)
+
+    async def test_assign_normal_perm(self):
+        result = await aassign_perm(self.user, "tests.can_be_awesome")
+
+        self.assertEqual(result, True)
+        self.assertEqual(await self.user.user_permissions.acount(), 1)
+
+        result = await aremove_perm(self.user, "tests.can_be_awesome")
+
+        self.assertEqual(result, True)
+        self.assertEqual(await self.user.user_permissions.acount(), 0)
+
+    async def test_remove_perm(self):
+        await aassign_perm(self.user, "tests.can_be_awesome", self.apple)
+
+        result = await aremove_perm(self.user, "tests.can_be_awesome",
+                                    self.apple)
+
+        self.assertEqual(result, True)
+        self.assertEqual(await ObjectPermission.objects.acount(), 0)
+        self.assertFalse(await ahas_perm(self.user, "tests.can_be_awesome",
+                                         self.apple))
+
+    async def test_get_obj_ids_for_user(self):
+        other_apple = await Apple.objects.acreate(name="other")
+
+        await aassign_perm(self.user, "tests.can_be_awesome", self.apple)
+
+        obj_ids = await aget_obj_ids_for_user(self.user,
+                                              "tests.can_be_awesome")
+
+        self.assertEqual(obj_ids, [self.apple.pk])
+        self.assertNotIn(other_apple.pk, obj_ids)
+
+    async def test_get_obj_ids_for_fake_perm(self):
+        obj_ids = await aget_obj_ids_for_user(self.user, "test.does_not_exist")
+
+        self.assertEqual(obj_ids, [])
+
+
+class TestAsyncBackend(TestCase):
+
+    def setUp(self):
+        super(TestAsyncBackend, self).setUp()
+
+        self.user = User.objects.create_user("test", "test@test.com", "test")
+        self.group = Group.objects.create(name="test")
+        self.group.user_set.add(self.user)
+
+        self.apples = [Apple.objects.create(name="apple %d" % i)
+                       for i in range(3)]
+
+        assign_perm(self.user, "tests.can_be_awesome", self.apples[0])
+        assign_perm(self.group, "tests.can_eat", self.apples[1])
+
+        self.backend = PermissionBackend()
+
+    async def test_has_perm(self):
+        self.assertTrue(await self.backend.ahas_perm(
+            self.user, "tests.can_be_awesome", self.apples[0]))
+        self.assertTrue(await self.backend.ahas_perm(
+            self.user, "tests.can_eat", self.apples[1]))
+        self.assertFalse(await self.backend.ahas_perm(
+            self.user, "tests.can_eat", self.apples[2]))
+
+    async def test_group_permissions(self):
+        permissions = await self.backend.aget_group_permissions(
+            self.user, self.apples[1])
+
+        self.assertEqual(permissions, set(["tests.can_eat"]))
+
+        permissions = await self.backend.aget_group_permissions(
+            self.user, self.apples[0])
+
+        self.assertEqual(permissions, set())
+
+    async def test_matches_sync(self):
+        user = await User.objects.aget(pk=self.user.pk)
+
+        for apple in self.apples:
+            permissions = await self.backend.aget_all_permissions(user, apple)
+
+            expected = await sync_to_async(self.backend.get_all_permissions)(
+                self.user, apple)
+
+            self.assertEqual(permissions, expected)
+
+    async def test_cached_on_user(self):
+        user = await User.objects.aget(pk=self.user.pk)
+
+        permissions = await self.backend.aget_all_permissions(
+            user, self.apples[0])
+
+        # The permissions are cached on the user, as in the sync backend
+        self.assertIs(self.backend.get_all_permissions(user, self.apples[0]),
+                      permissions)
+
+    async def test_resolved_membership(self):
+        from django.test import override_settings
+
+        user = await User.objects.aget(pk=self.user.pk)
+
+        with override_settings(OLP_SETTINGS={
+            "models": (
+                ("django.contrib.auth.models.Group", "user"),
+            ),
+            "resolve_membership": True,
+        }):
+            self.assertTrue(await self.backend.ahas_perm(
+                user, "tests.can_eat", self.apples[1]))
+
+    async def test_concurrent_checks(self):
+        users = [await User.objects.aget(pk=self.user.pk)
+                 for apple in self.apples]
+
+        results = await asyncio.gather(*[
+            self.backend.ahas_perm(user, "tests.can_be_awesome", apple)
+            for user, apple in zip(users, self.apples)
+        ])
+
+        self.assertEqual(results, [True, False, False])
+
@@ -6,7 +6,8 @@ from ..models import Apple
 class TestBackendBasic(TestCase):
 
     def setUp(self):
-        from django.contrib.auth.models import Group, User, Permission
+        from django.contrib.auth.models import Group, User
+        from olp.cache import permission_cache
 
         self.user = User.objects.create_user("test", "test@test.com", "test")
         self.user.save()
@@ -19,8 +20,7 @@ class TestBackendBasic(TestCase):
 
         self.backend = PermissionBackend()
 
-        if hasattr(Permission, "_olp_cache"):
-            del Permission._olp_cache
+        permission_cache.clear()
 
     def test_no_authenticate(self):
         result = self.backend.authenticate()
@@ -93,3 +93,199 @@ class TestBackendBasic(TestCase):
         result = self.backend.has_perm(self.user, "tests.can_be_awesome", apple)
 
         self.assertEqual(result, True)
+
+
+class TestBackendCache(TestCase):
+
+    def setUp(self):
+        from django.contrib.auth.models import Group, User
+
+        self.user = User.objects.create_user("test", "test@test.com", "test")
+        self.user.save()
+
+        self.group = Group(name="group")
+        self.group.save()
+
+        self.user.groups.add(self.group)
+
+        self.apple = Apple(name="test")
+        self.apple.save()
+
+        self.backend = PermissionBackend()
+
+    def test_permissions_cached_per_object(self):
+        from olp.utils import assign_perm
+
+        assign_perm(self.user, "tests.can_be_awesome", self.apple)
+
+        self.backend.get_all_permissions(self.user, self.apple)
+
+        with self.assertNumQueries(0):
+            for _ in range(10):
+                result = self.backend.has_perm(self.user,
+                                               "tests.can_be_awesome",
+                                               self.apple)
+
+        self.assertEqual(result, True)
+
+    def test_cache_separate_for_objects(self):
+        from olp.utils import assign_perm
+
+        other = Apple(name="other")
+        other.save()
+
+        assign_perm(self.user, "tests.can_be_awesome", self.apple)
+
+        self.assertTrue(
+            self.backend.has_perm(self.user, "tests.can_be_awesome",
+                                  self.apple)
+        )
+        self.assertFalse(
+            self.backend.has_perm(self.user, "tests.can_be_awesome", other)
+        )
+
+    def test_assign_perm_clears_cache(self):
+        from olp.utils import assign_perm
+
+        self.assertFalse(
+            self.backend.has_perm(self.user, "tests.can_eat", self.apple)
+        )
+
+        assign_perm(self.user, "tests.can_eat", self.apple)
+
+        self.assertTrue(
+            self.backend.has_perm(self.user, "tests.can_eat", self.apple)
+        )
+
+    def test_remove_perm_clears_cache(self):
+        from olp.utils import assign_perm, remove_perm
+
+        assign_perm(self.user, "tests.can_eat", self.apple)
+
+        self.assertTrue(
+            self.backend.has_perm(self.user, "tests.can_eat", self.apple)
+        )
+
+        remove_perm(self.user, "tests.can_eat", self.apple)
+
+        self.assertFalse(
+            self.backend.has_perm(self.user, "tests.can_eat", self.apple)
+        )
+
+    def test_clear_cache(self):
+        from olp.utils import assign_perm
+
+        self.assertFalse(
+            self.backend.has_perm(self.user, "tests.can_eat", self.apple)
+        )
+
+        assign_perm(self.group, "tests.can_eat", self.apple)
+
+        self.assertFalse(
+            self.backend.has_perm(self.user, "tests.can_eat", self.apple)
+        )
+
+        self.backend.clear_cache(self.user)
+
+        self.assertTrue(
+            self.backend.has_perm(self.user, "tests.can_eat", self.apple)
+        )
+
+
+class TestBackendQueries(TestCase):
+
+    def setUp(self):
+        from django.contrib.auth.models import Group, User
+
+        self.user = User.objects.create_user("test", "test@test.com", "test")
+        self.user.save()
+
+        self.group = Group(name="group")
+        self.group.save()
+
+        self.user.groups.add(self.group)
+
+        self.apple = Apple(name="test")
+        self.apple.save()
+
+        self.backend = PermissionBackend()
+
+    def test_all_permissions_single_query(self):
+        from olp.utils import assign_perm
+
+        assign_perm(self.user, "tests.can_be_awesome", self.apple)
+        assign_perm(self.group, "tests.can_eat", self.apple)
+
+        with self.assertNumQueries(1):
+            result = self.backend.get_all_permissions(self.user, self.apple)
+
+        self.assertEqual(result, set(["tests.can_be_awesome",
+                                      "tests.can_eat"]))
+
+    def test_has_perm_exists_query(self):
+        from olp.cache import permission_cache
+        from olp.utils import assign_perm
+
+        assign_perm(self.group, "tests.can_eat", self.apple)
+
+        permission_cache.load()
+
+        with self.assertNumQueries(1) as queries:
+            self.assertTrue(self.backend.has_perm(self.user, "tests.can_eat",
+                                                  self.apple))
+
+        sql = queries.captured_queries[0]["sql"]
+
+        self.assertIn("LIMIT 1", sql)
+        self.assertNotIn("django_content_type", sql)
+
+        with self.assertNumQueries(1):
+            self.assertFalse(self.backend.has_perm(
+                self.user, "tests.can_be_awesome", self.apple))
+
+        # The results are cached on the user
+        with self.assertNumQueries(0):
+            self.assertTrue(self.backend.has_perm(self.user, "tests.can_eat",
+                                                  self.apple))
+
+    def test_has_perm_many_permissions(self):
+        from olp.cache import permission_cache
+        from olp.utils import assign_perm
+
+        assign_perm(self.group, "tests.can_eat", self.apple)
+
+        permission_cache.load()
+
+        perms = ["tests.can_eat", "tests.can_be_awesome", "auth.add_user",
+                 "auth.change_user", "auth.delete_user", "auth.view_user",
+                 "auth.add_group", "auth.change_group", "auth.delete_group",
+                 "auth.view_group"]
+
+        # The first check uses an EXISTS query, and the second reads all of
+        # the permissions on the object
+        with self.assertNumQueries(2):
+            results = [self.backend.has_perm(self.user, perm, self.apple)
+                       for perm in perms]
+
+        self.assertEqual(results, [True] + [False] * 9)
+
+    def test_group_permissions_exclude_user(self):
+        from olp.utils import assign_perm
+
+        assign_perm(self.user, "tests.can_be_awesome", self.apple)
+        assign_perm(self.group, "tests.can_eat", self.apple)
+
+        result = self.backend.get_group_permissions(self.user, self.apple)
+
+        self.assertEqual(result, set(["tests.can_eat"]))
+
+    def test_group_permissions_without_models(self):
+        from django.test import override_settings
+        from olp.utils import assign_perm
+
+        assign_perm(self.group, "tests.can_eat", self.apple)
+
+        with override_settings(OLP_SETTINGS={"models": ()}):
+            result = self.backend.get_group_permissions(self.user)
+
+        self.assertEqual(result, set())
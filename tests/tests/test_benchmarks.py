@@ -0,0 +1,83 @@
+from django.contrib.auth.models import Group, User
+from django.test import TestCase
+from olp.models import ObjectPermission
+from benchmarks.dataset import DatasetConfig, generate_dataset
+from benchmarks.runner import compare, percentile, run_benchmarks
+from benchmarks.scenarios import SCENARIOS
+from ..models import Apple
+
+
+class TestDataset(TestCase):
+
+    def test_generate_dataset(self):
+        config = DatasetConfig(users=20, groups=5, memberships=2, targets=50,
+                               user_grants=3, group_grants=10, batch_size=7)
+
+        counts = generate_dataset(config)
+
+        self.assertEqual(counts, {
+            "users": 20,
+            "groups": 5,
+            "apples": 50,
+            "memberships": 40,
+            "permissions": 20 * 3 + 5 * 10,
+        })
+
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Group.objects.count(), 5)
+        self.assertEqual(Apple.objects.count(), 50)
+        self.assertEqual(ObjectPermission.objects.count(), 110)
+
+    def test_replaces_dataset(self):
+        config = DatasetConfig(users=5, groups=2, memberships=1, targets=10,
+                               user_grants=2, group_grants=2)
+
+        generate_dataset(config)
+        generate_dataset(config)
+
+        self.assertEqual(User.objects.count(), 5)
+        self.assertEqual(ObjectPermission.objects.count(), 14)
+
+
+class TestRunner(TestCase):
+
+    def test_run_benchmarks(self):
+        generate_dataset(DatasetConfig(users=10, groups=3, targets=20,
+                                       user_grants=5, group_grants=5))
+
+        results = run_benchmarks(iterations=3, warmup=1)
+
+        self.assertEqual(set(results), set(name for name, func in SCENARIOS))
+
+        for result in results.values():
+            self.assertEqual(result["iterations"], 3)
+            self.assertTrue(result["p50_ms"] <= result["p99_ms"])
+            self.assertTrue(result["queries_max"] >= 1)
+
+    def test_percentile(self):
+        values = [1.0, 2.0, 3.0, 4.0, 5.0]
+
+        self.assertEqual(percentile(values, 0), 1.0)
+        self.assertEqual(percentile(values, 50), 3.0)
+        self.assertEqual(percentile(values, 90), 4.6)
+        self.assertEqual(percentile(values, 100), 5.0)
+        self.assertEqual(percentile([7.0], 99), 7.0)
+        self.assertEqual(percentile([], 50), None)
+
+    def test_compare(self):
+        baseline = {
+            "fast": {"p50_ms": 1.0, "queries_max": 1},
+            "slow": {"p50_ms": 1.0, "queries_max": 1},
+            "queries": {"p50_ms": 1.0, "queries_max": 1},
+        }
+        results = {
+            "fast": {"p50_ms": 1.05, "queries_max": 1},
+            "slow": {"p50_ms": 2.0, "queries_max": 1},
+            "queries": {"p50_ms": 1.0, "queries_max": 2},
+            "new": {"p50_ms": 5.0, "queries_max": 5},
+        }
+
+        regressions = compare(results, baseline, threshold=10.0)
+
+        self.assertEqual([regression[0] for regression in regressions],
+                         ["queries", "slow"])
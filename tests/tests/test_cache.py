@@ -0,0 +1,314 @@
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from olp.cache import PermissionCache, SharedPermissionCache, permission_cache
+
+
+class TestPermissionCache(TestCase):
+
+    def setUp(self):
+        permission_cache.clear()
+
+    def test_loads_all_permissions_once(self):
+        with self.assertNumQueries(1):
+            first = permission_cache.get("tests.can_be_awesome")
+            second = permission_cache.get("tests.can_eat")
+            third = permission_cache.get("auth.add_user")
+
+        self.assertEqual(first.codename, "can_be_awesome")
+        self.assertEqual(second.codename, "can_eat")
+        self.assertEqual(third.codename, "add_user")
+
+    def test_missing_permission_cached(self):
+        permission_cache.load()
+
+        with self.assertNumQueries(0):
+            result = permission_cache.get("test.does_not_exist")
+
+        self.assertEqual(result, None)
+
+    def test_content_type_loaded(self):
+        permission_cache.load()
+
+        permission = permission_cache.get("tests.can_be_awesome")
+
+        with self.assertNumQueries(0):
+            self.assertEqual(permission.content_type.app_label, "tests")
+
+    def test_cleared_when_permission_added(self):
+        from django.contrib.auth.models import Permission
+        from django.contrib.contenttypes.models import ContentType
+        from ..models import Apple
+
+        self.assertEqual(permission_cache.get("tests.can_peel"), None)
+
+        Permission.objects.create(
+            codename="can_peel",
+            name="Can peel the apple",
+            content_type=ContentType.objects.get_for_model(Apple),
+        )
+
+        self.assertEqual(permission_cache.get("tests.can_peel").codename,
+                         "can_peel")
+
+    def test_cleared_when_permission_deleted(self):
+        from django.contrib.auth.models import Permission
+
+        permission_cache.load()
+
+        Permission.objects.filter(codename="can_eat").delete()
+
+        self.assertEqual(permission_cache.get("tests.can_eat"), None)
+
+    def test_clear_during_load_not_stored(self):
+        from django.contrib.auth.models import Permission
+        from django.db.models.signals import post_init
+
+        cache = PermissionCache()
+
+        # Simulates another thread clearing the cache while it is loading
+        def clear_cache(**kwargs):
+            post_init.disconnect(clear_cache, sender=Permission)
+            cache.clear()
+
+        post_init.connect(clear_cache, sender=Permission, weak=False)
+
+        try:
+            permissions = cache.load()
+        finally:
+            post_init.disconnect(clear_cache, sender=Permission)
+
+        self.assertIn("tests.can_eat", permissions)
+        self.assertEqual(cache._permissions, None)
+
+
+class TestPermissionCacheThreads(TransactionTestCase):
+
+    def test_concurrent_loads(self):
+        import threading
+        from django.db import connection
+
+        cache = PermissionCache()
+        results = []
+
+        def load():
+            try:
+                results.append(cache.get("tests.can_eat"))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=load) for _ in range(8)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), 8)
+        self.assertEqual(set(perm.codename for perm in results),
+                         set(["can_eat"]))
+
+
+@override_settings(OLP_SETTINGS={
+    "models": (
+        ("django.contrib.auth.models.Group", "user"),
+    ),
+    "cache": "default",
+})
+class TestSharedPermissionCache(TransactionTestCase):
+
+    def setUp(self):
+        from django.contrib.auth.models import Group, User
+        from django.core.cache import cache
+        from ..models import Apple
+
+        cache.clear()
+        permission_cache.clear()
+
+        self.user = User.objects.create_user("test", "test@test.com", "test")
+        self.group = Group.objects.create(name="group")
+
+        self.user.groups.add(self.group)
+
+        self.apple = Apple.objects.create(name="test")
+
+    def _get_user(self):
+        # A new instance does not have any permissions cached on it, like a
+        # user loaded by another process
+        from django.contrib.auth.models import User
+
+        return User.objects.get(pk=self.user.pk)
+
+    def test_backend_shared_between_instances(self):
+        from olp.backends import PermissionBackend
+
+        self.user.assign_perm("tests.can_eat", self.apple)
+
+        backend = PermissionBackend()
+        backend.get_all_permissions(self._get_user(), self.apple)
+
+        user = self._get_user()
+
+        with self.assertNumQueries(0):
+            result = backend.get_all_permissions(user, self.apple)
+
+        self.assertEqual(result, set(["tests.can_eat"]))
+
+    def test_has_perm_cached(self):
+        from olp.utils import has_perm
+
+        self.group.assign_perm("tests.can_eat", self.apple)
+
+        permission_cache.load()
+
+        self.assertTrue(has_perm(self.group, "tests.can_eat", self.apple))
+
+        with self.assertNumQueries(0):
+            self.assertTrue(has_perm(self.group, "tests.can_eat",
+                                     self.apple))
+
+    def test_obj_ids_cached(self):
+        from olp.utils import get_obj_ids_for_user
+
+        self.user.assign_perm("tests.can_eat", self.apple)
+
+        permission_cache.load()
+
+        self.assertEqual(list(get_obj_ids_for_user(self.user,
+                                                   "tests.can_eat")),
+                         [self.apple.pk])
+
+        user = self._get_user()
+
+        with CaptureQueriesContext(connection) as queries:
+            result = get_obj_ids_for_user(user, "tests.can_eat")
+
+            # The same type is returned whether or not the ids were cached
+            self.assertIsInstance(result, QuerySet)
+            self.assertEqual(list(result.filter(pk__gt=0)), [self.apple.pk])
+
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("olp_", queries[0]["sql"])
+
+    async def test_async_has_perm_cached(self):
+        from asgiref.sync import sync_to_async
+        from olp.utils import ahas_perm
+        from unittest import mock
+
+        await sync_to_async(self.group.assign_perm)("tests.can_eat",
+                                                    self.apple)
+
+        self.assertTrue(await ahas_perm(self.group, "tests.can_eat",
+                                        self.apple))
+
+        with mock.patch("olp.utils._aget_permission_names") as get_names:
+            self.assertTrue(await ahas_perm(self.group, "tests.can_eat",
+                                            self.apple))
+
+        get_names.assert_not_called()
+
+    def test_invalidated_by_assign_perm(self):
+        from olp.backends import PermissionBackend
+
+        backend = PermissionBackend()
+
+        self.assertFalse(backend.has_perm(self._get_user(), "tests.can_eat",
+                                          self.apple))
+
+        self.user.assign_perm("tests.can_eat", self.apple)
+
+        self.assertTrue(backend.has_perm(self._get_user(), "tests.can_eat",
+                                         self.apple))
+
+    def test_invalidated_by_group_perm(self):
+        from olp.backends import PermissionBackend
+
+        backend = PermissionBackend()
+
+        self.assertFalse(backend.has_perm(self._get_user(), "tests.can_eat",
+                                          self.apple))
+
+        self.group.assign_perm("tests.can_eat", self.apple)
+
+        self.assertTrue(backend.has_perm(self._get_user(), "tests.can_eat",
+                                         self.apple))
+
+    def test_invalidated_by_membership(self):
+        from django.contrib.auth.models import Group
+        from olp.backends import PermissionBackend
+
+        backend = PermissionBackend()
+        other = Group.objects.create(name="other")
+
+        other.assign_perm("tests.can_eat", self.apple)
+
+        self.assertFalse(backend.has_perm(self._get_user(), "tests.can_eat",
+                                          self.apple))
+
+        self._get_user().groups.add(other)
+
+        self.assertTrue(backend.has_perm(self._get_user(), "tests.can_eat",
+                                         self.apple))
+
+        other.user_set.remove(self.user)
+
+        self.assertFalse(backend.has_perm(self._get_user(), "tests.can_eat",
+                                          self.apple))
+
+    def test_invalidated_by_object_permission_save(self):
+        from olp.backends import PermissionBackend
+        from olp.models import ObjectPermission
+
+        backend = PermissionBackend()
+
+        self.assertFalse(backend.has_perm(self._get_user(), "tests.can_eat",
+                                          self.apple))
+
+        ObjectPermission(base_object=self.user, target_object=self.apple,
+                         permission=permission_cache.get("tests.can_eat")) \
+            .save()
+
+        self.assertTrue(backend.has_perm(self._get_user(), "tests.can_eat",
+                                         self.apple))
+
+    def test_rolled_back_permissions_not_cached(self):
+        from django.db import transaction
+        from olp.backends import PermissionBackend
+
+        backend = PermissionBackend()
+
+        self.assertFalse(backend.has_perm(self._get_user(), "tests.can_eat",
+                                          self.apple))
+
+        try:
+            with transaction.atomic():
+                self.user.assign_perm("tests.can_eat", self.apple)
+
+                self.assertTrue(backend.has_perm(self._get_user(),
+                                                 "tests.can_eat",
+                                                 self.apple))
+
+                raise ValueError()
+        except ValueError:
+            pass
+
+        self.assertFalse(backend.has_perm(self._get_user(), "tests.can_eat",
+                                          self.apple))
+
+    def test_evicted_version_not_reused(self):
+        from django.core.cache import cache
+        from olp.backends import PermissionBackend
+
+        backend = PermissionBackend()
+
+        self.assertFalse(backend.has_perm(self._get_user(), "tests.can_eat",
+                                          self.apple))
+
+        cache.delete(SharedPermissionCache.GLOBAL_VERSION_KEY)
+
+        self.group.assign_perm("tests.can_eat", self.apple)
+
+        self.assertTrue(backend.has_perm(self._get_user(), "tests.can_eat",
+                                         self.apple))
@@ -0,0 +1,468 @@
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from io import StringIO
+from unittest import mock
+from olp.models import ModelPermission, ObjectPermission
+from ..models import Apple, Plum, PlumUserPermission
+
+
+class TestRemoveDuplicates(TransactionTestCase):
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.db import connection
+
+        self.user = User.objects.create_user("test", "test@test.com", "test")
+        self.apples = [Apple.objects.create(name="apple %d" % i)
+                       for i in range(3)]
+
+        # Duplicates can only exist in tables created before the constraint
+        self.constraint = ObjectPermission._meta.constraints[0]
+
+        # SQLite rebuilds the table from the model when removing constraints
+        with mock.patch.object(ObjectPermission._meta, "constraints", []):
+            with connection.schema_editor() as schema_editor:
+                schema_editor.remove_constraint(ObjectPermission,
+                                                self.constraint)
+
+        for apple in self.apples:
+            for _ in range(3):
+                ObjectPermission(base_object=self.user, target_object=apple,
+                                 permission=self._get_permission()).save()
+
+        ObjectPermission(base_object=self.user, target_object=self.apples[0],
+                         permission=self._get_permission("can_be_awesome")) \
+            .save()
+
+    def tearDown(self):
+        from django.db import connection
+
+        ObjectPermission.objects.all().delete()
+
+        with connection.schema_editor() as schema_editor:
+            schema_editor.add_constraint(ObjectPermission, self.constraint)
+
+    def _get_permission(self, codename="can_eat"):
+        from django.contrib.auth.models import Permission
+
+        return Permission.objects.get(codename=codename)
+
+    def test_remove_duplicates(self):
+        out = StringIO()
+
+        call_command("olp_remove_duplicates", chunk_size=2, stdout=out)
+
+        self.assertIn("Removed 6 duplicate permissions.", out.getvalue())
+        self.assertEqual(ObjectPermission.objects.count(), 4)
+
+        kept_ids = ObjectPermission.objects.values_list("id", flat=True)
+
+        self.assertEqual(sorted(kept_ids), [1, 4, 7, 10])
+
+    def test_dry_run(self):
+        out = StringIO()
+
+        call_command("olp_remove_duplicates", dry_run=True, stdout=out)
+
+        self.assertIn("Found 6 duplicate permissions.", out.getvalue())
+        self.assertEqual(ObjectPermission.objects.count(), 10)
+
+
+class TestRemoveOrphans(TestCase):
+
+    def setUp(self):
+        from django.contrib.auth.models import Group, User
+
+        self.user = User.objects.create_user("test", "test@test.com", "test")
+        self.group = Group.objects.create(name="group")
+
+        self.apples = [Apple.objects.create(name="apple %d" % i)
+                       for i in range(6)]
+
+        for apple in self.apples:
+            self.user.assign_perm("tests.can_eat", apple)
+            self.group.assign_perm("tests.can_eat", apple)
+
+        # Deleted without going through the ORM, so nothing is cleaned up
+        Apple.objects.filter(pk__in=[apple.pk for apple in self.apples[:2]]) \
+            ._raw_delete("default")
+        Group.objects.filter(pk=self.group.pk)._raw_delete("default")
+
+    def test_remove_orphans(self):
+        out = StringIO()
+
+        call_command("olp_remove_orphans", chunk_size=3, stdout=out)
+
+        self.assertIn("auth.group base: 6", out.getvalue())
+        self.assertIn("tests.apple target: 2", out.getvalue())
+        self.assertIn("Removed 8 orphaned permissions.", out.getvalue())
+
+        remaining = ObjectPermission.objects.values_list("target_object_id",
+                                                         flat=True)
+
+        self.assertEqual(sorted(remaining),
+                         [apple.pk for apple in self.apples[2:]])
+
+    def test_dry_run(self):
+        out = StringIO()
+
+        call_command("olp_remove_orphans", dry_run=True, stdout=out)
+
+        self.assertIn("Found 8 orphaned permissions.", out.getvalue())
+        self.assertEqual(ObjectPermission.objects.count(), 12)
+
+    def test_no_orphans(self):
+        out = StringIO()
+
+        call_command("olp_remove_orphans", stdout=out)
+        call_command("olp_remove_orphans", stdout=out)
+
+        self.assertIn("Removed 0 orphaned permissions.", out.getvalue())
+
+    def test_removed_model(self):
+        from django.contrib.contenttypes.models import ContentType
+
+        removed_ct = ContentType.objects.create(app_label="tests",
+                                                model="banana")
+
+        # The content type is cached, but will be rolled back
+        self.addCleanup(ContentType.objects.clear_cache)
+
+        ObjectPermission.objects.filter(target_object_id=self.apples[5].pk) \
+            .update(target_object_ct=removed_ct)
+
+        out = StringIO()
+
+        call_command("olp_remove_orphans", stdout=out)
+
+        self.assertIn("tests.banana target: 1", out.getvalue())
+
+    def test_resume_from_checkpoint(self):
+        import json
+        import os
+        import tempfile
+
+        checkpoint = os.path.join(tempfile.mkdtemp(), "orphans.json")
+        first_id = ObjectPermission.objects.order_by("id")[0].id
+
+        # Pretend the first half of the table was checked by an earlier run
+        with open(checkpoint, "w") as checkpoint_file:
+            json.dump({"next_id": first_id + 6,
+                       "counts": {"auth.group base": 3}}, checkpoint_file)
+
+        out = StringIO()
+
+        call_command("olp_remove_orphans", chunk_size=2,
+                     checkpoint=checkpoint, stdout=out)
+
+        self.assertIn("Resuming from permission %d." % (first_id + 6),
+                      out.getvalue())
+        self.assertIn("auth.group base: 6", out.getvalue())
+        self.assertFalse(os.path.exists(checkpoint))
+
+        # The permissions before the checkpoint were not checked again
+        self.assertEqual(ObjectPermission.objects.filter(
+            base_object_ct__model="group").count(), 3)
+
+    def test_checkpoint_saved(self):
+        import os
+        import tempfile
+        from unittest import mock
+
+        checkpoint = os.path.join(tempfile.mkdtemp(), "orphans.json")
+        out = StringIO()
+
+        with mock.patch("time.sleep", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command("olp_remove_orphans", chunk_size=4, delay=1,
+                             checkpoint=checkpoint, stdout=out)
+
+        self.assertTrue(os.path.exists(checkpoint))
+
+
+class TestExportImport(TestCase):
+
+    def setUp(self):
+        from django.contrib.auth.models import Group, User
+
+        self.user = User.objects.create_user("test", "test@test.com", "test")
+        self.group = Group.objects.create(name="group")
+
+        self.apples = [Apple.objects.create(name="apple %d" % i)
+                       for i in range(3)]
+
+        for apple in self.apples:
+            self.user.assign_perm("tests.can_eat", apple)
+
+        self.group.assign_perm("tests.can_be_awesome", self.apples[0])
+
+    def _export(self, **options):
+        out = StringIO()
+
+        call_command("olp_export_permissions", stdout=out, stderr=StringIO(),
+                     **options)
+
+        return out.getvalue()
+
+    def _import(self, data, **options):
+        import os
+        import tempfile
+
+        fd, path = tempfile.mkstemp()
+
+        with os.fdopen(fd, "w") as input_file:
+            input_file.write(data)
+
+        out = StringIO()
+
+        try:
+            call_command("olp_import_permissions", path, stdout=out,
+                         **options)
+        finally:
+            os.remove(path)
+
+        return out.getvalue()
+
+    def test_export_jsonl(self):
+        import json
+
+        lines = self._export(chunk_size=2).splitlines()
+
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(json.loads(lines[0]), {
+            "base": "auth.user",
+            "base_id": self.user.pk,
+            "target": "tests.apple",
+            "target_id": self.apples[0].pk,
+            "permission": "tests.can_eat",
+        })
+        self.assertEqual(json.loads(lines[3])["base"], "auth.group")
+
+    def test_export_csv(self):
+        lines = self._export(format="csv").splitlines()
+
+        self.assertEqual(lines[0], "base,base_id,target,target_id,permission")
+        self.assertEqual(lines[1], "auth.user,%d,tests.apple,%d,tests.can_eat"
+                         % (self.user.pk, self.apples[0].pk))
+        self.assertEqual(len(lines), 5)
+
+    def test_round_trip(self):
+        for format in ("jsonl", "csv"):
+            exported = self._export(format=format)
+
+            ObjectPermission.objects.all().delete()
+
+            out = self._import(exported, format=format, batch_size=3)
+
+            self.assertIn("Wrote 4 permissions", out)
+            self.assertEqual(self._export(format=format), exported)
+
+    def test_skips_existing(self):
+        exported = self._export()
+
+        ObjectPermission.objects.filter(base_object_ct__model="group") \
+            .delete()
+
+        out = self._import(exported)
+
+        self.assertIn("Wrote 4 permissions, ignoring any which had already "
+                      "been assigned.", out)
+        self.assertEqual(ObjectPermission.objects.count(), 4)
+
+    def test_skips_unknown(self):
+        import json
+
+        lines = [
+            {"base": "auth.user", "base_id": 1, "target": "tests.banana",
+             "target_id": 1, "permission": "tests.can_eat"},
+            {"base": "auth.user", "base_id": 1, "target": "tests.apple",
+             "target_id": 1, "permission": "tests.can_juggle"},
+            {"base": "auth.user", "base_id": 1, "target": "tests.banana",
+             "target_id": 2, "permission": "tests.can_eat"},
+        ]
+
+        out = self._import("\n".join(json.dumps(line) for line in lines))
+
+        self.assertIn("Skipped 3 permissions", out)
+        self.assertEqual(ObjectPermission.objects.count(), 4)
+
+    def test_invalid_json(self):
+        from django.core.management import CommandError
+
+        with self.assertRaises(CommandError):
+            self._import("{\"base\": \n")
+
+    def test_invalid_permission(self):
+        import json
+        from django.core.management import CommandError
+
+        valid = {"base": "auth.user", "base_id": 1, "target": "tests.apple",
+                 "target_id": 1, "permission": "tests.can_eat"}
+
+        for field, value, message in (
+            ("permission", None, "Line 2 is missing the 'permission' field."),
+            ("target", "apple", "Line 2 is not a valid permission: the "
+                                "target field should be given as "
+                                "app_label.name, not 'apple'"),
+            ("base_id", "one", "Line 2 is not a valid permission"),
+        ):
+            row = dict(valid)
+
+            if value is None:
+                del row[field]
+            else:
+                row[field] = value
+
+            with self.assertRaisesMessage(CommandError, message):
+                self._import("%s\n%s\n" % (json.dumps(valid),
+                                            json.dumps(row)))
+
+
+@override_settings(OLP_SETTINGS={
+    "models": (
+        ("django.contrib.auth.models.Group", "user"),
+    ),
+    "tables": (
+        "tests.models.PlumUserPermission",
+    ),
+    "model_permissions": True,
+})
+class TestExportImportStorages(TestCase):
+
+    def setUp(self):
+        from django.contrib.auth.models import Group, User
+        from olp.utils import assign_model_perm, assign_perm
+
+        self.user = User.objects.create_user("test", "test@test.com", "test")
+        self.group = Group.objects.create(name="group")
+
+        self.apple = Apple.objects.create(name="apple")
+        self.plum = Plum.objects.create(code="plum")
+
+        assign_perm(self.user, "tests.can_eat", self.apple)
+        assign_perm(self.user, "tests.can_pick", self.plum)
+        assign_model_perm(self.group, "tests.can_eat", Apple)
+
+    def _export(self, **options):
+        out = StringIO()
+
+        call_command("olp_export_permissions", stdout=out, stderr=StringIO(),
+                     **options)
+
+        return out.getvalue()
+
+    def test_round_trip(self):
+        import os
+        import tempfile
+
+        for format in ("jsonl", "csv"):
+            exported = self._export(format=format)
+
+            self.assertEqual(len(exported.splitlines()),
+                             4 if format == "csv" else 3)
+
+            ObjectPermission.objects.all().delete()
+            PlumUserPermission.objects.all().delete()
+            ModelPermission.objects.all().delete()
+
+            fd, path = tempfile.mkstemp()
+
+            with os.fdopen(fd, "w") as input_file:
+                input_file.write(exported)
+
+            try:
+                call_command("olp_import_permissions", path, format=format,
+                             stdout=StringIO())
+            finally:
+                os.remove(path)
+
+            self.assertEqual(ObjectPermission.objects.count(), 1)
+            self.assertEqual(list(PlumUserPermission.objects.values_list(
+                "base_object", "target_object")),
+                [(self.user.pk, self.plum.pk)])
+            self.assertEqual(ModelPermission.objects.count(), 1)
+            self.assertEqual(self._export(format=format), exported)
+
+
+class TestExplain(TestCase):
+
+    def setUp(self):
+        from django.contrib.auth.models import Group, User
+
+        self.user = User.objects.create_user("test", "test@test.com", "test")
+        self.group = Group.objects.create(name="group")
+
+        self.user.groups.add(self.group)
+
+        self.apple = Apple.objects.create(name="apple")
+
+        self.user.assign_perm("tests.can_eat", self.apple)
+
+    def test_explain(self):
+        out = StringIO()
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command("olp_explain", "test", "tests.can_eat",
+                         target="tests.apple:%d" % self.apple.pk, stdout=out)
+
+        output = out.getvalue()
+
+        # The permission tables are not counted unless asked to
+        for query in queries:
+            self.assertNotIn('COUNT(*) FROM "olp_', query["sql"])
+
+        self.assertNotIn("Rows in olp_objectpermission", output)
+        self.assertIn("counted with --count", output)
+
+        for name in ("has_perm", "PermissionBackend.has_perm",
+                     "PermissionBackend.get_all_permissions",
+                     "PermissionBackend.get_group_permissions",
+                     "get_obj_ids_for_user", "get_objs_for_user"):
+            self.assertIn("== %s ==" % name, output)
+
+        self.assertIn('FROM "olp_objectpermission"', output)
+        self.assertIn("SEARCH olp_objectpermission", output)
+        self.assertNotIn("Warning", output)
+
+    def test_count(self):
+        out = StringIO()
+
+        call_command("olp_explain", "test", "tests.can_eat", count=True,
+                     stdout=out)
+
+        self.assertIn("Rows in olp_objectpermission: 1", out.getvalue())
+
+    def test_full_scan_warning(self):
+        from olp.management.commands.olp_explain import Command
+
+        command = Command()
+        tables = ["olp_objectpermission"]
+
+        self.assertEqual(command._get_scanned_tables(
+            ["SCAN olp_objectpermission"], tables), tables)
+        self.assertEqual(command._get_scanned_tables(
+            ["Seq Scan on olp_objectpermission  (cost=0.00..35.50)"],
+            tables), tables)
+        self.assertEqual(command._get_scanned_tables(
+            ["SCAN V0"], tables, 'FROM "olp_objectpermission" V0 WHERE'),
+            tables)
+        self.assertEqual(command._get_scanned_tables(
+            ["SEARCH olp_objectpermission USING INDEX olp_objperm_target_idx"],
+            tables), [])
+
+    def test_unknown_arguments(self):
+        from django.core.management import CommandError
+
+        with self.assertRaises(CommandError):
+            call_command("olp_explain", "missing", "tests.can_eat",
+                         stdout=StringIO())
+
+        with self.assertRaises(CommandError):
+            call_command("olp_explain", "test", "tests.missing",
+                         stdout=StringIO())
+
+        with self.assertRaises(CommandError):
+            call_command("olp_explain", "test", "tests.can_eat",
+                         target="tests.apple", stdout=StringIO())
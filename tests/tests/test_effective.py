@@ -0,0 +1,267 @@
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from io import StringIO
+from olp.models import EffectivePermission
+from ..models import Apple, Membership, Team
+
+
+@override_settings(OLP_SETTINGS={
+    "models": (
+        ("django.contrib.auth.models.Group", "user"),
+    ),
+    "materialize": True,
+})
+class TestEffectivePermissions(TestCase):
+
+    def setUp(self):
+        from django.contrib.auth.models import Group, User
+
+        self.user = User.objects.create_user("test", "test@test.com", "test")
+        self.other_user = User.objects.create_user("other", "other@test.com",
+                                                   "other")
+        self.group = Group.objects.create(name="group")
+
+        self.user.groups.add(self.group)
+
+        self.apple = Apple.objects.create(name="test")
+
+    def _get_perms(self, user):
+        perms = EffectivePermission.objects.filter(user=user)
+
+        return set(perms.values_list("target_object_id",
+                                     "permission__codename"))
+
+    def test_user_permission(self):
+        self.user.assign_perm("tests.can_eat", self.apple)
+
+        self.assertEqual(self._get_perms(self.user),
+                         set([(self.apple.pk, "can_eat")]))
+
+        self.user.remove_perm("tests.can_eat", self.apple)
+
+        self.assertEqual(self._get_perms(self.user), set())
+
+    def test_group_permission(self):
+        self.group.assign_perm("tests.can_eat", self.apple)
+
+        self.assertEqual(self._get_perms(self.user),
+                         set([(self.apple.pk, "can_eat")]))
+        self.assertEqual(self._get_perms(self.other_user), set())
+
+    def test_permission_from_multiple_sources(self):
+        self.user.assign_perm("tests.can_eat", self.apple)
+        self.group.assign_perm("tests.can_eat", self.apple)
+
+        self.group.remove_perm("tests.can_eat", self.apple)
+
+        self.assertEqual(self._get_perms(self.user),
+                         set([(self.apple.pk, "can_eat")]))
+
+    def test_bulk_permissions(self):
+        from olp.utils import bulk_assign_perm, bulk_remove_perm
+
+        other = Apple.objects.create(name="other")
+
+        bulk_assign_perm([self.group, self.other_user], "tests.can_eat",
+                         [self.apple, other])
+
+        self.assertEqual(len(self._get_perms(self.user)), 2)
+        self.assertEqual(len(self._get_perms(self.other_user)), 2)
+
+        bulk_remove_perm(self.group, "tests.can_eat", [other])
+
+        self.assertEqual(self._get_perms(self.user),
+                         set([(self.apple.pk, "can_eat")]))
+
+    def test_membership_added_and_removed(self):
+        self.group.assign_perm("tests.can_eat", self.apple)
+
+        self.other_user.groups.add(self.group)
+
+        self.assertEqual(self._get_perms(self.other_user),
+                         set([(self.apple.pk, "can_eat")]))
+
+        self.group.user_set.remove(self.other_user)
+
+        self.assertEqual(self._get_perms(self.other_user), set())
+
+    def test_membership_cleared(self):
+        self.group.assign_perm("tests.can_eat", self.apple)
+
+        self.group.user_set.clear()
+
+        self.assertEqual(self._get_perms(self.user), set())
+
+    def test_group_deleted(self):
+        self.group.assign_perm("tests.can_eat", self.apple)
+
+        self.group.delete()
+
+        self.assertEqual(self._get_perms(self.user), set())
+
+    def test_target_removed(self):
+        from olp.utils import remove_all_permissions
+
+        self.group.assign_perm("tests.can_eat", self.apple)
+
+        remove_all_permissions(self.apple)
+
+        self.assertEqual(self._get_perms(self.user), set())
+
+    def test_object_permission_saved(self):
+        from olp.cache import permission_cache
+        from olp.models import ObjectPermission
+
+        ObjectPermission(base_object=self.group, target_object=self.apple,
+                         permission=permission_cache.get("tests.can_eat")) \
+            .save()
+
+        self.assertEqual(self._get_perms(self.user),
+                         set([(self.apple.pk, "can_eat")]))
+
+    def test_object_permissions_deleted_together(self):
+        from unittest import mock
+        from olp import effective
+        from olp.models import ObjectPermission
+
+        apples = [Apple.objects.create(name="apple %d" % i) for i in range(3)]
+
+        for apple in apples:
+            self.group.assign_perm("tests.can_eat", apple)
+
+        self.user.assign_perm("tests.can_eat", apples[0])
+
+        with mock.patch("olp.effective.refresh_for_bases",
+                        wraps=effective.refresh_for_bases) as refresh:
+            ObjectPermission.objects.all().delete()
+
+        self.assertEqual(refresh.call_count, 1)
+        self.assertEqual(self._get_perms(self.user), set())
+
+    def test_reads_use_effective_permissions(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from olp.backends import PermissionBackend
+        from olp.utils import get_objs_for_user
+
+        self.group.assign_perm("tests.can_eat", self.apple)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(PermissionBackend().has_perm(
+                self.user, "tests.can_eat", self.apple
+            ))
+            self.assertEqual(
+                list(get_objs_for_user(self.user, "tests.can_eat")),
+                [self.apple]
+            )
+
+        for query in queries:
+            self.assertIn("olp_effectivepermission", query["sql"])
+            self.assertNotIn("olp_objectpermission", query["sql"])
+
+    def test_rebuild_command(self):
+        self.user.assign_perm("tests.can_eat", self.apple)
+        self.group.assign_perm("tests.can_be_awesome", self.apple)
+
+        EffectivePermission.objects.all().delete()
+
+        out = StringIO()
+
+        call_command("olp_rebuild_effective_permissions", batch_size=1,
+                     stdout=out)
+
+        self.assertIn("Rebuilt the effective permissions of 2 users.",
+                      out.getvalue())
+        self.assertEqual(self._get_perms(self.user),
+                         set([(self.apple.pk, "can_eat"),
+                              (self.apple.pk, "can_be_awesome")]))
+
+
+@override_settings(OLP_SETTINGS={
+    "models": (
+        ("tests.models.Team", "memberships__user"),
+    ),
+    "materialize": True,
+})
+class TestEffectivePermissionsRelated(TestCase):
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from olp.utils import assign_perm
+
+        self.user = User.objects.create_user("test", "test@test.com", "test")
+        self.other_user = User.objects.create_user("other", "other@test.com",
+                                                   "other")
+        self.team = Team.objects.create(name="team")
+        self.apple = Apple.objects.create(name="test")
+
+        Membership.objects.create(team=self.team, user=self.other_user)
+
+        assign_perm(self.team, "tests.can_eat", self.apple)
+
+    def _get_perms(self, user):
+        perms = EffectivePermission.objects.filter(user=user)
+
+        return set(perms.values_list("target_object_id",
+                                     "permission__codename"))
+
+    def test_membership_saved_and_deleted(self):
+        from unittest import mock
+
+        with mock.patch("olp.effective.rebuild_effective_permissions") \
+                as rebuild:
+            membership = Membership.objects.create(team=self.team,
+                                                   user=self.user)
+
+            self.assertEqual(self._get_perms(self.user),
+                             set([(self.apple.pk, "can_eat")]))
+
+            membership.user = self.other_user
+            membership.save()
+
+            self.assertEqual(self._get_perms(self.user), set())
+
+            membership.user = self.user
+            membership.save()
+            membership.delete()
+
+            self.assertEqual(self._get_perms(self.user), set())
+            self.assertEqual(self._get_perms(self.other_user),
+                             set([(self.apple.pk, "can_eat")]))
+
+        rebuild.assert_not_called()
+
+    def test_unknown_members_rebuilt_on_commit(self):
+        from olp.signals import membership_changed
+
+        Membership.objects.create(team=self.team, user=self.user)
+        EffectivePermission.objects.filter(user=self.user).delete()
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            membership_changed.send(sender=Team, user_ids=None)
+            membership_changed.send(sender=Team, user_ids=None)
+
+            self.assertEqual(self._get_perms(self.user), set())
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self._get_perms(self.user),
+                         set([(self.apple.pk, "can_eat")]))
+
+
+class TestEffectivePermissionsDisabled(TestCase):
+
+    def test_not_maintained(self):
+        from django.contrib.auth.models import User
+
+        user = User.objects.create_user("test", "test@test.com", "test")
+        apple = Apple.objects.create(name="test")
+
+        user.assign_perm("tests.can_eat", apple)
+
+        self.assertEqual(EffectivePermission.objects.count(), 0)
+
+    def test_rebuild_command(self):
+        from django.core.management import CommandError
+
+        with self.assertRaises(CommandError):
+            call_command("olp_rebuild_effective_permissions")
@@ -0,0 +1,137 @@
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from olp.backends import PermissionBackend
+from olp.cache import permission_cache
+from olp.instrumentation import instrumentation
+from olp.signals import permission_operation
+from olp.utils import assign_perm, get_obj_ids_for_user, has_perm
+from ..models import Apple
+
+
+class InstrumentationTestCase(TestCase):
+
+    def setUp(self):
+        super(InstrumentationTestCase, self).setUp()
+
+        self.user = User.objects.create_user("test", "test@test.com", "test")
+        self.apple = Apple.objects.create(name="test")
+
+        permission_cache.clear()
+        instrumentation.reset()
+
+        self.operations = []
+
+        permission_operation.connect(self.operation_received)
+
+    def tearDown(self):
+        permission_operation.disconnect(self.operation_received)
+
+        instrumentation.reset()
+
+        super(InstrumentationTestCase, self).tearDown()
+
+    def operation_received(self, sender, **kwargs):
+        self.operations.append(kwargs)
+
+
+class TestInstrumentationDisabled(InstrumentationTestCase):
+
+    def test_nothing_recorded(self):
+        assign_perm(self.user, "tests.can_be_awesome", self.apple)
+        has_perm(self.user, "tests.can_be_awesome", self.apple)
+
+        self.assertFalse(instrumentation.enabled)
+        self.assertEqual(instrumentation.get_stats(), {})
+        self.assertEqual(self.operations, [])
+
+
+@override_settings(OLP_SETTINGS={
+    "models": (
+        ("django.contrib.auth.models.Group", "user"),
+    ),
+    "instrument": True,
+})
+class TestInstrumentationEnabled(InstrumentationTestCase):
+
+    def test_enabled_by_settings(self):
+        self.assertTrue(instrumentation.enabled)
+
+    def test_counts_calls_and_queries(self):
+        assign_perm(self.user, "tests.can_be_awesome", self.apple)
+
+        self.assertTrue(has_perm(self.user, "tests.can_be_awesome",
+                                 self.apple))
+        self.assertFalse(has_perm(self.user, "tests.can_eat", self.apple))
+
+        stats = instrumentation.get_stats()
+
+        self.assertEqual(stats["has_perm"]["calls"], 2)
+        self.assertEqual(stats["has_perm"]["queries"], 2)
+        self.assertEqual(stats["assign_perm"]["calls"], 1)
+        self.assertTrue(stats["has_perm"]["time"] > 0)
+        self.assertTrue(stats["has_perm"]["max_time"] <=
+                        stats["has_perm"]["time"])
+
+    def test_signal_sent(self):
+        get_obj_ids_for_user(self.user, "tests.can_be_awesome")
+
+        names = [operation["name"] for operation in self.operations]
+
+        # The permission lookup is nested in, and finishes before, the call
+        self.assertEqual(names, ["get_perm_for_codename",
+                                 "get_obj_ids_for_user"])
+
+        operation = self.operations[-1]
+
+        self.assertEqual(operation["queries"], 1)
+        self.assertEqual(operation["cache"], None)
+        self.assertTrue(operation["duration"] >= 0)
+
+    def test_nested_queries_counted(self):
+        has_perm(self.user, "tests.can_be_awesome", self.apple)
+
+        lookup, check = self.operations
+
+        # Loading the permission cache is counted in both operations
+        self.assertEqual(lookup["queries"], 1)
+        self.assertEqual(check["queries"], 2)
+
+    def test_permission_cache_hits(self):
+        has_perm(self.user, "tests.can_be_awesome", self.apple)
+        has_perm(self.user, "tests.can_eat", self.apple)
+
+        stats = instrumentation.get_stats()["get_perm_for_codename"]
+
+        self.assertEqual(stats["calls"], 2)
+        self.assertEqual(stats["cache_misses"], 1)
+        self.assertEqual(stats["cache_hits"], 1)
+
+    def test_backend_cache_hits(self):
+        backend = PermissionBackend()
+
+        backend.get_all_permissions(self.user, self.apple)
+        backend.get_all_permissions(self.user, self.apple)
+        backend.has_perm(self.user, "tests.can_be_awesome", self.apple)
+
+        stats = instrumentation.get_stats()
+
+        self.assertEqual(stats["backend.get_all_permissions"]["calls"], 3)
+        self.assertEqual(stats["backend.get_all_permissions"]["cache_hits"],
+                         2)
+        self.assertEqual(
+            stats["backend.get_all_permissions"]["cache_misses"], 1)
+        self.assertEqual(stats["backend.has_perm"]["queries"], 0)
+
+    def test_exceptions_recorded(self):
+        with self.assertRaises(AttributeError):
+            has_perm(None, "tests.can_be_awesome", self.apple)
+
+        self.assertEqual(instrumentation.get_stats()["has_perm"]["calls"], 1)
+        self.assertEqual(self.operations[-1]["name"], "get_perm_for_codename")
+
+    def test_reset(self):
+        has_perm(self.user, "tests.can_be_awesome", self.apple)
+
+        instrumentation.reset()
+
+        self.assertEqual(instrumentation.get_stats(), {})
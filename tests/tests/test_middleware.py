@@ -5,11 +5,46 @@ class TestMiddleware(TestCase):
 
     def test_auto_patches(self):
         from django.contrib.auth.models import User
-        from django.utils.encoding import force_text
+        from django.utils.encoding import force_str
         from olp.utils import assign_perm
 
         response = self.client.get('/test')
 
-        self.assertEqual(force_text(response.content), 'ok')
+        self.assertEqual(force_str(response.content), 'ok')
 
-        self.assertIs(getattr(User.assign_perm, "__func__", User.assign_perm), assign_perm)
\ No newline at end of file
+        self.assertIs(getattr(User.assign_perm, "__func__", User.assign_perm), assign_perm)
+
+
+class TestReplicaPinningMiddleware(TestCase):
+
+    def test_pin_scoped_to_request(self):
+        from django.test import RequestFactory
+        from olp.middleware import ReplicaPinningMiddleware
+        from olp.routers import is_pinned, pin_to_primary
+
+        def get_response(request):
+            pin_to_primary()
+
+            return is_pinned()
+
+        middleware = ReplicaPinningMiddleware(get_response)
+
+        self.assertTrue(middleware(RequestFactory().get("/test")))
+        self.assertFalse(is_pinned())
+
+    async def test_async_pin_scoped_to_request(self):
+        from asgiref.sync import iscoroutinefunction
+        from django.test import RequestFactory
+        from olp.middleware import ReplicaPinningMiddleware
+        from olp.routers import is_pinned, pin_to_primary
+
+        async def get_response(request):
+            pin_to_primary()
+
+            return is_pinned()
+
+        middleware = ReplicaPinningMiddleware(get_response)
+
+        self.assertTrue(iscoroutinefunction(middleware))
+        self.assertTrue(await middleware(RequestFactory().get("/test")))
+        self.assertFalse(is_pinned())
@@ -0,0 +1,146 @@
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from olp.backends import PermissionBackend
+from olp.models import ModelPermission, ObjectPermission
+from olp.utils import (
+    aget_obj_ids_for_user, assign_model_perm, assign_perm,
+    get_obj_ids_for_user, get_objs_for_user, get_perms_for_objs, has_perm,
+    iter_obj_ids_for_user, remove_all_permissions, remove_model_perm
+)
+from .base import PermissionTestCase, get_obj_key
+from ..models import Apple, Orange, Pear
+
+
+MODEL_PERMISSION_SETTINGS = {
+    "models": (
+        ("django.contrib.auth.models.Group", "user"),
+    ),
+    "model_permissions": True,
+}
+
+
+@override_settings(OLP_SETTINGS=MODEL_PERMISSION_SETTINGS)
+class TestModelPermissions(PermissionTestCase):
+
+    def setUp(self):
+        super(TestModelPermissions, self).setUp()
+
+        self.other_user = User.objects.create_user("other", "other@test.com",
+                                                   "other")
+
+        self.apples = [Apple.objects.create(name="apple %d" % i)
+                       for i in range(3)]
+        self.orange = Orange.objects.create(name="orange")
+
+    def test_single_row(self):
+        assign_model_perm(self.group, "tests.can_eat", Apple)
+        assign_model_perm(self.group, "tests.can_eat", Apple)
+
+        self.assertEqual(ModelPermission.objects.count(), 1)
+        self.assertEqual(ObjectPermission.objects.count(), 0)
+
+    def test_has_perm(self):
+        assign_model_perm(self.user, "tests.can_eat", Apple)
+
+        self.assertTrue(has_perm(self.user, "tests.can_eat", self.apples[0]))
+        self.assertTrue(has_perm(self.user, "tests.can_eat"))
+        self.assertFalse(has_perm(self.user, "tests.can_eat", self.orange))
+        self.assertFalse(has_perm(self.other_user, "tests.can_eat",
+                                  self.apples[0]))
+
+        # Objects created after the permission was given are included
+        apple = Apple.objects.create(name="new")
+
+        self.assertTrue(has_perm(self.user, "tests.can_eat", apple))
+
+    def test_backend_permissions(self):
+        assign_model_perm(self.group, "tests.can_eat", Apple)
+        assign_perm(self.user, "tests.can_be_awesome", self.apples[0])
+
+        backend = PermissionBackend()
+        user = self.get_user()
+
+        self.assertEqual(backend.get_all_permissions(user, self.apples[0]),
+                         set(["tests.can_eat", "tests.can_be_awesome"]))
+        self.assertEqual(backend.get_all_permissions(user, self.apples[1]),
+                         set(["tests.can_eat"]))
+        self.assertEqual(backend.get_group_permissions(user, self.orange),
+                         set())
+        self.assertTrue(user.has_perm("tests.can_eat", self.apples[2]))
+
+    def test_get_objs_for_user_unfiltered(self):
+        assign_model_perm(self.group, "tests.can_eat", Apple)
+
+        user = self.get_user()
+
+        objs = get_objs_for_user(user, "tests.can_eat")
+
+        self.assertEqual(set(objs), set(self.apples))
+        self.assertFalse(objs.query.where)
+
+        self.assertEqual(set(get_obj_ids_for_user(user, "tests.can_eat")),
+                         set(apple.pk for apple in self.apples))
+        self.assertEqual(list(iter_obj_ids_for_user(user, "tests.can_eat",
+                                                    chunk_size=2)),
+                         [apple.pk for apple in self.apples])
+        self.assertEqual(
+            get_objs_for_user(user, "tests.can_eat", Orange).count(), 0)
+
+    def test_with_perm(self):
+        pears = [Pear.objects.create(name="pear %d" % i) for i in range(2)]
+
+        self.assertEqual(Pear.objects.with_perm(self.user, "tests.can_slice")
+                         .count(), 0)
+
+        assign_model_perm(self.group, "tests.can_slice", Pear)
+
+        self.assertEqual(list(Pear.objects.with_perm(self.get_user(),
+                                                     "tests.can_slice")
+                              .order_by("pk")), pears)
+
+    def test_get_perms_for_objs(self):
+        assign_model_perm(self.group, "tests.can_eat", Apple)
+
+        result = get_perms_for_objs(self.get_user(),
+                                    self.apples + [self.orange])
+
+        self.assertEqual(result[get_obj_key(self.apples[1])],
+                         set(["tests.can_eat"]))
+        self.assertEqual(result[get_obj_key(self.orange)], set())
+
+    def test_remove_model_perm(self):
+        assign_model_perm(self.user, "tests.can_eat", Apple)
+        assign_perm(self.user, "tests.can_eat", self.apples[0])
+
+        remove_model_perm(self.user, "tests.can_eat", Apple)
+
+        self.assertEqual(ModelPermission.objects.count(), 0)
+        self.assertTrue(has_perm(self.user, "tests.can_eat", self.apples[0]))
+        self.assertFalse(has_perm(self.user, "tests.can_eat", self.apples[1]))
+
+    def test_remove_all_permissions(self):
+        assign_model_perm(self.group, "tests.can_eat", Apple)
+
+        remove_all_permissions(self.group)
+
+        self.assertEqual(ModelPermission.objects.count(), 0)
+
+    async def test_async_ids(self):
+        from asgiref.sync import sync_to_async
+
+        await sync_to_async(assign_model_perm)(self.user, "tests.can_eat",
+                                               Apple)
+
+        self.assertEqual(
+            set(await aget_obj_ids_for_user(self.user, "tests.can_eat")),
+            set(apple.pk for apple in self.apples))
+
+
+class TestModelPermissionSettings(TestCase):
+
+    def test_disabled(self):
+        user = User.objects.create_user("test", "test@test.com", "test")
+
+        with self.assertRaises(ImproperlyConfigured):
+            assign_model_perm(user, "tests.can_eat", Apple)
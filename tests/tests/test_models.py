@@ -0,0 +1,149 @@
+from django.db import connection
+from django.test import TestCase
+from olp.models import ObjectPermission
+from unittest import skipUnless
+from ..models import Apple
+
+
+def get_query_plan(queryset):
+    sql, params = queryset.query.sql_with_params()
+
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN QUERY PLAN %s" % sql, params)
+
+        return "\n".join(row[-1] for row in cursor.fetchall())
+
+
+@skipUnless(connection.vendor == "sqlite", "Query plans are SQLite specific")
+class TestObjectPermissionIndexes(TestCase):
+
+    def setUp(self):
+        from django.contrib.auth.models import Group, User
+
+        self.user = User.objects.create_user("test", "test@test.com", "test")
+        self.group = Group.objects.create(name="group")
+
+        self.user.groups.add(self.group)
+
+        self.apple = Apple.objects.create(name="test")
+
+    def assertUsesIndex(self, queryset, index_names):
+        plan = get_query_plan(queryset)
+
+        lines = [line for line in plan.splitlines()
+                 if "olp_objectpermission" in line]
+
+        self.assertTrue(lines, plan)
+
+        for line in lines:
+            self.assertTrue(
+                any(index_name in line for index_name in index_names),
+                plan
+            )
+
+    def test_for_base(self):
+        queryset = ObjectPermission.objects.for_base(self.user) \
+            .values_list("permission", flat=True)
+
+        self.assertUsesIndex(queryset, ["olp_objperm_base_idx"])
+
+    def test_for_base_and_target(self):
+        queryset = ObjectPermission.objects.for_base(self.user) \
+            .for_target(self.apple).values_list("permission", flat=True)
+
+        # SQLite names the index created for the unique constraint itself
+        self.assertUsesIndex(queryset, [
+            "olp_objperm_base_idx",
+            "olp_objperm_target_idx",
+            "sqlite_autoindex_olp_objectpermission",
+        ])
+
+    def test_for_target(self):
+        queryset = ObjectPermission.objects.for_target(self.apple) \
+            .values_list("permission", flat=True)
+
+        self.assertUsesIndex(queryset, ["olp_objperm_target_idx"])
+
+    def test_for_base_ids(self):
+        from django.contrib.auth.models import Group
+
+        queryset = ObjectPermission.objects.for_base_model(Group) \
+            .for_base_ids([self.group.pk]).values_list("permission",
+                                                       flat=True)
+
+        self.assertUsesIndex(queryset, ["olp_objperm_base_idx"])
+
+    def test_get_obj_ids_for_user(self):
+        from olp.utils import get_obj_ids_for_user
+
+        queryset = get_obj_ids_for_user(self.user, "tests.can_eat")
+
+        self.assertUsesIndex(queryset, ["olp_objperm_perm_target_idx",
+                                        "olp_objperm_base_idx"])
+
+
+class TestPermissionQuerySet(TestCase):
+
+    def setUp(self):
+        from django.contrib.auth.models import Group, User
+        from ..models import Pear
+
+        self.user = User.objects.create_user("test", "test@test.com", "test")
+        self.group = Group.objects.create(name="group")
+
+        self.user.groups.add(self.group)
+
+        self.pears = [Pear.objects.create(name="pear %d" % i)
+                      for i in range(6)]
+
+        self.user.assign_perm("tests.can_slice", self.pears[0])
+        self.user.assign_perm("tests.can_slice", self.pears[3])
+        self.group.assign_perm("tests.can_slice", self.pears[4])
+
+    def test_with_perm(self):
+        from ..models import Pear
+
+        pears = Pear.objects.with_perm(self.user, "tests.can_slice")
+
+        self.assertEqual(set(pears), set([self.pears[0], self.pears[3],
+                                          self.pears[4]]))
+
+    def test_uses_exists(self):
+        from ..models import Pear
+
+        pears = Pear.objects.with_perm(self.user, "tests.can_slice")
+
+        sql = str(pears.query).upper()
+
+        self.assertIn("EXISTS", sql)
+        self.assertNotIn('"TESTS_PEAR"."ID" IN', sql)
+
+    def test_chaining(self):
+        from django.db.models import Count
+        from ..models import Pear
+
+        pears = Pear.objects.filter(name__startswith="pear") \
+            .with_perm(self.user, "tests.can_slice").order_by("-name")
+
+        with self.assertNumQueries(1):
+            self.assertEqual(pears.count(), 3)
+
+        self.assertEqual(list(pears[1:]), [self.pears[3], self.pears[0]])
+        self.assertEqual(pears.aggregate(total=Count("id"))["total"], 3)
+
+    def test_fake_permission(self):
+        from ..models import Pear
+
+        with self.assertNumQueries(0):
+            pears = list(Pear.objects.with_perm(self.user,
+                                                "test.does_not_exist"))
+
+        self.assertEqual(pears, [])
+
+    def test_anonymous_user(self):
+        from django.contrib.auth.models import AnonymousUser
+        from ..models import Pear
+
+        pears = Pear.objects.with_perm(AnonymousUser(), "tests.can_slice")
+
+        self.assertEqual(list(pears), [])
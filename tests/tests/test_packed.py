@@ -0,0 +1,399 @@
+from io import StringIO
+
+from django.contrib.auth.models import Permission, User
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from olp.backends import PermissionBackend
+from olp.models import ObjectPermission, PackedObjectPermission, PermissionBit
+from olp.packed import permission_bits
+from olp.utils import (
+    aassign_perm, aget_obj_ids_for_user, ahas_perm, aremove_perm, assign_perm,
+    bulk_assign_perm, bulk_remove_all_permissions, bulk_remove_perm,
+    get_obj_ids_for_user, get_objs_for_user, get_perms_for_objs, has_perm,
+    remove_all_permissions, remove_perm
+)
+from .base import PermissionTestCase, get_obj_key
+from ..models import Apple, Pear
+
+
+PACKED_SETTINGS = {
+    "models": (
+        ("django.contrib.auth.models.Group", "user"),
+    ),
+    "storage": "packed",
+}
+
+
+class PackedTestCase(PermissionTestCase):
+
+    def setUp(self):
+        super(PackedTestCase, self).setUp()
+
+        permission_bits.clear()
+
+        self.apples = [Apple.objects.create(name="apple %d" % i)
+                       for i in range(3)]
+        self.pear = Pear.objects.create(name="pear")
+
+
+@override_settings(OLP_SETTINGS=PACKED_SETTINGS)
+class TestPackedStorage(PackedTestCase):
+
+    def test_single_row_per_pair(self):
+        assign_perm(self.user, "tests.can_eat", self.apples[0])
+        assign_perm(self.user, "tests.can_be_awesome", self.apples[0])
+        assign_perm(self.user, "tests.can_eat", self.apples[0])
+
+        self.assertEqual(ObjectPermission.objects.count(), 0)
+        self.assertEqual(PackedObjectPermission.objects.count(), 1)
+
+        row = PackedObjectPermission.objects.get()
+
+        self.assertEqual(row.mask, 0b11)
+        self.assertEqual(PermissionBit.objects.count(), 2)
+
+    def test_bits_are_stable(self):
+        assign_perm(self.user, "tests.can_eat", self.apples[0])
+        assign_perm(self.user, "tests.can_be_awesome", self.apples[1])
+
+        eat = Permission.objects.get(codename="can_eat")
+        awesome = Permission.objects.get(codename="can_be_awesome")
+
+        bits = dict(PermissionBit.objects.values_list("permission", "bit"))
+
+        self.assertEqual(bits, {eat.pk: 0, awesome.pk: 1})
+
+        remove_perm(self.user, "tests.can_eat", self.apples[0])
+        assign_perm(self.user, "tests.can_be_awesome", self.apples[0])
+
+        bits = dict(PermissionBit.objects.values_list("permission", "bit"))
+
+        self.assertEqual(bits, {eat.pk: 0, awesome.pk: 1})
+
+    def test_has_perm(self):
+        assign_perm(self.user, "tests.can_eat", self.apples[0])
+        assign_perm(self.group, "tests.can_be_awesome", self.apples[1])
+
+        user = self.get_user()
+
+        self.assertTrue(has_perm(user, "tests.can_eat", self.apples[0]))
+        self.assertFalse(has_perm(user, "tests.can_eat", self.apples[1]))
+        self.assertTrue(user.has_perm("tests.can_eat", self.apples[0]))
+        self.assertTrue(user.has_perm("tests.can_be_awesome",
+                                      self.apples[1]))
+        self.assertFalse(user.has_perm("tests.can_be_awesome",
+                                       self.apples[0]))
+
+    def test_backend_permissions(self):
+        assign_perm(self.user, "tests.can_eat", self.apples[0])
+        assign_perm(self.group, "tests.can_be_awesome", self.apples[0])
+
+        backend = PermissionBackend()
+        user = self.get_user()
+
+        self.assertEqual(backend.get_all_permissions(user, self.apples[0]),
+                         set(["tests.can_eat", "tests.can_be_awesome"]))
+        self.assertEqual(backend.get_group_permissions(user, self.apples[0]),
+                         set(["tests.can_be_awesome"]))
+
+    def test_remove_perm(self):
+        assign_perm(self.user, "tests.can_eat", self.apples[0])
+        assign_perm(self.user, "tests.can_be_awesome", self.apples[0])
+
+        remove_perm(self.user, "tests.can_eat", self.apples[0])
+
+        row = PackedObjectPermission.objects.get()
+
+        self.assertEqual(row.mask, 0b10)
+
+        remove_perm(self.user, "tests.can_be_awesome", self.apples[0])
+
+        # Rows without any permissions are removed
+        self.assertEqual(PackedObjectPermission.objects.count(), 0)
+        self.assertFalse(has_perm(self.get_user(), "tests.can_be_awesome",
+                                  self.apples[0]))
+
+    def test_remove_unassigned_perm(self):
+        assign_perm(self.user, "tests.can_eat", self.apples[0])
+
+        remove_perm(self.user, "tests.can_be_awesome", self.apples[0])
+
+        self.assertEqual(PackedObjectPermission.objects.get().mask, 0b1)
+
+    def test_get_objs_for_user(self):
+        assign_perm(self.user, "tests.can_eat", self.apples[0])
+        assign_perm(self.user, "tests.can_be_awesome", self.apples[1])
+        assign_perm(self.group, "tests.can_eat", self.apples[2])
+
+        user = self.get_user()
+
+        self.assertEqual(set(get_objs_for_user(user, "tests.can_eat")),
+                         set([self.apples[0], self.apples[2]]))
+        self.assertEqual(set(get_obj_ids_for_user(user, "tests.can_eat")),
+                         set([self.apples[0].pk, self.apples[2].pk]))
+        self.assertEqual(list(get_objs_for_user(user,
+                                                "tests.can_be_awesome")),
+                         [self.apples[1]])
+
+    def test_permission_never_given(self):
+        assign_perm(self.user, "tests.can_eat", self.apples[0])
+
+        user = self.get_user()
+
+        self.assertEqual(list(get_objs_for_user(user,
+                                                "tests.can_be_awesome")),
+                         [])
+
+    def test_bits_per_content_type(self):
+        assign_perm(self.user, "tests.can_eat", self.apples[0])
+        assign_perm(self.user, "tests.can_eat", self.pear)
+
+        user = self.get_user()
+
+        # The same permission can be given on other models
+        self.assertEqual(list(get_objs_for_user(user, "tests.can_eat", Pear)),
+                         [self.pear])
+        self.assertEqual(list(get_objs_for_user(user, "tests.can_eat")),
+                         [self.apples[0]])
+
+    def test_get_perms_for_objs(self):
+        assign_perm(self.user, "tests.can_eat", self.apples[0])
+        assign_perm(self.group, "tests.can_be_awesome", self.apples[0])
+        assign_perm(self.user, "tests.can_eat", self.apples[1])
+
+        result = get_perms_for_objs(self.get_user(), self.apples)
+
+        self.assertEqual(result[get_obj_key(self.apples[0])],
+                         set(["tests.can_eat", "tests.can_be_awesome"]))
+        self.assertEqual(result[get_obj_key(self.apples[1])],
+                         set(["tests.can_eat"]))
+        self.assertEqual(result[get_obj_key(self.apples[2])], set())
+
+    def test_bulk_assign_and_remove(self):
+        other = User.objects.create_user("other", "other@test.com", "other")
+
+        assign_perm(self.user, "tests.can_eat", self.apples[0])
+
+        bulk_assign_perm([self.user, other],
+                         ["tests.can_eat", "tests.can_be_awesome"],
+                         Apple.objects.all())
+
+        self.assertEqual(PackedObjectPermission.objects.count(), 6)
+        self.assertEqual(
+            set(PackedObjectPermission.objects.values_list("mask",
+                                                           flat=True)),
+            set([0b11]),
+        )
+
+        bulk_remove_perm(User.objects.filter(pk=other.pk), "tests.can_eat",
+                         self.apples[:2])
+
+        masks = dict(PackedObjectPermission.objects.filter(
+            base_object_id=other.pk, base_object_ct__model="user",
+        ).values_list("target_object_id", "mask"))
+
+        self.assertEqual(masks, {self.apples[0].pk: 0b10,
+                                 self.apples[1].pk: 0b10,
+                                 self.apples[2].pk: 0b11})
+
+    def test_remove_all_permissions(self):
+        assign_perm(self.user, "tests.can_eat", self.apples[0])
+        assign_perm(self.group, "tests.can_eat", self.apples[0])
+        assign_perm(self.user, "tests.can_eat", self.apples[1])
+
+        remove_all_permissions(self.apples[0])
+
+        self.assertEqual(PackedObjectPermission.objects.count(), 1)
+
+        self.assertEqual(bulk_remove_all_permissions([self.user]), 1)
+        self.assertEqual(PackedObjectPermission.objects.count(), 0)
+
+    def test_deleted_permission_clears_bit(self):
+        assign_perm(self.user, "tests.can_eat", self.apples[0])
+        assign_perm(self.user, "tests.can_be_awesome", self.apples[0])
+        assign_perm(self.user, "tests.can_eat", self.apples[1])
+
+        Permission.objects.filter(codename="can_eat").delete()
+
+        masks = dict(PackedObjectPermission.objects.values_list(
+            "target_object_id", "mask"))
+
+        self.assertEqual(masks, {self.apples[0].pk: 0b10})
+
+        # The bit is free again
+        assign_perm(self.user, "tests.can_slice", self.apples[0])
+
+        self.assertEqual(PackedObjectPermission.objects.get().mask, 0b11)
+        self.assertEqual(
+            PermissionBackend().get_all_permissions(self.get_user(),
+                                                    self.apples[0]),
+            set(["tests.can_be_awesome", "tests.can_slice"]),
+        )
+
+    async def test_async_functions(self):
+        self.assertTrue(await aassign_perm(self.user, "tests.can_eat",
+                                           self.apples[0]))
+        self.assertEqual(await PackedObjectPermission.objects.acount(), 1)
+
+        # The bits are loaded before the queries are built
+        permission_bits.clear()
+
+        self.assertTrue(await ahas_perm(self.user, "tests.can_eat",
+                                        self.apples[0]))
+        self.assertEqual(await aget_obj_ids_for_user(self.user,
+                                                     "tests.can_eat"),
+                         [self.apples[0].pk])
+
+        await aremove_perm(self.user, "tests.can_eat", self.apples[0])
+
+        self.assertFalse(await ahas_perm(self.user, "tests.can_eat",
+                                         self.apples[0]))
+
+
+@override_settings(OLP_SETTINGS=PACKED_SETTINGS)
+class TestPackedDatabases(PackedTestCase):
+    databases = {"default", "replica"}
+
+    def test_bits_assigned_on_database(self):
+        assign_perm(self.user, "tests.can_eat", self.apples[0],
+                    using="replica")
+
+        self.assertEqual(PermissionBit.objects.count(), 0)
+        self.assertEqual(PermissionBit.objects.using("replica").count(), 1)
+        self.assertEqual(
+            PackedObjectPermission.objects.using("replica").get().mask, 1)
+
+        remove_perm(self.user, "tests.can_eat", self.apples[0],
+                    using="replica")
+
+        self.assertEqual(
+            PackedObjectPermission.objects.using("replica").count(), 0)
+
+
+class TestPackedSettings(TestCase):
+
+    def test_materialize_not_supported(self):
+        with self.assertRaises(ImproperlyConfigured):
+            with override_settings(OLP_SETTINGS={"storage": "packed",
+                                                 "materialize": True}):
+                pass
+
+    def test_unknown_storage(self):
+        with self.assertRaises(ImproperlyConfigured):
+            with override_settings(OLP_SETTINGS={"storage": "columns"}):
+                pass
+
+
+class TestConvertStorage(PackedTestCase):
+
+    def convert(self, *args):
+        out = StringIO()
+
+        call_command("olp_convert_storage", *args, stdout=out)
+
+        return out.getvalue()
+
+    def test_round_trip(self):
+        assign_perm(self.user, "tests.can_eat", self.apples[0])
+        assign_perm(self.user, "tests.can_be_awesome", self.apples[0])
+        assign_perm(self.group, "tests.can_eat", self.apples[1])
+
+        rows = set(ObjectPermission.objects.values_list(
+            "base_object_ct", "base_object_id", "target_object_ct",
+            "target_object_id", "permission",
+        ))
+
+        output = self.convert("--to", "packed", "--delete-source")
+
+        self.assertIn("Converted 3 rows into 2 new rows of the packed "
+                      "storage.", output)
+        self.assertEqual(ObjectPermission.objects.count(), 0)
+
+        with override_settings(OLP_SETTINGS=PACKED_SETTINGS):
+            user = self.get_user()
+
+            self.assertTrue(user.has_perm("tests.can_eat", self.apples[0]))
+            self.assertTrue(user.has_perm("tests.can_be_awesome",
+                                          self.apples[0]))
+            self.assertTrue(user.has_perm("tests.can_eat", self.apples[1]))
+
+            self.convert("--to", "rows", "--delete-source")
+
+        self.assertEqual(PackedObjectPermission.objects.count(), 0)
+        self.assertEqual(set(ObjectPermission.objects.values_list(
+            "base_object_ct", "base_object_id", "target_object_ct",
+            "target_object_id", "permission",
+        )), rows)
+
+    def test_bits_read_once_per_content_type(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        for apple in self.apples:
+            assign_perm(self.user, "tests.can_eat", apple)
+            assign_perm(self.group, "tests.can_be_awesome", apple)
+
+        assign_perm(self.user, "tests.can_slice", self.pear)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.convert("--to", "packed")
+
+        # Only the bits of each content type are read, rather than all of the
+        # bits being loaded again for every permission
+        bit_queries = [query["sql"] for query in queries
+                       if query["sql"].startswith("SELECT") and
+                       'FROM "olp_permissionbit"' in query["sql"]]
+
+        self.assertFalse([sql for sql in bit_queries
+                          if "auth_permission" in sql])
+
+        self.assertEqual(PermissionBit.objects.count(), 3)
+
+        with override_settings(OLP_SETTINGS=PACKED_SETTINGS):
+            self.assertTrue(has_perm(self.get_user(), "tests.can_slice",
+                                     self.pear))
+
+    def test_replaces_packed_rows(self):
+        assign_perm(self.user, "tests.can_eat", self.apples[0])
+
+        self.convert("--to", "packed")
+        output = self.convert("--to", "packed", "--batch-size", "1")
+
+        self.assertIn("Converted 1 rows into 1 new rows of the packed "
+                      "storage.", output)
+        self.assertIn("should be set to 'packed'", output)
+        self.assertEqual(ObjectPermission.objects.count(), 1)
+        self.assertEqual(PackedObjectPermission.objects.count(), 1)
+
+    def test_existing_rows_not_counted(self):
+        assign_perm(self.user, "tests.can_eat", self.apples[0])
+        assign_perm(self.user, "tests.can_be_awesome", self.apples[0])
+
+        self.convert("--to", "packed")
+
+        ObjectPermission.objects.filter(permission__codename="can_eat") \
+            .delete()
+
+        output = self.convert("--to", "rows")
+
+        self.assertIn("Converted 1 rows into 1 new rows of the rows "
+                      "storage.", output)
+        self.assertEqual(ObjectPermission.objects.count(), 2)
+
+    @override_settings(OLP_SETTINGS=PACKED_SETTINGS)
+    def test_export_packed(self):
+        assign_perm(self.user, "tests.can_eat", self.apples[0])
+        assign_perm(self.user, "tests.can_be_awesome", self.apples[0])
+
+        out = StringIO()
+
+        call_command("olp_export_permissions", "--format", "csv", stdout=out,
+                     stderr=StringIO())
+
+        lines = out.getvalue().splitlines()
+
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(lines[1],
+                         "auth.user,%d,tests.apple,%d,tests.can_eat" %
+                         (self.user.pk, self.apples[0].pk))
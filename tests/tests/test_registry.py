@@ -0,0 +1,96 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase
+from olp.registry import ModelRegistry, registry
+
+
+class TestModelRegistry(TestCase):
+
+    def test_models_resolved(self):
+        from django.contrib.auth.models import Group
+
+        models = [registered.model for registered in registry]
+
+        self.assertEqual(models, [Group])
+
+    def test_content_type(self):
+        from django.contrib.auth.models import Group
+        from django.contrib.contenttypes.models import ContentType
+
+        registered_model = list(registry)[0]
+
+        self.assertEqual(registered_model.content_type,
+                         ContentType.objects.get_for_model(Group))
+
+    def test_queryset_for_user(self):
+        from django.contrib.auth.models import Group, User
+
+        user = User.objects.create_user("test", "test@test.com", "test")
+        group = Group.objects.create(name="group")
+        Group.objects.create(name="other")
+
+        user.groups.add(group)
+
+        registered_model = list(registry)[0]
+
+        self.assertEqual(list(registered_model.get_queryset(user)), [group])
+
+    def test_invalid_model_path(self):
+        model_registry = ModelRegistry()
+
+        with self.assertRaises(ImproperlyConfigured):
+            model_registry.populate((("tests.models.DoesNotExist", "user"), ))
+
+    def test_not_a_model(self):
+        model_registry = ModelRegistry()
+
+        with self.assertRaises(ImproperlyConfigured):
+            model_registry.populate((("olp.utils.has_perm", "user"), ))
+
+    def test_invalid_filter_path(self):
+        model_registry = ModelRegistry()
+
+        with self.assertRaises(ImproperlyConfigured):
+            model_registry.populate(
+                (("django.contrib.auth.models.Group", "owner"), )
+            )
+
+    def test_cleanup_models(self):
+        from django.test import override_settings
+        from ..models import Apple, Orange
+
+        self.assertEqual(registry.get_cleanup_models(), ())
+
+        with override_settings(OLP_SETTINGS={
+            "models": (),
+            "cleanup": ("tests.models.Apple", ),
+        }):
+            self.assertEqual(registry.get_cleanup_models(), (Apple, ))
+            self.assertTrue(registry.is_cleanup_model(Apple))
+            self.assertFalse(registry.is_cleanup_model(Orange))
+
+    def test_invalid_cleanup_model(self):
+        from django.test import override_settings
+
+        with self.assertRaises(ImproperlyConfigured):
+            with override_settings(OLP_SETTINGS={
+                "models": (),
+                "cleanup": ("tests.models.Banana", ),
+            }):
+                pass
+
+    def test_settings_changed(self):
+        from django.test import override_settings
+
+        with override_settings(OLP_SETTINGS={"models": ()}):
+            self.assertEqual(len(registry), 0)
+
+        self.assertEqual(len(registry), 1)
+
+    def test_models_patched(self):
+        from django.contrib.auth.models import Group, User
+        from olp.utils import assign_perm, has_perm, remove_perm
+
+        self.assertIs(User.assign_perm, assign_perm)
+        self.assertIs(User.remove_perm, remove_perm)
+        self.assertIs(Group.assign_perm, assign_perm)
+        self.assertIs(Group.has_perm, has_perm)
@@ -0,0 +1,118 @@
+from django.test import override_settings
+from olp.backends import PermissionBackend
+from olp.models import ObjectPermission
+from olp.routers import ReplicaRouter, is_pinned, scoped_pinning, unpin
+from olp.utils import (
+    aassign_perm, ahas_perm, assign_perm, get_obj_ids_for_user,
+    get_objs_for_user, has_perm, remove_perm
+)
+from .base import PermissionTestCase
+from ..models import Apple
+
+
+REPLICA_SETTINGS = {
+    "models": (
+        ("django.contrib.auth.models.Group", "user"),
+    ),
+    "replicas": ["replica"],
+}
+
+
+@override_settings(DATABASE_ROUTERS=["olp.routers.ReplicaRouter"],
+                   OLP_SETTINGS=REPLICA_SETTINGS)
+class TestReplicaRouter(PermissionTestCase):
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        super(TestReplicaRouter, self).setUp()
+
+        pinning = scoped_pinning()
+        pinning.__enter__()
+        self.addCleanup(pinning.__exit__, None, None, None)
+
+        self.apple = Apple.objects.create(name="apple")
+
+    def test_routing(self):
+        router = ReplicaRouter()
+
+        self.assertEqual(router.db_for_read(ObjectPermission), "replica")
+        self.assertEqual(router.db_for_read(Apple), None)
+        self.assertFalse(is_pinned())
+
+        self.assertEqual(router.db_for_write(ObjectPermission), "default")
+        self.assertTrue(is_pinned())
+        self.assertEqual(router.db_for_read(ObjectPermission), "default")
+
+    def test_unpin(self):
+        router = ReplicaRouter()
+
+        router.db_for_write(ObjectPermission)
+        unpin()
+
+        self.assertFalse(is_pinned())
+        self.assertEqual(router.db_for_read(ObjectPermission), "replica")
+
+    def test_write_pins_reads(self):
+        self.assertFalse(has_perm(self.user, "tests.can_eat", self.apple))
+
+        assign_perm(self.user, "tests.can_eat", self.apple)
+
+        self.assertEqual(ObjectPermission.objects.using("default").count(), 1)
+        self.assertTrue(has_perm(self.user, "tests.can_eat", self.apple))
+
+        # The replica has not caught up, which a new request can see
+        with scoped_pinning():
+            self.assertFalse(has_perm(self.user, "tests.can_eat",
+                                      self.apple))
+            self.assertEqual(list(get_obj_ids_for_user(self.get_user(),
+                                                       "tests.can_eat")),
+                             [])
+
+    def test_explicit_using(self):
+        assign_perm(self.user, "tests.can_eat", self.apple)
+
+        with scoped_pinning():
+            self.assertTrue(has_perm(self.user, "tests.can_eat", self.apple,
+                                     using="default"))
+            self.assertEqual(list(get_obj_ids_for_user(
+                self.get_user(), "tests.can_eat", using="default")),
+                [self.apple.pk])
+            self.assertTrue(PermissionBackend().has_perm(
+                self.get_user(), "tests.can_eat", self.apple,
+                using="default"))
+
+            objs = get_objs_for_user(self.get_user(), "tests.can_eat",
+                                     using="default")
+
+            self.assertEqual(objs.db, "default")
+            self.assertEqual(list(objs), [self.apple])
+
+            self.assertFalse(PermissionBackend().has_perm(
+                self.get_user(), "tests.can_eat", self.apple))
+
+    def test_explicit_using_writes(self):
+        assign_perm(self.user, "tests.can_eat", self.apple, using="replica")
+
+        self.assertEqual(ObjectPermission.objects.using("default").count(), 0)
+        self.assertEqual(ObjectPermission.objects.using("replica").count(), 1)
+
+        remove_perm(self.user, "tests.can_eat", self.apple, using="replica")
+
+        self.assertEqual(ObjectPermission.objects.using("replica").count(), 0)
+
+    def test_remove_perm_deletes_on_primary(self):
+        assign_perm(self.user, "tests.can_eat", self.apple)
+
+        with scoped_pinning():
+            remove_perm(self.user, "tests.can_eat", self.apple)
+
+        self.assertEqual(ObjectPermission.objects.using("default").count(), 0)
+
+    async def test_async_functions(self):
+        await aassign_perm(self.user, "tests.can_eat", self.apple)
+
+        with scoped_pinning():
+            self.assertTrue(await ahas_perm(self.user, "tests.can_eat",
+                                            self.apple, using="default"))
+            self.assertFalse(await ahas_perm(self.user, "tests.can_eat",
+                                             self.apple))
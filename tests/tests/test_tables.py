@@ -0,0 +1,220 @@
+from django.contrib.auth.models import Group, User
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from olp.backends import PermissionBackend
+from olp.models import ObjectPermission
+from olp.registry import registry
+from olp.utils import (
+    aassign_perm, ahas_perm, assign_perm, bulk_assign_perm,
+    bulk_remove_all_permissions, bulk_remove_perm, get_obj_ids_for_user,
+    get_objs_for_user, get_perms_for_objs, has_perm, iter_obj_ids_for_user,
+    remove_all_permissions, remove_perm
+)
+from .base import PermissionTestCase, get_obj_key
+from ..models import Apple, Plum, PlumGroupPermission, PlumUserPermission
+
+
+TABLE_SETTINGS = {
+    "models": (
+        ("django.contrib.auth.models.Group", "user"),
+    ),
+    "tables": (
+        "tests.models.PlumUserPermission",
+        "tests.models.PlumGroupPermission",
+    ),
+}
+
+
+@override_settings(OLP_SETTINGS=TABLE_SETTINGS)
+class TestTables(PermissionTestCase):
+
+    def setUp(self):
+        super(TestTables, self).setUp()
+
+        self.plums = [Plum.objects.create(code="plum-%d" % i)
+                      for i in range(3)]
+        self.apple = Apple.objects.create(name="apple")
+
+    def test_registry(self):
+        self.assertEqual(registry.get_table(User, Plum), PlumUserPermission)
+        self.assertEqual(registry.get_table(self.group, self.plums[0]),
+                         PlumGroupPermission)
+        self.assertEqual(registry.get_table(User, Apple), None)
+
+    def test_assign_perm_routed(self):
+        assign_perm(self.user, "tests.can_pick", self.plums[0])
+        assign_perm(self.user, "tests.can_pick", self.plums[0])
+        assign_perm(self.group, "tests.can_pick", self.plums[1])
+        assign_perm(self.user, "tests.can_eat", self.apple)
+
+        self.assertEqual(
+            list(PlumUserPermission.objects.values_list("base_object",
+                                                        "target_object")),
+            [(self.user.pk, "plum-0")],
+        )
+        self.assertEqual(PlumGroupPermission.objects.count(), 1)
+        self.assertEqual(ObjectPermission.objects.count(), 1)
+
+    def test_has_perm(self):
+        assign_perm(self.user, "tests.can_pick", self.plums[0])
+        assign_perm(self.group, "tests.can_pick", self.plums[1])
+
+        user = self.get_user()
+
+        self.assertTrue(has_perm(user, "tests.can_pick", self.plums[0]))
+        self.assertFalse(has_perm(user, "tests.can_pick", self.plums[1]))
+        self.assertTrue(has_perm(user, "tests.can_pick"))
+
+        self.assertTrue(user.has_perm("tests.can_pick", self.plums[0]))
+        self.assertTrue(user.has_perm("tests.can_pick", self.plums[1]))
+        self.assertFalse(user.has_perm("tests.can_pick", self.plums[2]))
+
+    def test_backend_permissions(self):
+        assign_perm(self.user, "tests.can_pick", self.plums[0])
+        assign_perm(self.user, "tests.can_eat", self.apple)
+
+        backend = PermissionBackend()
+        user = self.get_user()
+
+        self.assertEqual(backend.get_all_permissions(user, self.plums[0]),
+                         set(["tests.can_pick"]))
+        self.assertEqual(backend.get_all_permissions(user),
+                         set(["tests.can_pick", "tests.can_eat"]))
+        self.assertEqual(backend.get_group_permissions(user, self.plums[0]),
+                         set())
+
+    def test_single_join(self):
+        assign_perm(self.user, "tests.can_pick", self.plums[0])
+
+        user = self.get_user()
+        objs = get_objs_for_user(user, "tests.can_pick")
+
+        with self.assertNumQueries(1) as queries:
+            self.assertEqual(list(objs), [self.plums[0]])
+
+        sql = queries.captured_queries[0]["sql"]
+
+        # Plums have no permissions in the generic storage
+        self.assertNotIn(ObjectPermission._meta.db_table, sql)
+        self.assertIn(PlumUserPermission._meta.db_table, sql)
+
+    def test_get_objs_for_user(self):
+        assign_perm(self.user, "tests.can_pick", self.plums[0])
+        assign_perm(self.group, "tests.can_pick", self.plums[1])
+
+        user = self.get_user()
+
+        self.assertEqual(set(get_objs_for_user(user, "tests.can_pick")),
+                         set(self.plums[:2]))
+        self.assertEqual(set(get_obj_ids_for_user(user, "tests.can_pick")),
+                         set(["plum-0", "plum-1"]))
+        self.assertEqual(list(Plum.objects.with_perm(user, "tests.can_pick")
+                              .order_by("code")),
+                         self.plums[:2])
+
+    def test_iter_obj_ids_for_user(self):
+        assign_perm(self.user, "tests.can_pick", self.plums[0])
+        assign_perm(self.group, "tests.can_pick", self.plums[0])
+        assign_perm(self.group, "tests.can_pick", self.plums[2])
+
+        ids = iter_obj_ids_for_user(self.get_user(), "tests.can_pick",
+                                    chunk_size=1)
+
+        self.assertEqual(list(ids), ["plum-0", "plum-2"])
+
+    def test_get_perms_for_objs(self):
+        assign_perm(self.user, "tests.can_pick", self.plums[0])
+        assign_perm(self.group, "tests.can_pick", self.plums[1])
+
+        result = get_perms_for_objs(self.get_user(),
+                                    self.plums + [self.apple])
+
+        self.assertEqual(result[get_obj_key(self.plums[0])],
+                         set(["tests.can_pick"]))
+        self.assertEqual(result[get_obj_key(self.plums[1])],
+                         set(["tests.can_pick"]))
+        self.assertEqual(result[get_obj_key(self.plums[2])], set())
+        self.assertEqual(result[get_obj_key(self.apple)], set())
+
+    def test_remove_perm(self):
+        assign_perm(self.user, "tests.can_pick", self.plums[0])
+
+        remove_perm(self.user, "tests.can_pick", self.plums[0])
+
+        self.assertEqual(PlumUserPermission.objects.count(), 0)
+        self.assertFalse(has_perm(self.get_user(), "tests.can_pick",
+                                  self.plums[0]))
+
+    def test_bulk_functions(self):
+        bulk_assign_perm([self.user, self.group], "tests.can_pick",
+                         Plum.objects.all())
+        bulk_assign_perm(self.user, "tests.can_eat", [self.apple])
+
+        self.assertEqual(PlumUserPermission.objects.count(), 3)
+        self.assertEqual(PlumGroupPermission.objects.count(), 3)
+        self.assertEqual(ObjectPermission.objects.count(), 1)
+
+        bulk_remove_perm(Group.objects.all(), "tests.can_pick",
+                         self.plums[:2])
+
+        self.assertEqual(
+            list(PlumGroupPermission.objects.values_list("target_object",
+                                                         flat=True)),
+            ["plum-2"],
+        )
+
+        self.assertEqual(bulk_remove_all_permissions(self.plums[2]), 2)
+        self.assertEqual(PlumUserPermission.objects.count(), 2)
+
+    def test_remove_all_permissions(self):
+        assign_perm(self.user, "tests.can_pick", self.plums[0])
+        assign_perm(self.group, "tests.can_pick", self.plums[0])
+
+        remove_all_permissions(self.group)
+
+        self.assertEqual(PlumGroupPermission.objects.count(), 0)
+        self.assertEqual(PlumUserPermission.objects.count(), 1)
+
+        remove_all_permissions(self.plums[0])
+
+        self.assertEqual(PlumUserPermission.objects.count(), 0)
+
+    def test_deleting_target_cascades(self):
+        assign_perm(self.user, "tests.can_pick", self.plums[0])
+
+        self.plums[0].delete()
+
+        self.assertEqual(PlumUserPermission.objects.count(), 0)
+
+    async def test_async_functions(self):
+        self.assertTrue(await aassign_perm(self.user, "tests.can_pick",
+                                           self.plums[0]))
+        self.assertEqual(await PlumUserPermission.objects.acount(), 1)
+
+        self.assertTrue(await ahas_perm(self.user, "tests.can_pick",
+                                        self.plums[0]))
+        self.assertFalse(await ahas_perm(self.user, "tests.can_pick",
+                                         self.plums[1]))
+
+
+class TestTableSettings(TestCase):
+
+    def test_not_a_table(self):
+        with self.assertRaises(ImproperlyConfigured):
+            with override_settings(OLP_SETTINGS={
+                "tables": ("tests.models.Plum",),
+            }):
+                pass
+
+    def test_unknown_base_model(self):
+        with self.assertRaises(ImproperlyConfigured):
+            with override_settings(OLP_SETTINGS={
+                "tables": ("tests.models.PlumGroupPermission",),
+            }):
+                pass
+
+    def test_materialize_not_supported(self):
+        with self.assertRaises(ImproperlyConfigured):
+            with override_settings(OLP_SETTINGS=dict(TABLE_SETTINGS,
+                                                     materialize=True)):
+                pass
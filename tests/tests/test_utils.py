@@ -1,8 +1,10 @@
 from django.contrib.auth.models import Permission
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from olp.cache import permission_cache
 from olp.models import ObjectPermission
 from olp.utils import get_objs_for_user
-from ..models import Apple, Orange
+from .base import get_obj_key
+from ..models import Apple, Orange, Pear
 
 
 class TestAssignPerm(TestCase):
@@ -15,6 +17,8 @@ class TestAssignPerm(TestCase):
         self.user = User.objects.create_user("test", "test@test.com", "test")
         self.user.save()
 
+        permission_cache.load()
+
     def test_real_normal_permission(self):
         result = self.user.assign_perm("tests.can_be_awesome")
 
@@ -46,7 +50,7 @@ class TestAssignPerm(TestCase):
         apple = Apple(name="test")
         apple.save()
 
-        with self.assertNumQueries(1):
+        with self.assertNumQueries(0):
             result = self.user.assign_perm("test.does_not_exist", apple)
 
         self.assertEqual(result, False)
@@ -64,6 +68,18 @@ class TestAssignPerm(TestCase):
         self.assertEqual(result, True)
         self.assertEqual(ObjectPermission.objects.count(), 1)
 
+    def test_existing_obj_permission(self):
+        apple = Apple(name="test")
+        apple.save()
+
+        self.user.assign_perm("tests.can_be_awesome", apple)
+
+        with self.assertNumQueries(1):
+            result = self.user.assign_perm("tests.can_be_awesome", apple)
+
+        self.assertEqual(result, True)
+        self.assertEqual(ObjectPermission.objects.count(), 1)
+
 
 class TestHasPerm(TestCase):
 
@@ -82,6 +98,25 @@ class TestHasPerm(TestCase):
 
         self.assertEqual(result, False)
 
+    def test_exists_query(self):
+        from olp.utils import assign_perm, has_perm
+
+        apple = Apple.objects.create(name="apple")
+
+        assign_perm(self.user, "tests.can_eat", apple)
+
+        permission_cache.load()
+
+        with self.assertNumQueries(1) as queries:
+            self.assertTrue(has_perm(self.user, "tests.can_eat", apple))
+
+        sql = queries.captured_queries[0]["sql"]
+
+        self.assertIn("LIMIT 1", sql)
+        self.assertNotIn("django_content_type", sql)
+
+        self.assertFalse(has_perm(self.user, "tests.can_be_awesome", apple))
+
 
 class TestRemovePerm(TestCase):
 
@@ -133,6 +168,19 @@ class TestRemovePerm(TestCase):
         self.assertEqual(result, True)
         self.assertEqual(ObjectPermission.objects.count(), 0)
 
+    def test_obj_permission_single_query(self):
+        apple = Apple(name="test")
+        apple.save()
+
+        permission = permission_cache.get("tests.can_be_awesome")
+
+        self.user.assign_perm(permission, apple)
+
+        with self.assertNumQueries(1):
+            self.user.remove_perm(permission, apple)
+
+        self.assertEqual(ObjectPermission.objects.count(), 0)
+
 
 class TestRemovePermNotSet(TestCase):
 
@@ -144,6 +192,8 @@ class TestRemovePermNotSet(TestCase):
         self.user = User.objects.create_user("test", "test@test.com", "test")
         self.user.save()
 
+        permission_cache.load()
+
     def test_real_normal_permission(self):
         result = self.user.remove_perm("tests.can_be_awesome")
 
@@ -174,7 +224,7 @@ class TestRemovePermNotSet(TestCase):
         apple = Apple(name="test")
         apple.save()
 
-        with self.assertNumQueries(1):
+        with self.assertNumQueries(0):
             result = self.user.remove_perm("test.does_not_exist", apple)
 
         self.assertEqual(result, False)
@@ -302,3 +352,616 @@ class TestGetObjsForUser(TestCase):
         apples = get_objs_for_user(self.user, "tests.can_eat")
 
         self.assertEqual(apples.count(), 0)
+
+
+class TestBulkAssignPerm(TestCase):
+
+    def setUp(self):
+        from django.contrib.auth.models import Group, User
+
+        super(TestBulkAssignPerm, self).setUp()
+
+        self.user = User.objects.create_user("test", "test@test.com", "test")
+        self.other_user = User.objects.create_user("other", "other@test.com",
+                                                   "other")
+        self.group = Group.objects.create(name="group")
+
+        self.apples = [Apple.objects.create(name="apple %d" % i)
+                       for i in range(10)]
+
+        permission_cache.load()
+
+    def test_many_targets(self):
+        from olp.utils import bulk_assign_perm
+
+        # The queries are wrapped in a savepoint
+        with self.assertNumQueries(3):
+            result = bulk_assign_perm(self.user, "tests.can_eat",
+                                      self.apples)
+
+        self.assertEqual(result, True)
+        self.assertEqual(ObjectPermission.objects.count(), 10)
+
+        for apple in self.apples:
+            self.assertTrue(self.user.has_perm("tests.can_eat", apple))
+
+    def test_many_bases_and_permissions(self):
+        from olp.utils import bulk_assign_perm
+
+        result = bulk_assign_perm(
+            [self.user, self.other_user, self.group],
+            ["tests.can_eat", "tests.can_be_awesome"],
+            self.apples,
+        )
+
+        self.assertEqual(result, True)
+        self.assertEqual(ObjectPermission.objects.count(), 60)
+
+    def test_queryset_targets(self):
+        from olp.utils import bulk_assign_perm
+
+        apples = Apple.objects.filter(pk__in=[a.pk for a in self.apples[:4]])
+
+        bulk_assign_perm(self.user, "tests.can_eat",
+                         [apples, Orange.objects.create(name="orange")])
+
+        self.assertEqual(ObjectPermission.objects.count(), 5)
+
+        apples = get_objs_for_user(self.user, "tests.can_eat")
+
+        self.assertEqual(apples.count(), 4)
+
+    def test_batches(self):
+        from olp.utils import bulk_assign_perm
+
+        with self.assertNumQueries(6):
+            bulk_assign_perm(self.user, "tests.can_eat", self.apples,
+                             batch_size=3)
+
+        self.assertEqual(ObjectPermission.objects.count(), 10)
+
+    def test_existing_permissions(self):
+        from olp.utils import bulk_assign_perm
+
+        bulk_assign_perm(self.user, "tests.can_eat", self.apples[:5])
+        bulk_assign_perm(self.user, "tests.can_eat", self.apples)
+
+        self.assertEqual(ObjectPermission.objects.count(), 10)
+
+    def test_fake_permission(self):
+        from olp.utils import bulk_assign_perm
+
+        result = bulk_assign_perm(self.user,
+                                  ["tests.can_eat", "test.does_not_exist"],
+                                  self.apples)
+
+        self.assertEqual(result, False)
+        self.assertEqual(ObjectPermission.objects.count(), 0)
+
+
+class TestBulkRemovePerm(TestCase):
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from olp.utils import bulk_assign_perm
+
+        super(TestBulkRemovePerm, self).setUp()
+
+        self.user = User.objects.create_user("test", "test@test.com", "test")
+        self.other_user = User.objects.create_user("other", "other@test.com",
+                                                   "other")
+
+        self.apples = [Apple.objects.create(name="apple %d" % i)
+                       for i in range(10)]
+
+        bulk_assign_perm([self.user, self.other_user],
+                         ["tests.can_eat", "tests.can_be_awesome"],
+                         self.apples)
+
+        permission_cache.load()
+
+    def test_many_targets(self):
+        from olp.utils import bulk_remove_perm
+
+        # The queries are wrapped in a savepoint
+        with self.assertNumQueries(3):
+            result = bulk_remove_perm(self.user, "tests.can_eat", self.apples)
+
+        self.assertEqual(result, True)
+        self.assertEqual(ObjectPermission.objects.count(), 30)
+        self.assertFalse(self.user.has_perm("tests.can_eat", self.apples[0]))
+        self.assertTrue(
+            self.other_user.has_perm("tests.can_eat", self.apples[0])
+        )
+
+    def test_queryset_targets(self):
+        from olp.utils import bulk_remove_perm
+
+        apples = Apple.objects.filter(pk__in=[a.pk for a in self.apples[:4]])
+
+        with self.assertNumQueries(3):
+            bulk_remove_perm([self.user, self.other_user],
+                             ["tests.can_eat", "tests.can_be_awesome"],
+                             apples)
+
+        self.assertEqual(ObjectPermission.objects.count(), 24)
+
+    def test_batches(self):
+        from olp.utils import bulk_remove_perm
+
+        with self.assertNumQueries(6):
+            bulk_remove_perm(self.user, "tests.can_eat", self.apples,
+                             batch_size=3)
+
+        self.assertEqual(ObjectPermission.objects.count(), 30)
+
+    def test_fake_permission(self):
+        from olp.utils import bulk_remove_perm
+
+        result = bulk_remove_perm(self.user, "test.does_not_exist",
+                                  self.apples)
+
+        self.assertEqual(result, False)
+        self.assertEqual(ObjectPermission.objects.count(), 40)
+
+
+class TestBulkRemoveAllPermissions(TestCase):
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from olp.utils import bulk_assign_perm
+
+        super(TestBulkRemoveAllPermissions, self).setUp()
+
+        self.user = User.objects.create_user("test", "test@test.com", "test")
+        self.other_user = User.objects.create_user("other", "other@test.com",
+                                                   "other")
+
+        self.apples = [Apple.objects.create(name="apple %d" % i)
+                       for i in range(10)]
+
+        bulk_assign_perm([self.user, self.other_user], "tests.can_eat",
+                         self.apples)
+
+        permission_cache.load()
+
+    def test_queryset_of_targets(self):
+        from olp.utils import bulk_remove_all_permissions
+
+        kept = self.apples[0]
+
+        count = bulk_remove_all_permissions(
+            Apple.objects.exclude(pk=kept.pk), batch_size=3)
+
+        self.assertEqual(count, 18)
+        self.assertEqual(set(ObjectPermission.objects.values_list(
+            "target_object_id", flat=True)), set([kept.pk]))
+
+    def test_list_of_bases(self):
+        from olp.utils import bulk_remove_all_permissions
+
+        count = bulk_remove_all_permissions([self.user])
+
+        self.assertEqual(count, 10)
+        self.assertEqual(ObjectPermission.objects.count(), 10)
+        self.assertFalse(self.user.has_perm("tests.can_eat", self.apples[0]))
+        self.assertTrue(self.other_user.has_perm("tests.can_eat",
+                                                 self.apples[0]))
+
+    def test_batched_queries(self):
+        from olp.utils import bulk_remove_all_permissions
+
+        # Reading the ids, then two deletes for each batch of ids
+        with self.assertNumQueries(1 + 4 * 2 + 2):
+            bulk_remove_all_permissions(Apple.objects.all(), batch_size=3)
+
+        self.assertEqual(ObjectPermission.objects.count(), 0)
+
+
+@override_settings(OLP_SETTINGS={
+    "models": (
+        ("django.contrib.auth.models.Group", "user"),
+    ),
+    "cleanup": (
+        "tests.models.Apple",
+        "tests.models.Pear",
+    ),
+})
+class TestCleanup(TestCase):
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+
+        super(TestCleanup, self).setUp()
+
+        self.user = User.objects.create_user("test", "test@test.com", "test")
+
+        permission_cache.load()
+
+    def test_instance_deleted(self):
+        apple = Apple.objects.create(name="apple")
+        other = Apple.objects.create(name="other")
+
+        self.user.assign_perm("tests.can_eat", apple)
+        self.user.assign_perm("tests.can_eat", other)
+
+        apple.delete()
+
+        self.assertEqual(list(ObjectPermission.objects.values_list(
+            "target_object_id", flat=True)), [other.pk])
+
+    def test_model_not_listed(self):
+        orange = Orange.objects.create(name="orange")
+
+        self.user.assign_perm("tests.can_eat", orange)
+
+        orange.delete()
+
+        self.assertEqual(ObjectPermission.objects.count(), 1)
+
+    def test_queryset_deleted_in_bulk(self):
+        from unittest import mock
+
+        pears = [Pear.objects.create(name="pear %d" % i) for i in range(5)]
+
+        for pear in pears:
+            self.user.assign_perm("tests.can_slice", pear)
+
+        with mock.patch("olp.utils.remove_all_permissions") as remove:
+            Pear.objects.filter(pk__in=[pear.pk for pear in pears[1:]]) \
+                .delete()
+
+        self.assertFalse(remove.called)
+        self.assertEqual(list(ObjectPermission.objects.values_list(
+            "target_object_id", flat=True)), [pears[0].pk])
+
+        # Objects deleted one by one are still cleaned up
+        pears[0].delete()
+
+        self.assertEqual(ObjectPermission.objects.count(), 0)
+
+    def test_disabled(self):
+        apple = Apple.objects.create(name="apple")
+
+        self.user.assign_perm("tests.can_eat", apple)
+
+        with override_settings(OLP_SETTINGS={"models": ()}):
+            apple.delete()
+
+        self.assertEqual(ObjectPermission.objects.count(), 1)
+
+
+class TestGetPermsForObjs(TestCase):
+
+    def setUp(self):
+        from django.contrib.auth.models import Group, User
+
+        super(TestGetPermsForObjs, self).setUp()
+
+        self.user = User.objects.create_user("test", "test@test.com", "test")
+        self.group = Group.objects.create(name="group")
+
+        self.user.groups.add(self.group)
+
+        self.apples = [Apple.objects.create(name="apple %d" % i)
+                       for i in range(5)]
+        self.orange = Orange.objects.create(name="orange")
+
+        self.user.assign_perm("tests.can_eat", self.apples[0])
+        self.group.assign_perm("tests.can_be_awesome", self.apples[0])
+        self.group.assign_perm("tests.can_be_awesome", self.apples[1])
+        self.user.assign_perm("tests.can_eat", self.orange)
+
+    def test_direct_and_group_permissions(self):
+        from olp.utils import get_perms_for_objs
+
+        with self.assertNumQueries(1):
+            result = get_perms_for_objs(self.user, self.apples)
+
+        self.assertEqual(result[get_obj_key(self.apples[0])],
+                         set(["tests.can_eat", "tests.can_be_awesome"]))
+        self.assertEqual(result[get_obj_key(self.apples[1])],
+                         set(["tests.can_be_awesome"]))
+
+        for apple in self.apples[2:]:
+            self.assertEqual(result[get_obj_key(apple)], set())
+
+    def test_queryset(self):
+        from olp.utils import get_perms_for_objs
+
+        with self.assertNumQueries(2):
+            result = get_perms_for_objs(self.user, Apple.objects.all())
+
+        self.assertEqual(len(result), 5)
+
+    def test_multiple_models(self):
+        from olp.utils import get_perms_for_objs
+
+        with self.assertNumQueries(2):
+            result = get_perms_for_objs(self.user,
+                                        self.apples + [self.orange])
+
+        self.assertEqual(result[get_obj_key(self.orange)],
+                         set(["tests.can_eat"]))
+
+    def test_batches(self):
+        from olp.utils import get_perms_for_objs
+
+        with self.assertNumQueries(3):
+            result = get_perms_for_objs(self.user, self.apples, batch_size=2)
+
+        self.assertEqual(result[get_obj_key(self.apples[1])],
+                         set(["tests.can_be_awesome"]))
+
+    def test_primes_backend_cache(self):
+        from olp.utils import get_perms_for_objs
+
+        get_perms_for_objs(self.user, self.apples)
+
+        with self.assertNumQueries(0):
+            for apple in self.apples:
+                self.user.has_perm("tests.can_be_awesome", apple)
+
+        self.assertTrue(self.user.has_perm("tests.can_eat", self.apples[0]))
+        self.assertFalse(self.user.has_perm("tests.can_eat", self.apples[1]))
+
+    def test_attach_as(self):
+        from olp.utils import get_perms_for_objs
+
+        get_perms_for_objs(self.user, self.apples, attach_as="perms")
+
+        self.assertEqual(self.apples[1].perms, set(["tests.can_be_awesome"]))
+        self.assertEqual(self.apples[2].perms, set())
+
+    def test_unsaved_object(self):
+        from olp.utils import get_perms_for_objs
+
+        with self.assertRaisesMessage(ValueError, "has not been saved"):
+            get_perms_for_objs(self.user, self.apples + [Apple(name="new")])
+
+    def test_anonymous_user(self):
+        from django.contrib.auth.models import AnonymousUser
+        from olp.utils import get_perms_for_objs
+
+        with self.assertNumQueries(0):
+            result = get_perms_for_objs(AnonymousUser(), self.apples)
+
+        self.assertEqual(result[get_obj_key(self.apples[0])], set())
+
+
+class TestIterObjsForUser(TestCase):
+
+    def setUp(self):
+        from django.contrib.auth.models import Group, User
+
+        super(TestIterObjsForUser, self).setUp()
+
+        self.user = User.objects.create_user("test", "test@test.com", "test")
+        self.group = Group.objects.create(name="group")
+
+        self.user.groups.add(self.group)
+
+        self.apples = [Apple.objects.create(name="apple %d" % i)
+                       for i in range(6)]
+
+        for apple in self.apples[:5]:
+            self.user.assign_perm("tests.can_eat", apple)
+
+        # Given to both the user and the group
+        self.group.assign_perm("tests.can_eat", self.apples[0])
+        self.group.assign_perm("tests.can_eat", self.apples[5])
+
+        permission_cache.load()
+
+    def test_ids_in_chunks(self):
+        from olp.utils import iter_obj_ids_for_user
+
+        # Three full chunks, and an empty one which ends the iteration
+        with self.assertNumQueries(4):
+            ids = list(iter_obj_ids_for_user(self.user, "tests.can_eat",
+                                             chunk_size=2))
+
+        self.assertEqual(ids, [apple.pk for apple in self.apples])
+
+    def test_ids_resumed(self):
+        from olp.utils import iter_obj_ids_for_user
+
+        ids = iter_obj_ids_for_user(self.user, "tests.can_eat", chunk_size=4)
+        first = [next(ids) for i in range(3)]
+
+        rest = list(iter_obj_ids_for_user(self.user, "tests.can_eat", Apple,
+                                          chunk_size=4, after=first[-1]))
+
+        self.assertEqual(first + rest, [apple.pk for apple in self.apples])
+
+    def test_resumed_without_model(self):
+        from asgiref.sync import async_to_sync
+        from olp.utils import (
+            aiter_obj_ids_for_user, iter_obj_ids_for_user, iter_objs_for_user
+        )
+
+        with self.assertRaises(ValueError):
+            next(iter_obj_ids_for_user(self.user, "tests.can_eat",
+                                       after=self.apples[0].pk))
+
+        with self.assertRaises(ValueError):
+            next(iter_objs_for_user(self.user, "tests.can_eat",
+                                    after=self.apples[0].pk))
+
+        with self.assertRaises(ValueError):
+            async_to_sync(aiter_obj_ids_for_user(
+                self.user, "tests.can_eat", after=self.apples[0].pk
+            ).__anext__)()
+
+    def test_objects_in_chunks(self):
+        from olp.utils import iter_objs_for_user
+
+        with self.assertNumQueries(2):
+            objs = list(iter_objs_for_user(self.user, "tests.can_eat",
+                                           chunk_size=4))
+
+        self.assertEqual(objs, self.apples)
+
+        objs = list(iter_objs_for_user(self.user, "tests.can_eat", Apple,
+                                       after=self.apples[3].pk))
+
+        self.assertEqual(objs, self.apples[4:])
+
+    def test_fake_permission(self):
+        from olp.utils import iter_obj_ids_for_user, iter_objs_for_user
+
+        self.assertEqual(list(iter_obj_ids_for_user(self.user,
+                                                    "tests.fake")), [])
+        self.assertEqual(list(iter_objs_for_user(self.user, "tests.fake")),
+                         [])
+
+    async def test_async_ids(self):
+        from olp.utils import aiter_obj_ids_for_user
+
+        ids = [target_id async for target_id in aiter_obj_ids_for_user(
+            self.user, "tests.can_eat", chunk_size=4)]
+
+        self.assertEqual(ids, [apple.pk for apple in self.apples])
+
+
+@override_settings(OLP_SETTINGS={
+    "models": (
+        ("django.contrib.auth.models.Group", "user"),
+    ),
+    "resolve_membership": True,
+})
+class TestMembershipIds(TestCase):
+
+    def setUp(self):
+        from django.contrib.auth.models import Group, User
+
+        super(TestMembershipIds, self).setUp()
+
+        self.user = User.objects.create_user("test", "test@test.com", "test")
+        self.group = Group.objects.create(name="group")
+        self.other_group = Group.objects.create(name="other")
+
+        self.user.groups.add(self.group)
+
+        self.apples = [Apple.objects.create(name="apple %d" % i)
+                       for i in range(3)]
+
+        self.group.assign_perm("tests.can_eat", self.apples[0])
+        self.other_group.assign_perm("tests.can_eat", self.apples[1])
+
+        permission_cache.load()
+
+        self.user = User.objects.get(pk=self.user.pk)
+
+    def test_resolved_once(self):
+        from django.contrib.auth.models import Group
+        from django.contrib.contenttypes.models import ContentType
+        from olp.utils import get_membership_ids
+
+        group_ct = ContentType.objects.get_for_model(Group)
+
+        with self.assertNumQueries(1):
+            membership_ids = get_membership_ids(self.user)
+
+        self.assertEqual(membership_ids, {group_ct.pk: set([self.group.pk])})
+
+        with self.assertNumQueries(0):
+            get_membership_ids(self.user)
+
+    def test_single_union_query(self):
+        from django.contrib.auth.models import Group, Permission
+        from django.contrib.contenttypes.models import ContentType
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from olp.utils import get_membership_ids
+
+        permission = Permission.objects.get(codename="can_slice")
+        self.user.user_permissions.add(permission)
+
+        with override_settings(OLP_SETTINGS={
+            "models": (
+                ("django.contrib.auth.models.Group", "user"),
+                ("django.contrib.auth.models.Permission", "user"),
+            ),
+            "resolve_membership": True,
+        }):
+            group_ct = ContentType.objects.get_for_model(Group)
+            permission_ct = ContentType.objects.get_for_model(Permission)
+
+            with CaptureQueriesContext(connection) as queries:
+                membership_ids = get_membership_ids(self.user)
+
+        self.assertEqual(len(queries), 1)
+        self.assertIn("UNION ALL", queries[0]["sql"])
+        self.assertEqual(membership_ids, {
+            group_ct.pk: set([self.group.pk]),
+            permission_ct.pk: set([permission.pk]),
+        })
+
+    def test_literal_ids(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from olp.backends import PermissionBackend
+
+        backend = PermissionBackend()
+
+        backend.get_all_permissions(self.user, self.apples[0])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(
+                backend.get_all_permissions(self.user, self.apples[1]),
+                set(),
+            )
+
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("auth_user_groups", queries[0]["sql"])
+        self.assertTrue(self.user.has_perm("tests.can_eat", self.apples[0]))
+
+    async def test_async_obj_ids(self):
+        from olp.utils import aget_obj_ids_for_user, aiter_obj_ids_for_user
+
+        self.assertEqual(
+            await aget_obj_ids_for_user(self.user, "tests.can_eat"),
+            [self.apples[0].pk],
+        )
+        self.assertEqual(
+            [target_id async for target_id in aiter_obj_ids_for_user(
+                self.user, "tests.can_eat")],
+            [self.apples[0].pk],
+        )
+
+    def test_membership_changed(self):
+        from olp.backends import PermissionBackend
+        from olp.utils import get_membership_ids
+
+        get_membership_ids(self.user)
+
+        self.other_group.user_set.add(self.user)
+
+        self.assertTrue(PermissionBackend().has_perm(
+            self.user, "tests.can_eat", self.apples[1]))
+
+    def test_fallback_to_subquery(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from olp.backends import PermissionBackend
+
+        self.other_group.user_set.add(self.user)
+
+        with override_settings(OLP_SETTINGS={
+            "models": (
+                ("django.contrib.auth.models.Group", "user"),
+            ),
+            "resolve_membership": True,
+            "batch_size": 1,
+        }):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertTrue(PermissionBackend().has_perm(
+                    self.user, "tests.can_eat", self.apples[1]))
+
+        self.assertIn("auth_user_groups", queries[-1]["sql"])
+
+    def test_get_objs_for_user(self):
+        objs = get_objs_for_user(self.user, "tests.can_eat")
+
+        self.assertEqual(list(objs), [self.apples[0]])